@@ -5,9 +5,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import Optional
+from typing import List, Optional
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from app.core.database import get_db
 from app.core.security import (
@@ -15,15 +15,25 @@ from app.core.security import (
     get_password_hash,
     create_access_token,
     create_refresh_token,
-    get_current_user
+    decode_token,
+    generate_api_key,
+    hash_api_key,
+    get_current_user,
+    oauth2_scheme,
+    API_KEY_PREFIX
 )
-from app.models.database import User
+from app.models.database import User, APIKey
+from app.services.auth_cache import auth_cache
+from app.services.revocation import token_revocations
 from app.schemas.auth import (
     UserCreate,
     UserResponse,
     TokenResponse,
     LoginRequest,
-    RefreshTokenRequest
+    RefreshTokenRequest,
+    APIKeyCreate,
+    APIKeyResponse,
+    APIKeyCreated
 )
 
 router = APIRouter()
@@ -52,7 +62,7 @@ async def register(
         id=str(uuid.uuid4()),
         username=user_data.username,
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await get_password_hash(user_data.password),
         plan="free",
         credits=100,
         is_active=True,
@@ -95,7 +105,7 @@ async def login(
     )
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
@@ -135,14 +145,12 @@ async def refresh_token(
     db: AsyncSession = Depends(get_db)
 ):
     """Refresh access token using refresh token"""
-    from app.core.security import decode_token
-    
     try:
         payload = decode_token(refresh_data.refresh_token)
         user_id = payload.get("sub")
         token_type = payload.get("type")
         
-        if not user_id or token_type != "refresh":
+        if not user_id or token_type != "refresh" or await token_revocations.is_revoked(payload.get("jti"), db):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid refresh token"
@@ -200,9 +208,27 @@ async def get_current_user_info(
 
 @router.post("/logout")
 async def logout(
-    current_user: User = Depends(get_current_user)
+    refresh_data: Optional[RefreshTokenRequest] = None,
+    token: Optional[str] = Depends(oauth2_scheme),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Logout current user (client should remove tokens)"""
+    """Logout current user: revoke the access token (and the refresh token, if given)"""
+    tokens = [token] if token and not token.startswith(API_KEY_PREFIX) else []
+    if refresh_data:
+        tokens.append(refresh_data.refresh_token)
+    
+    for revoked in tokens:
+        try:
+            payload = decode_token(revoked)
+        except HTTPException:
+            continue
+        if payload.get("jti") and payload.get("sub") == current_user.id:
+            await token_revocations.revoke(
+                payload["jti"], current_user.id, datetime.utcfromtimestamp(payload["exp"]), db
+            )
+        auth_cache.forget_token(revoked)
+    
     return {"message": "Successfully logged out"}
 
 @router.put("/update-profile", response_model=UserResponse)
@@ -214,20 +240,23 @@ async def update_profile(
     """Update user profile"""
     allowed_fields = ["username", "avatar_url", "preferences"]
     
+    # current_user is the shared cached copy; change a session-bound one
+    user = await db.get(User, current_user.id)
     for field, value in update_data.items():
         if field in allowed_fields:
-            setattr(current_user, field, value)
+            setattr(user, field, value)
     
     await db.commit()
-    await db.refresh(current_user)
+    await db.refresh(user)
+    auth_cache.invalidate_user(user.id)
     
     return UserResponse(
-        id=current_user.id,
-        username=current_user.username,
-        email=current_user.email,
-        plan=current_user.plan.value,
-        credits=current_user.credits,
-        avatar_url=current_user.avatar_url
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        plan=user.plan.value,
+        credits=user.credits,
+        avatar_url=user.avatar_url
     )
 
 @router.post("/change-password")
@@ -238,13 +267,84 @@ async def change_password(
     db: AsyncSession = Depends(get_db)
 ):
     """Change user password"""
-    if not verify_password(old_password, current_user.hashed_password):
+    if not await verify_password(old_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid old password"
         )
     
-    current_user.hashed_password = get_password_hash(new_password)
+    user = await db.get(User, current_user.id)
+    user.hashed_password = await get_password_hash(new_password)
     await db.commit()
+    auth_cache.invalidate_user(user.id)
     
     return {"message": "Password changed successfully"}
+
+# ==================== API KEYS ====================
+
+@router.post("/api-keys", response_model=APIKeyCreated)
+async def create_api_key(
+    key_data: APIKeyCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create an API key; the key itself is only returned here"""
+    key = generate_api_key()
+    api_key = APIKey(
+        id=str(uuid.uuid4()),
+        user_id=current_user.id,
+        name=key_data.name,
+        key_hash=hash_api_key(key),
+        key_prefix=key[:12],
+        is_active=True,
+        usage_count=0,
+        created_at=datetime.utcnow(),
+        expires_at=datetime.utcnow() + timedelta(days=key_data.expires_in_days) if key_data.expires_in_days else None
+    )
+    db.add(api_key)
+    await db.commit()
+    # A key that was probed before it existed must not stay negatively cached
+    auth_cache.invalidate_api_key(api_key.key_hash)
+    
+    return APIKeyCreated(
+        id=api_key.id,
+        name=api_key.name,
+        key=key,
+        key_prefix=api_key.key_prefix,
+        is_active=api_key.is_active,
+        created_at=api_key.created_at,
+        expires_at=api_key.expires_at
+    )
+
+@router.get("/api-keys", response_model=List[APIKeyResponse])
+async def list_api_keys(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """List the current user's API keys"""
+    result = await db.execute(
+        select(APIKey)
+        .where(APIKey.user_id == current_user.id)
+        .order_by(APIKey.created_at.desc())
+    )
+    return result.scalars().all()
+
+@router.delete("/api-keys/{key_id}")
+async def revoke_api_key(
+    key_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Revoke an API key"""
+    api_key = await db.get(APIKey, key_id)
+    if not api_key or api_key.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="API key not found"
+        )
+    
+    api_key.is_active = False
+    await db.commit()
+    auth_cache.invalidate_api_key(api_key.key_hash)
+    
+    return {"message": "API key revoked"}
@@ -0,0 +1,186 @@
+"""
+Batch jobs API endpoints
+"""
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, desc
+from typing import Optional
+from pathlib import Path
+import asyncio
+import uuid
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.security import get_current_user
+from app.models.database import User, BatchJob, BatchStatus
+from app.services.batch_service import batch_service, count_batch_items, BatchInputError
+
+router = APIRouter()
+
+async def get_user_job(job_id: str, current_user: User, db: AsyncSession) -> BatchJob:
+    """Load a batch job owned by the current user or raise 404"""
+    result = await db.execute(
+        select(BatchJob).where(
+            BatchJob.id == job_id,
+            BatchJob.user_id == current_user.id
+        )
+    )
+    job = result.scalar_one_or_none()
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch job not found"
+        )
+    return job
+
+@router.post("/", status_code=status.HTTP_202_ACCEPTED)
+async def create_batch(
+    file: UploadFile = File(...),
+    model: str = Form(default="HoYo-GPT-4"),
+    temperature: Optional[float] = Form(default=None, ge=0.0, le=2.0),
+    top_p: Optional[float] = Form(default=None, gt=0.0, le=1.0),
+    max_tokens: Optional[int] = Form(default=None, ge=1),
+    cache: Optional[bool] = Form(default=None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Upload a JSONL file of prompts and queue it as a batch job
+    
+    Each line is an object with a "message" and optional "custom_id",
+    "model", "temperature", "top_p", "max_tokens" and "cache" overriding the
+    job defaults.
+    """
+    ai_service = batch_service.ai_service
+    if not ai_service:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI service not available"
+        )
+    
+    if not ai_service.loader.is_configured(model) and model not in ai_service.models:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model {model} not found"
+        )
+    if not ai_service._check_model_access(current_user, model):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Your plan doesn't have access to {model}"
+        )
+    
+    data = await file.read(settings.BATCH_MAX_UPLOAD_SIZE + 1)
+    if len(data) > settings.BATCH_MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch file exceeds {settings.BATCH_MAX_UPLOAD_SIZE} bytes"
+        )
+    
+    try:
+        total_items = count_batch_items(data)
+    except BatchInputError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if not 0 < total_items <= settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch must contain between 1 and {settings.BATCH_MAX_ITEMS} items"
+        )
+    
+    job_id = str(uuid.uuid4())
+    job_dir = batch_service.job_dir(job_id)
+    job_dir.mkdir(parents=True, exist_ok=True)
+    input_path = job_dir / "input.jsonl"
+    await asyncio.to_thread(input_path.write_bytes, data)
+    
+    options = {"temperature": temperature, "top_p": top_p, "max_tokens": max_tokens, "cache": cache}
+    job = BatchJob(
+        id=job_id,
+        user_id=current_user.id,
+        model=model,
+        status=BatchStatus.QUEUED,
+        input_path=str(input_path),
+        output_path=str(job_dir / "output.jsonl"),
+        total_items=total_items,
+        options={key: value for key, value in options.items() if value is not None},
+        created_at=datetime.utcnow()
+    )
+    db.add(job)
+    await db.commit()
+    
+    batch_service.submit(job_id)
+    return job.to_dict()
+
+@router.get("/")
+async def get_batches(
+    skip: int = 0,
+    limit: int = 50,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get user's batch jobs"""
+    result = await db.execute(
+        select(BatchJob)
+        .where(BatchJob.user_id == current_user.id)
+        .order_by(desc(BatchJob.created_at))
+        .offset(skip)
+        .limit(limit)
+    )
+    return [job.to_dict() for job in result.scalars().all()]
+
+@router.get("/{job_id}")
+async def get_batch(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get batch job status and progress"""
+    job = await get_user_job(job_id, current_user, db)
+    return job.to_dict()
+
+@router.post("/{job_id}/cancel")
+async def cancel_batch(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Cancel a queued or running batch job; finished items stay in the output"""
+    job = await get_user_job(job_id, current_user, db)
+    
+    if job.status not in (BatchStatus.QUEUED, BatchStatus.RUNNING):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Batch job is already {job.status.value}"
+        )
+    
+    job.status = BatchStatus.CANCELLED
+    job.completed_at = datetime.utcnow()
+    await db.commit()
+    
+    batch_service.cancel(job_id)
+    return job.to_dict()
+
+@router.get("/{job_id}/output")
+async def get_batch_output(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Download the JSONL results produced so far"""
+    job = await get_user_job(job_id, current_user, db)
+    
+    if not Path(job.output_path).exists():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No results yet"
+        )
+    
+    return FileResponse(
+        job.output_path,
+        media_type="application/x-ndjson",
+        filename=f"batch-{job_id}.jsonl"
+    )
@@ -4,17 +4,23 @@ Chat API endpoints
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import Dict, Any
+from sqlalchemy import select, update
+from typing import Dict, Any, Optional
 import uuid
 from datetime import datetime
 import json
+import math
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, AsyncSessionLocal
 from app.core.security import get_current_user
 from app.models.database import User, Conversation, Message, MessageRole
 from app.schemas.chat import ChatRequest, ChatResponse
 from app.services.ai_service import AIService
+from app.services.context import context_builder
+from app.services.summarizer import summarizer
+from app.services.vector_index import vector_index
+from app.services.tokenizer import get_tokenizer
 
 router = APIRouter()
 
@@ -25,6 +31,111 @@ def set_ai_service(service: AIService):
     global ai_service
     ai_service = service
 
+def error_to_http(error: Dict[str, Any]) -> HTTPException:
+    """Convert an AI service error payload into an HTTP error"""
+    if "retry_after" in error:
+        return HTTPException(
+            status_code=error.get("status_code", status.HTTP_429_TOO_MANY_REQUESTS),
+            detail=error["error"],
+            headers={"Retry-After": str(max(math.ceil(error["retry_after"]), 1))}
+        )
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=error["error"]
+    )
+
+async def checkpoint_response(
+    message_id: str,
+    conversation_id: str,
+    content: str,
+    progress: Dict[str, Any]
+):
+    """Write the partial text of a streamed AI response
+    
+    The first checkpoint inserts the message (marked partial); later ones
+    are a single UPDATE.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(Message)
+            .where(Message.id == message_id)
+            .values(content=content, token_count=progress["completion_tokens"])
+        )
+        if result.rowcount == 0:
+            db.add(Message(
+                id=message_id,
+                conversation_id=conversation_id,
+                role=MessageRole.ASSISTANT,
+                content=content,
+                model=progress["model"],
+                token_count=progress["completion_tokens"],
+                message_metadata={"partial": True, "generation_id": progress["generation_id"]},
+                created_at=datetime.utcnow()
+            ))
+        await db.commit()
+
+async def save_response(
+    user_id: str,
+    conversation_id: str,
+    content: str,
+    result: Dict[str, Any],
+    message_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Persist a streamed AI response; one cut short is marked truncated
+    
+    A message already checkpointed under ``message_id`` is completed in place.
+    """
+    values = {
+        "content": content,
+        "model": result["model"],
+        "tokens_used": result["tokens_used"],
+        "token_count": result["completion_tokens"],
+        "cost": result["cost"],
+        "message_metadata": {"truncated": True} if result.get("truncated") else {}
+    }
+    async with AsyncSessionLocal() as db:
+        ai_message = await db.get(Message, message_id) if message_id else None
+        if ai_message is None:
+            ai_message = Message(
+                id=message_id or str(uuid.uuid4()),
+                conversation_id=conversation_id,
+                role=MessageRole.ASSISTANT,
+                created_at=datetime.utcnow(),
+                **values
+            )
+            db.add(ai_message)
+        else:
+            for key, value in values.items():
+                setattr(ai_message, key, value)
+        await db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(updated_at=datetime.utcnow())
+        )
+        await db.commit()
+    
+    summarizer.notify(conversation_id)
+    vector_index.add(user_id, ai_message)
+    return ai_message.to_dict()
+
+async def build_context(
+    db: AsyncSession,
+    conversation: Conversation,
+    chat_request: ChatRequest
+) -> Optional[Dict[str, Any]]:
+    """Assemble token-budgeted conversation history for the request"""
+    if not settings.CONTEXT_HISTORY_ENABLED:
+        return None
+    
+    return await context_builder.build(
+        db,
+        conversation_id=conversation.id,
+        model_name=chat_request.model,
+        message=chat_request.message,
+        summary=conversation.summary,
+        max_tokens=chat_request.max_tokens
+    )
+
 @router.post("/", response_model=ChatResponse)
 async def send_message(
     chat_request: ChatRequest,
@@ -53,12 +164,16 @@ async def send_message(
             detail="Conversation not found"
         )
     
+    # Assemble history before the new message is added to the session
+    context = await build_context(db, conversation, chat_request)
+    
     # Save user message
     user_message = Message(
         id=str(uuid.uuid4()),
         conversation_id=chat_request.conversation_id,
         role=MessageRole.USER,
         content=chat_request.message,
+        token_count=get_tokenizer().count(chat_request.message),
         created_at=datetime.utcnow()
     )
     db.add(user_message)
@@ -69,14 +184,16 @@ async def send_message(
             message=chat_request.message,
             model=chat_request.model,
             conversation_id=chat_request.conversation_id,
-            user=current_user
+            user=current_user,
+            temperature=chat_request.temperature,
+            top_p=chat_request.top_p,
+            max_tokens=chat_request.max_tokens,
+            use_cache=chat_request.cache,
+            context=context
         )
         
         if "error" in ai_response:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=ai_response["error"]
-            )
+            raise error_to_http(ai_response)
         
         # Save AI message
         ai_message = Message(
@@ -84,8 +201,9 @@ async def send_message(
             conversation_id=chat_request.conversation_id,
             role=MessageRole.ASSISTANT,
             content=ai_response["response"],
-            model=chat_request.model,
+            model=ai_response["model"],
             tokens_used=ai_response.get("tokens_used", 0),
+            token_count=get_tokenizer().count(ai_response["response"]),
             cost=ai_response.get("cost", 0.0),
             created_at=datetime.utcnow()
         )
@@ -97,16 +215,22 @@ async def send_message(
         await db.commit()
         await db.refresh(user_message)
         await db.refresh(ai_message)
+        summarizer.notify(chat_request.conversation_id)
+        vector_index.add(current_user.id, user_message)
+        vector_index.add(current_user.id, ai_message)
         
         return ChatResponse(
             user_message=user_message.to_dict(),
             ai_message=ai_message.to_dict(),
             conversation_id=chat_request.conversation_id,
-            model=chat_request.model,
+            model=ai_response["model"],
             tokens_used=ai_response.get("tokens_used", 0),
             cost=ai_response.get("cost", 0.0)
         )
         
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(
@@ -142,56 +266,68 @@ async def stream_message(
             detail="Conversation not found"
         )
     
+    # A resumed stream continues an existing generation: nothing new to save
+    resuming = chat_request.generation_id is not None
+    
+    # Assemble history before the new message is saved
+    context = None if resuming else await build_context(db, conversation, chat_request)
+    
     async def generate_stream():
-        # Save user message first
-        user_message = Message(
-            id=str(uuid.uuid4()),
-            conversation_id=chat_request.conversation_id,
-            role=MessageRole.USER,
-            content=chat_request.message,
-            created_at=datetime.utcnow()
-        )
-        db.add(user_message)
-        await db.commit()
-        
-        # Send user message confirmation
-        yield f"data: {json.dumps({'type': 'user_message', 'data': user_message.to_dict()})}\n\n"
+        if not resuming:
+            # Save user message first
+            user_message = Message(
+                id=str(uuid.uuid4()),
+                conversation_id=chat_request.conversation_id,
+                role=MessageRole.USER,
+                content=chat_request.message,
+                token_count=get_tokenizer().count(chat_request.message),
+                created_at=datetime.utcnow()
+            )
+            db.add(user_message)
+            await db.commit()
+            vector_index.add(current_user.id, user_message)
+            
+            # Send user message confirmation
+            yield f"data: {json.dumps({'type': 'user_message', 'data': user_message.to_dict()})}\n\n"
         
-        # Stream AI response
-        full_response = ""
-        async for chunk in ai_service.stream_chat(
+        # Stream AI response; the generation saves it (also when the client
+        # is gone), so a disconnect here only detaches from the generation
+        message_id = str(uuid.uuid4())
+        stream = ai_service.stream_chat(
             message=chat_request.message,
             model=chat_request.model,
             conversation_id=chat_request.conversation_id,
-            user=current_user
-        ):
-            if "error" in chunk:
-                yield f"data: {json.dumps({'type': 'error', 'data': chunk})}\n\n"
-                return
-            
-            if "chunk" in chunk:
-                full_response += chunk["chunk"]
-                yield f"data: {json.dumps({'type': 'chunk', 'data': chunk})}\n\n"
-            
-            if chunk.get("done"):
-                # Save complete AI message
-                ai_message = Message(
-                    id=str(uuid.uuid4()),
-                    conversation_id=chat_request.conversation_id,
-                    role=MessageRole.ASSISTANT,
-                    content=full_response,
-                    model=chat_request.model,
-                    tokens_used=chunk.get("tokens_used", 0),
-                    cost=chunk.get("cost", 0.0),
-                    created_at=datetime.utcnow()
-                )
-                db.add(ai_message)
+            user=current_user,
+            temperature=chat_request.temperature,
+            top_p=chat_request.top_p,
+            max_tokens=chat_request.max_tokens,
+            use_cache=chat_request.cache,
+            context=context,
+            coalesce_ms=chat_request.coalesce_ms,
+            coalesce_bytes=chat_request.coalesce_bytes,
+            generation_id=chat_request.generation_id,
+            offset=chat_request.offset,
+            on_finish=lambda content, result: save_response(
+                current_user.id, chat_request.conversation_id, content, result, message_id
+            ),
+            on_checkpoint=lambda content, progress: checkpoint_response(
+                message_id, chat_request.conversation_id, content, progress
+            )
+        )
+        
+        try:
+            async for chunk in stream:
+                if "error" in chunk:
+                    yield f"data: {json.dumps({'type': 'error', 'data': chunk})}\n\n"
+                    break
                 
-                # Update conversation
-                conversation.updated_at = datetime.utcnow()
-                await db.commit()
+                if "chunk" in chunk:
+                    yield f"data: {json.dumps({'type': 'chunk', 'data': chunk})}\n\n"
                 
-                yield f"data: {json.dumps({'type': 'complete', 'data': ai_message.to_dict()})}\n\n"
+                if chunk.get("done"):
+                    yield f"data: {json.dumps({'type': 'complete', 'data': chunk.get('message')})}\n\n"
+        finally:
+            await stream.aclose()
         
         yield "data: [DONE]\n\n"
     
@@ -204,3 +340,16 @@ async def stream_message(
             "Content-Type": "text/event-stream"
         }
     )
+
+@router.post("/stream/{generation_id}/cancel")
+async def cancel_stream(
+    generation_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Stop a streamed generation now instead of after its resume grace period"""
+    if not ai_service or not ai_service.cancel_generation(generation_id, current_user):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Running generation not found"
+        )
+    return {"generation_id": generation_id, "cancelled": True}
@@ -1,17 +1,21 @@
 """
 Conversations API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
+from sqlalchemy.exc import OperationalError
 from typing import List, Optional
 import uuid
 from datetime import datetime
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import get_current_user
 from app.models.database import User, Conversation, Message
 from app.schemas.conversation import ConversationCreate, ConversationResponse, ConversationUpdate
+from app.services.text_search import search_text, SearchCursorError
+from app.services.vector_index import vector_index
 
 router = APIRouter()
 
@@ -82,6 +86,72 @@ async def get_conversations(
     
     return conversation_responses
 
+@router.get("/search")
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=1000),
+    k: int = Query(default=10, ge=1, le=100),
+    conversation_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Semantic search over the user's messages across conversations"""
+    if not settings.VECTOR_SEARCH_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search is disabled"
+        )
+    
+    hits = await vector_index.search(current_user.id, q, k, conversation_id)
+    if not hits:
+        return []
+    
+    result = await db.execute(
+        select(Message, Conversation.title)
+        .join(Conversation, Message.conversation_id == Conversation.id)
+        .where(
+            Message.id.in_([message_id for message_id, _ in hits]),
+            Conversation.user_id == current_user.id
+        )
+    )
+    found = {message.id: (message, title) for message, title in result.all()}
+    
+    # Vectors of messages deleted since indexing have no row any more
+    return [
+        {
+            "score": round(score, 4),
+            "message": found[message_id][0].to_dict(),
+            "conversation_title": found[message_id][1]
+        }
+        for message_id, score in hits
+        if message_id in found
+    ]
+
+@router.get("/search/text")
+async def search_text_messages(
+    q: str = Query(..., min_length=1, max_length=1000),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Keyword search over the user's messages and conversation titles
+    
+    Results are ranked by bm25 with highlighted snippets; pass the returned
+    next_cursor to get the next page.
+    """
+    try:
+        return await search_text(db, current_user.id, q, limit, cursor)
+    except SearchCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except OperationalError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Full-text search is not available"
+        )
+
 @router.get("/{conversation_id}")
 async def get_conversation(
     conversation_id: str,
@@ -177,5 +247,6 @@ async def delete_conversation(
     
     await db.delete(conversation)
     await db.commit()
+    await vector_index.remove_conversation(current_user.id, conversation_id)
     
     return {"message": "Conversation deleted successfully"}
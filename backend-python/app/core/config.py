@@ -2,7 +2,7 @@
 Configuration settings for HoYo AI Backend
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 import os
 from pathlib import Path
 
@@ -27,6 +27,35 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # 24 hours
     REFRESH_TOKEN_EXPIRE_DAYS: int = 30
     
+    # Revoked tokens (logout): persisted jtis behind an in-memory Bloom filter,
+    # synced from the table every REVOCATION_SYNC_SECONDS for other workers
+    TOKEN_REVOCATION_ENABLED: bool = True
+    REVOCATION_BLOOM_CAPACITY: int = 100000
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    REVOCATION_SYNC_SECONDS: float = 10.0
+    
+    # Password hashing pool ("process" or "thread"); sha256_crypt via os_crypt
+    # holds the GIL, so only processes keep hashing off the event loop. Past
+    # PASSWORD_HASH_MAX_QUEUE waiting calls, login/register answer 503
+    PASSWORD_HASH_EXECUTOR: str = "process"
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    
+    # In-process auth caches: decoded tokens (keyed by token hash) and users,
+    # so authenticated requests skip the JWT decode and the user SELECT
+    AUTH_CACHE_ENABLED: bool = True
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_TOKEN_CACHE_TTL: float = 300.0  # seconds, never past the token's exp
+    AUTH_USER_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_TTL: float = 30.0  # staleness bound for changes made outside the API
+    AUTH_API_KEY_CACHE_SIZE: int = 10000
+    AUTH_API_KEY_CACHE_TTL: float = 300.0  # how long a revoked key may still work on other workers
+    AUTH_BAD_API_KEY_CACHE_TTL: float = 60.0  # negative entries for unknown keys
+    
+    # last_login and API-key usage are written behind, coalesced per user/key,
+    # in one transaction every ACTIVITY_FLUSH_SECONDS
+    ACTIVITY_FLUSH_SECONDS: float = 5.0
+    
     # CORS
     ALLOWED_ORIGINS: List[str] = [
         "http://localhost:3000",
@@ -41,6 +70,48 @@ class Settings(BaseSettings):
     ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
     
+    # AI backend: "mock" (MockModel only), "live" (provider adapters) or
+    # "auto" (provider adapters for providers with an API key configured)
+    AI_BACKEND: str = "auto"
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"
+    ANTHROPIC_BASE_URL: str = "https://api.anthropic.com/v1"
+    ANTHROPIC_VERSION: str = "2023-06-01"
+    GOOGLE_BASE_URL: str = "https://generativelanguage.googleapis.com/v1beta"
+    
+    # MockModel behaviour per model (MOCK_MODEL_PROFILES maps model -> profile,
+    # others use MOCK_PROFILE). ttft/itl are seconds and length is words, each
+    # a number or a distribution: {"type": "fixed", "value"},
+    # {"type": "lognormal", "median", "sigma", "min", "max"} or
+    # {"type": "trace", "path", "field"} (samples replayed from a JSONL file).
+    # With MOCK_SEED set, every request's draws are reproducible
+    MOCK_PROFILE: str = "default"
+    MOCK_MODEL_PROFILES: dict = {}
+    MOCK_SEED: Optional[int] = None
+    MOCK_PROFILES: dict = {
+        "default": {"ttft": 0.5, "itl": 0.05},
+        "instant": {"ttft": 0.0, "itl": 0.0},
+        "realistic": {
+            "ttft": {"type": "lognormal", "median": 0.6, "sigma": 0.5, "max": 10.0},
+            "itl": {"type": "lognormal", "median": 0.03, "sigma": 0.4, "max": 1.0},
+            "length": {"type": "lognormal", "median": 250, "sigma": 0.6, "min": 5, "max": 2000},
+            "failure_rate": 0.01,
+            "failure_status": 503,
+            "timeout_rate": 0.002,
+            "timeout_seconds": 30.0,
+            "decode_in_generate": True
+        }
+    }
+    
+    # Provider HTTP client pool (one shared client per provider)
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0  # seconds
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_READ_TIMEOUT: float = 120.0
+    HTTP_WRITE_TIMEOUT: float = 10.0
+    HTTP_POOL_TIMEOUT: float = 10.0
+    
     # HoYo Models Configuration
     HOYO_MODELS: dict = {
         "HoYo-GPT-4": {
@@ -54,7 +125,8 @@ class Settings(BaseSettings):
             "capabilities": ["code", "analysis", "creative", "math", "reasoning", "vision"],
             "cost_per_token": 0.00003,
             "rate_limit": 100,
-            "context_window": 128000
+            "context_window": 128000,
+            "fallback": "HoYo-Claude"  # hedge target when this model runs slow
         },
         "HoYo-Claude": {
             "name": "HoYo-Claude",
@@ -67,7 +139,8 @@ class Settings(BaseSettings):
             "capabilities": ["analysis", "writing", "creative", "research", "code"],
             "cost_per_token": 0.00002,
             "rate_limit": 80,
-            "context_window": 200000
+            "context_window": 200000,
+            "fallback": "HoYo-GPT-4"
         },
         "HoYo-Vision": {
             "name": "HoYo-Vision",
@@ -106,7 +179,8 @@ class Settings(BaseSettings):
             "capabilities": ["code", "debugging", "refactoring", "documentation", "testing"],
             "cost_per_token": 0.00002,
             "rate_limit": 100,
-            "context_window": 128000
+            "context_window": 128000,
+            "fallback": "HoYo-GPT-4"
         },
         "HoYo-Fast": {
             "name": "HoYo-Fast",
@@ -119,23 +193,139 @@ class Settings(BaseSettings):
             "capabilities": ["chat", "simple-tasks", "quick-answers"],
             "cost_per_token": 0.000001,
             "rate_limit": 200,
-            "context_window": 16000
+            "context_window": 16000,
+            "cache_sampled": True  # FAQ-style traffic: serve repeated prompts from cache
         }
     }
     
+    # Model initialization: models load concurrently, each within
+    # MODEL_INIT_TIMEOUT, so one slow or broken adapter cannot hold up the
+    # rest. Startup waits for MODEL_INIT_WAIT ("default", "all" or "none"),
+    # the others finish in the background. Lazy models (MODEL_LAZY_LOAD, or
+    # "lazy" in a model's config) load on first use; a failed model is
+    # retried on use after MODEL_INIT_RETRY_SECONDS
+    MODEL_INIT_TIMEOUT: float = 30.0
+    MODEL_INIT_WAIT: str = "default"
+    MODEL_INIT_RETRY_SECONDS: float = 30.0
+    MODEL_LAZY_LOAD: bool = False
+    MODEL_WARMUP_CALL: bool = False  # one-token request while loading (validates credentials)
+    
+    # Tokenizer ("bpe" or "heuristic"); empty vocab path uses the bundled vocab
+    TOKENIZER: str = "bpe"
+    TOKENIZER_VOCAB_PATH: str = ""
+    TOKENIZER_CACHE_SIZE: int = 65536
+    
+    # Conversation context assembly
+    CONTEXT_HISTORY_ENABLED: bool = True
+    CONTEXT_MAX_MESSAGES: int = 200
+    CONTEXT_BATCH_SIZE: int = 50  # rows fetched per round trip
+    
     # Redis Configuration
     REDIS_URL: str = "redis://localhost:6379/0"
     CACHE_TTL: int = 3600  # 1 hour
     
+    # Response cache (exact-match, in-process)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    RESPONSE_CACHE_SAMPLED: bool = False  # also cache temperature > 0 requests for every model
+    
+    # Single-flight: identical concurrent requests share one upstream generation
+    SINGLE_FLIGHT_ENABLED: bool = True
+    
+    # Streaming: coalesce model chunks into frames by latency window or size
+    # (the first chunk is never delayed); clients may override both per request
+    STREAM_COALESCE_ENABLED: bool = True
+    STREAM_COALESCE_MS: float = 30.0
+    STREAM_COALESCE_MAX_BYTES: int = 1024
+    
+    # Resumable streams: each generation keeps its last STREAM_RESUME_BUFFER_CHARS
+    # characters so clients can reconnect with generation_id + offset while it
+    # runs and for STREAM_RESUME_TTL seconds after; a generation nobody follows
+    # for STREAM_RESUME_GRACE seconds is cancelled
+    STREAM_RESUME_BUFFER_CHARS: int = 65536
+    STREAM_RESUME_TTL: float = 120.0
+    STREAM_RESUME_GRACE: float = 15.0
+    STREAM_RESUME_MAX_RETAINED: int = 1000
+    
+    # Checkpoint streamed responses: the partial assistant message is written
+    # (one INSERT, then a single UPDATE per checkpoint) every
+    # STREAM_CHECKPOINT_TOKENS tokens or STREAM_CHECKPOINT_SECONDS, whichever
+    # comes first, so a crash mid-generation keeps what was generated
+    STREAM_CHECKPOINT_ENABLED: bool = True
+    STREAM_CHECKPOINT_TOKENS: int = 256
+    STREAM_CHECKPOINT_SECONDS: float = 5.0
+    
+    # Hedged requests: once a call runs past HEDGE_PERCENTILE of the model's
+    # recent latency, race a second call (the model's "fallback" or itself)
+    HEDGING_ENABLED: bool = True
+    HEDGE_PERCENTILE: float = 95.0
+    HEDGE_MIN_SAMPLES: int = 20  # latency samples needed before hedging a model
+    HEDGE_MIN_DELAY: float = 0.05  # seconds
+    LATENCY_WINDOW_SECONDS: float = 300.0  # rolling histogram window
+    
+    # Per-provider circuit breaker: open on a high error or slow-call rate over
+    # the window, fail fast (or reroute to "fallback") while open, then probe
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_BREAKER_WINDOW: float = 60.0  # seconds of call outcomes considered
+    CIRCUIT_BREAKER_MIN_CALLS: int = 10
+    CIRCUIT_BREAKER_ERROR_RATE: float = 0.5
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS: float = 30.0  # time to answer / first chunk
+    CIRCUIT_BREAKER_SLOW_CALL_RATE: float = 0.8
+    CIRCUIT_BREAKER_OPEN_SECONDS: float = 30.0
+    CIRCUIT_BREAKER_HALF_OPEN_PROBES: int = 3
+    
     # File Upload
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     UPLOAD_PATH: Path = Path("./uploads")
     ALLOWED_EXTENSIONS: List[str] = [".jpg", ".jpeg", ".png", ".gif", ".webp", ".pdf", ".txt", ".md", ".py", ".js", ".ts", ".jsx", ".tsx"]
     
+    # Batch jobs (JSONL in, JSONL out)
+    BATCH_STORAGE_PATH: Path = Path("./batches")
+    BATCH_MAX_UPLOAD_SIZE: int = 50 * 1024 * 1024  # 50MB
+    BATCH_MAX_ITEMS: int = 50000
+    BATCH_CONCURRENCY: int = 8  # in-flight items per job
+    BATCH_MAX_ACTIVE_JOBS: int = 4
+    BATCH_PROGRESS_INTERVAL: float = 2.0  # seconds between progress writes
+    BATCH_MAX_RETRIES: int = 5  # per item, on 429/503
+    
+    # Semantic search over message history: per-user memory-mapped vector files
+    VECTOR_SEARCH_ENABLED: bool = True
+    VECTOR_INDEX_PATH: Path = Path("./vector_index")
+    VECTOR_EMBEDDER: str = "hashing"  # "hashing" (local, deterministic) or "openai"
+    VECTOR_DIM: int = 256
+    VECTOR_BATCH_SIZE: int = 64  # messages embedded per call
+    VECTOR_BATCH_WAIT: float = 0.05  # seconds to gather a batch
+    VECTOR_MAX_CHARS: int = 8000  # message prefix that is embedded
+    VECTOR_COMPACT_RATIO: float = 0.25  # rewrite a partition once this share of it is deleted
+    OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    
     # Rate Limiting
     RATE_LIMIT_REQUESTS: int = 100
     RATE_LIMIT_WINDOW: int = 60  # seconds
     
+    # Per-model limits (HOYO_MODELS rate_limit is requests per minute)
+    MODEL_RATE_LIMIT_ENABLED: bool = True
+    MODEL_RATE_LIMIT_BURST_SECONDS: float = 10.0  # bucket capacity in seconds of rate
+    MODEL_MAX_CONCURRENCY: int = 20  # default when a model has no max_concurrency
+    MODEL_MAX_QUEUE_WAIT: float = 10.0  # longest a caller queues before a 429
+    MODEL_MAX_QUEUE_SIZE: int = 500
+    
+    # Fair scheduling of model concurrency slots by plan (weights = relative share)
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_PLAN_WEIGHTS: dict = {"enterprise": 6, "pro": 3, "free": 1, "background": 0.25}
+    
+    # Background conversation summaries: once SUMMARY_TRIGGER_TOKENS were written
+    # past a conversation's summary watermark, fold those messages (at most
+    # SUMMARY_CHUNK_TOKENS per call) into Conversation.summary. Keep the trigger
+    # well below the context budget so unsummarized messages always fit in context
+    SUMMARY_ENABLED: bool = True
+    SUMMARY_MODEL: str = "HoYo-Fast"
+    SUMMARY_TRIGGER_TOKENS: int = 2000
+    SUMMARY_CHUNK_TOKENS: int = 4000
+    SUMMARY_MAX_TOKENS: int = 500
+    SUMMARY_MAX_LOAD: float = 0.5  # start a call only while the model's slots are at most this busy
+    SUMMARY_IDLE_POLL: float = 1.0  # seconds between capacity checks
+    
     # WebSocket
     WS_MESSAGE_QUEUE_SIZE: int = 100
     WS_HEARTBEAT_INTERVAL: int = 30
@@ -56,16 +56,85 @@ async def init_db():
         
         # Create all tables
         await conn.run_sync(Base.metadata.create_all)
+        
+        # Replace raw API keys with their digests
+        await conn.run_sync(hash_legacy_api_keys)
+        
+        # Add columns and indexes introduced after the tables were created
+        await conn.run_sync(upgrade_schema)
+        
+        # Full-text search index over messages and conversation titles
+        from app.services.text_search import create_search_index
+        await conn.run_sync(create_search_index)
     
     # Create initial data
     await create_initial_data()
 
+def upgrade_schema(connection):
+    """
+    Add missing columns and indexes to existing tables (SQLite has no
+    create_all support for altering tables)
+    """
+    from sqlalchemy import inspect
+    
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.exec_driver_sql(
+                    f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'
+                )
+                print(f"✅ Added column {table.name}.{column.name}")
+        
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+def hash_legacy_api_keys(connection):
+    """
+    Rebuild an api_keys table from before keys were stored as SHA-256
+    digests, hashing the raw keys it holds (SQLite cannot drop the old
+    NOT NULL key column in place)
+    """
+    from sqlalchemy import MetaData, Table, inspect
+    from app.models.database import APIKey
+    from app.core.security import hash_api_key
+    
+    inspector = inspect(connection)
+    if not inspector.has_table("api_keys"):
+        return
+    if "key" not in {column["name"] for column in inspector.get_columns("api_keys")}:
+        return
+    
+    legacy = Table("api_keys", MetaData(), autoload_with=connection)
+    rows = connection.execute(legacy.select()).mappings().all()
+    legacy.drop(connection)
+    APIKey.__table__.create(connection)
+    if rows:
+        connection.execute(APIKey.__table__.insert(), [
+            {
+                **{name: row[name] for name in ["id", "user_id", "name", "is_active", "usage_count"]},
+                "key_hash": hash_api_key(row["key"]),
+                "key_prefix": row["key"][:12],
+                "last_used": row["last_used"],
+                "created_at": row["created_at"],
+                "expires_at": row["expires_at"]
+            }
+            for row in rows
+        ])
+    print(f"✅ Hashed {len(rows)} API key(s)")
+
 async def create_initial_data():
     """
     Create initial test users and data
     """
     from app.models.database import User, Conversation, Message
     from app.core.security import get_password_hash
+    from app.services.tokenizer import get_tokenizer
     import uuid
     from datetime import datetime
     
@@ -82,7 +151,7 @@ async def create_initial_data():
                 id=str(uuid.uuid4()),
                 username="hvano",
                 email="hvano@hoyo.tech",
-                hashed_password=get_password_hash("hoyo123"),
+                hashed_password=await get_password_hash("hoyo123"),
                 plan="pro",
                 credits=500,
                 is_active=True,
@@ -92,7 +161,7 @@ async def create_initial_data():
                 id=str(uuid.uuid4()),
                 username="demo",
                 email="demo@hoyo.tech",
-                hashed_password=get_password_hash("hoyo123"),
+                hashed_password=await get_password_hash("hoyo123"),
                 plan="free",
                 credits=100,
                 is_active=True,
@@ -102,7 +171,7 @@ async def create_initial_data():
                 id=str(uuid.uuid4()),
                 username="admin",
                 email="admin@hoyo.tech",
-                hashed_password=get_password_hash("hoyo123"),
+                hashed_password=await get_password_hash("hoyo123"),
                 plan="enterprise",
                 credits=9999,
                 is_active=True,
@@ -137,6 +206,7 @@ async def create_initial_data():
         db.add_all(conversations)
         
         # Add welcome messages
+        tokenizer = get_tokenizer()
         for conv in conversations:
             messages = [
                 Message(
@@ -156,6 +226,8 @@ async def create_initial_data():
                     created_at=datetime.utcnow()
                 )
             ]
+            for message in messages:
+                message.token_count = tokenizer.count(message.content)
             db.add_all(messages)
         
         await db.commit()
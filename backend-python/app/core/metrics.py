@@ -1,7 +1,7 @@
 """
 Prometheus metrics for monitoring
 """
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Optional, Tuple
 import time
 import psutil
 import os
@@ -15,6 +15,17 @@ metrics_data = {
     "active_connections": 0,
 }
 
+# Metric sources registered by services: name -> (callable returning {metric: value}, label)
+collectors: Dict[str, Tuple[Callable[[], Dict[str, Any]], Optional[str]]] = {}
+
+def register_collector(name: str, collector: Callable[[], Dict[str, Any]], label: Optional[str] = None):
+    """
+    Register a service stats callable exported as hoyo_<name>_<metric>.
+    With a label, values are {label_value: number} dicts rendered as
+    hoyo_<name>_<metric>{<label>="<label_value>"}.
+    """
+    collectors[name] = (collector, label)
+
 def increment_request():
     """Increment total requests counter"""
     metrics_data["requests_total"] += 1
@@ -76,4 +87,29 @@ hoyo_memory_usage_bytes {process.memory_info().rss}
 hoyo_cpu_usage_percent {process.cpu_percent()}
 """
     
-    return metrics
+    return metrics + generate_collector_metrics()
+
+def generate_collector_metrics() -> str:
+    """Render numeric values from registered collectors"""
+    lines = []
+    for name, (collector, label) in collectors.items():
+        for key, value in collector().items():
+            metric = f"hoyo_{name}_{key}"
+            if label and isinstance(value, dict):
+                samples = [
+                    (f'{metric}{{{label}="{label_value}"}}', sample)
+                    for label_value, sample in value.items()
+                ]
+            else:
+                samples = [(metric, value)]
+            samples = [
+                (sample_name, sample) for sample_name, sample in samples
+                if isinstance(sample, (int, float)) and not isinstance(sample, bool)
+            ]
+            if not samples:
+                continue
+            metric_type = "counter" if key.endswith("_total") else "gauge"
+            lines.append(f"# TYPE {metric} {metric_type}")
+            lines.extend(f"{sample_name} {sample}" for sample_name, sample in samples)
+    
+    return "\n".join(lines) + "\n" if lines else ""
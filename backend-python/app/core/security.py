@@ -2,30 +2,49 @@
 Security utilities for authentication and authorization
 """
 from datetime import datetime, timedelta
+import hashlib
+import math
+import secrets
+import uuid
 from typing import Optional, Union, Any
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.database import get_db
 from app.models.database import User
+from app.services.activity import activity_tracker
+from app.services.auth_cache import APIKeyIdentity, auth_cache
+from app.services.password_hasher import HasherSaturated, password_hasher
+from app.services.revocation import token_revocations
 
-# Password hashing - using sha256_crypt instead of bcrypt for compatibility
-pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
+# OAuth2 scheme; optional, as API keys are accepted as well
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
-# OAuth2 scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+def hashing_unavailable(error: HasherSaturated) -> HTTPException:
+    """503 for a full password hashing queue"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry",
+        headers={"Retry-After": str(math.ceil(error.retry_after))}
+    )
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plain password against a hashed password"""
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a plain password against a hashed password (in the hashing pool)"""
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except HasherSaturated as e:
+        raise hashing_unavailable(e)
 
-def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    """Hash a password (in the hashing pool)"""
+    try:
+        return await password_hasher.hash(password)
+    except HasherSaturated as e:
+        raise hashing_unavailable(e)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
@@ -35,7 +54,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire, "type": "access"})
+    to_encode.update({"exp": expire, "type": "access", "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -43,7 +62,7 @@ def create_refresh_token(data: dict) -> str:
     """Create a JWT refresh token"""
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
+    to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -59,35 +78,110 @@ def decode_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+API_KEY_PREFIX = "hoyo_sk_"
+
+def generate_api_key() -> str:
+    """Create a new random API key (shown to its owner once)"""
+    return API_KEY_PREFIX + secrets.token_urlsafe(32)
+
+def hash_api_key(api_key: str) -> str:
+    """SHA-256 digest under which an API key is stored and looked up"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+async def verify_api_key(api_key: str, db: AsyncSession) -> Optional[str]:
+    """Verify API key and return the id of the user it belongs to
+    
+    Keys are looked up by digest, through auth_cache; usage is counted by
+    the activity tracker rather than committed per request.
+    """
+    from sqlalchemy import select
+    from app.models.database import APIKey
+    
+    digest = hash_api_key(api_key)
+    if auth_cache.is_bad_api_key(digest):
+        return None
+    
+    identity = auth_cache.get_api_key(digest)
+    if identity is None:
+        result = await db.execute(
+            select(APIKey.id, APIKey.user_id, APIKey.expires_at).where(
+                APIKey.key_hash == digest,
+                APIKey.is_active == True
+            )
+        )
+        row = result.first()
+        if row is None:
+            auth_cache.set_bad_api_key(digest)
+            return None
+        identity = APIKeyIdentity(*row)
+        auth_cache.set_api_key(digest, identity)
+    
+    # Check expiration
+    if identity.expires_at and identity.expires_at < datetime.utcnow():
+        return None
+    
+    # Update usage (written behind, in batches)
+    activity_tracker.record_api_key_use(identity.key_id, datetime.utcnow())
+    
+    return identity.user_id
+
 async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
+    token: Optional[str] = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+    api_key: Optional[str] = Depends(api_key_header)
 ) -> User:
-    """Get the current authenticated user from JWT token"""
+    """Get the current authenticated user from JWT token or API key
+    
+    An API key is accepted in the X-API-Key header or as the bearer token.
+    The user is detached from the session and may be shared with other
+    requests: endpoints that change it load their own copy and invalidate
+    it in auth_cache.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = decode_token(token)
+    if api_key is None and token and token.startswith(API_KEY_PREFIX):
+        api_key = token
+    
+    if api_key is not None:
+        user_id = await verify_api_key(api_key, db)
+        if user_id is None:
+            raise credentials_exception
+    elif token:
+        payload = auth_cache.get_token(token)
+        if payload is None:
+            try:
+                payload = decode_token(token)
+            except JWTError:
+                raise credentials_exception
+            auth_cache.set_token(token, payload)
+        
         user_id: str = payload.get("sub")
         token_type: str = payload.get("type")
-        
         if user_id is None or token_type != "access":
             raise credentials_exception
-            
-    except JWTError:
+        
+        # One Bloom filter check unless the token may have been revoked
+        if await token_revocations.is_revoked(payload.get("jti"), db):
+            raise credentials_exception
+    else:
         raise credentials_exception
     
-    # Get user from database
-    from sqlalchemy import select
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-    
+    # Get user from the cache, or from database (detached, so it can be shared)
+    user = auth_cache.get_user(user_id)
     if user is None:
-        raise credentials_exception
+        from sqlalchemy import select
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one_or_none()
+        
+        if user is None:
+            raise credentials_exception
+        
+        db.expunge(user)
+        auth_cache.set_user(user)
     
     if not user.is_active:
         raise HTTPException(
@@ -95,9 +189,10 @@ async def get_current_user(
             detail="Inactive user"
         )
     
-    # Update last login
-    user.last_login = datetime.utcnow()
-    await db.commit()
+    # Update last login (written behind, in batches)
+    if api_key is None:
+        user.last_login = datetime.utcnow()
+        activity_tracker.record_login(user.id, user.last_login)
     
     return user
 
@@ -132,30 +227,3 @@ def check_user_plan(required_plan: str):
         return current_user
     
     return plan_checker
-
-def verify_api_key(api_key: str, db: AsyncSession) -> Optional[User]:
-    """Verify API key and return associated user"""
-    from sqlalchemy import select
-    from app.models.database import APIKey
-    
-    result = db.execute(
-        select(APIKey).where(
-            APIKey.key == api_key,
-            APIKey.is_active == True
-        )
-    )
-    api_key_obj = result.scalar_one_or_none()
-    
-    if not api_key_obj:
-        return None
-    
-    # Check expiration
-    if api_key_obj.expires_at and api_key_obj.expires_at < datetime.utcnow():
-        return None
-    
-    # Update usage
-    api_key_obj.last_used = datetime.utcnow()
-    api_key_obj.usage_count += 1
-    db.commit()
-    
-    return api_key_obj.user
@@ -1,7 +1,7 @@
 """
 SQLAlchemy database models
 """
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, Float, ForeignKey, Enum, JSON
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, Float, ForeignKey, Enum, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -18,6 +18,13 @@ class MessageRole(str, enum.Enum):
     ASSISTANT = "assistant"
     SYSTEM = "system"
 
+class BatchStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
 class User(Base):
     __tablename__ = "users"
     
@@ -62,6 +69,7 @@ class Conversation(Base):
     is_archived = Column(Boolean, default=False)
     is_pinned = Column(Boolean, default=False)
     summary = Column(Text, nullable=True)
+    summary_watermark = Column(DateTime, nullable=True)  # created_at of the last message in summary
     tags = Column(JSON, default=[])
     settings = Column(JSON, default={})
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -96,6 +104,7 @@ class Message(Base):
     content = Column(Text, nullable=False)
     model = Column(String, nullable=True)
     tokens_used = Column(Integer, default=0)
+    token_count = Column(Integer, nullable=True)  # tokens in content, counted at write time
     cost = Column(Float, default=0.0)
     message_metadata = Column(JSON, default={})
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -104,6 +113,10 @@ class Message(Base):
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
     
+    __table_args__ = (
+        Index("ix_messages_conversation_created", "conversation_id", "created_at"),
+    )
+    
     def to_dict(self):
         return {
             "id": self.id,
@@ -156,7 +169,8 @@ class APIKey(Base):
     id = Column(String, primary_key=True, index=True)
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     name = Column(String, nullable=False)
-    key = Column(String, unique=True, nullable=False)
+    key_hash = Column(String, unique=True, index=True, nullable=False)  # SHA-256 hex; raw keys are never stored
+    key_prefix = Column(String, nullable=False)  # leading characters, to tell keys apart
     is_active = Column(Boolean, default=True)
     last_used = Column(DateTime, nullable=True)
     usage_count = Column(Integer, default=0)
@@ -166,6 +180,14 @@ class APIKey(Base):
     # Relationships
     user = relationship("User", back_populates="api_keys")
 
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    jti = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)  # rows are pruned once the token expired
+    revoked_at = Column(DateTime, default=datetime.utcnow, index=True)
+
 class VoiceSession(Base):
     __tablename__ = "voice_sessions"
     
@@ -189,3 +211,41 @@ class ModelUsage(Base):
     request_count = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
     date = Column(DateTime, nullable=False)  # For daily aggregation
+
+class BatchJob(Base):
+    __tablename__ = "batch_jobs"
+    
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    model = Column(String, nullable=False)
+    status = Column(Enum(BatchStatus), default=BatchStatus.QUEUED, index=True)
+    input_path = Column(String, nullable=False)
+    output_path = Column(String, nullable=False)
+    total_items = Column(Integer, default=0)
+    completed_items = Column(Integer, default=0)
+    failed_items = Column(Integer, default=0)
+    tokens_used = Column(Integer, default=0)
+    cost = Column(Float, default=0.0)
+    options = Column(JSON, default={})  # default sampling params for items
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "model": self.model,
+            "status": self.status.value if self.status else "queued",
+            "total_items": self.total_items,
+            "completed_items": self.completed_items,
+            "failed_items": self.failed_items,
+            "progress": round((self.completed_items + self.failed_items) / self.total_items, 4) if self.total_items else 0.0,
+            "tokens_used": self.tokens_used,
+            "cost": round(self.cost or 0.0, 6),
+            "options": self.options,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None
+        }
@@ -9,6 +9,14 @@ class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=10000)
     model: str = Field(default="HoYo-GPT-4")
     stream: bool = Field(default=False)
+    temperature: Optional[float] = Field(default=None, ge=0.0, le=2.0)
+    top_p: Optional[float] = Field(default=None, gt=0.0, le=1.0)
+    max_tokens: Optional[int] = Field(default=None, ge=1)
+    cache: Optional[bool] = Field(default=None)  # opt in/out of the response cache
+    coalesce_ms: Optional[float] = Field(default=None, ge=0.0, le=1000.0)  # stream frame window, 0 = per chunk
+    coalesce_bytes: Optional[int] = Field(default=None, ge=1, le=65536)
+    generation_id: Optional[str] = Field(default=None)  # resume this stream instead of starting one
+    offset: int = Field(default=0, ge=0)  # "offset" of the last frame received
 
 class ChatResponse(BaseModel):
     user_message: Dict[str, Any]
@@ -0,0 +1,166 @@
+"""
+Write-behind tracking of per-request user and API-key activity
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import case, func, update
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.database import APIKey, User
+
+# Rows per UPDATE ... CASE statement (keeps bound parameters well under SQLite's limit)
+FLUSH_CHUNK_SIZE = 500
+
+
+class ActivityTracker:
+    """Collects last_login and API-key usage touches in memory and writes
+    them in batches.
+
+    Requests only record the touch: the latest login time per user and the
+    use count and last use per API key. Every ACTIVITY_FLUSH_SECONDS (and
+    once more on shutdown) all of them are written in one transaction with
+    one UPDATE ... CASE per table and chunk, instead of a commit per request.
+    """
+
+    def __init__(self):
+        self._logins: Dict[str, datetime] = {}
+        self._key_uses: Dict[str, List] = {}  # key id -> [uses, last used]
+        self._touches = 0
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Task] = None
+        self.touches_total = 0
+        self.flushes_total = 0
+        self.failed_flushes_total = 0
+        self.rows_written_total = 0
+        self.last_flush_rows = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.flush_seconds_total = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def record_login(self, user_id: str, at: datetime):
+        self._logins[user_id] = at
+        self._touches += 1
+        self.touches_total += 1
+
+    def record_api_key_use(self, key_id: str, at: datetime):
+        entry = self._key_uses.get(key_id)
+        if entry is None:
+            self._key_uses[key_id] = [1, at]
+        else:
+            entry[0] += 1
+            entry[1] = max(entry[1], at)
+        self._touches += 1
+        self.touches_total += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.ACTIVITY_FLUSH_SECONDS)
+            # Shielded: stopping the flusher must not abandon a batch mid-write
+            self._flushing = asyncio.create_task(self.flush())
+            try:
+                await asyncio.shield(self._flushing)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Failed to flush user activity: {e}")
+
+    async def flush(self):
+        """Write the pending touches; if it fails or is cancelled they are kept
+        for the next flush"""
+        if not self._logins and not self._key_uses:
+            return
+        logins, self._logins = self._logins, {}
+        key_uses, self._key_uses = self._key_uses, {}
+        touches, self._touches = self._touches, 0
+
+        start = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                user_ids = list(logins)
+                for i in range(0, len(user_ids), FLUSH_CHUNK_SIZE):
+                    chunk = {user_id: logins[user_id] for user_id in user_ids[i:i + FLUSH_CHUNK_SIZE]}
+                    await db.execute(
+                        update(User)
+                        .where(User.id.in_(chunk))
+                        .values(last_login=case(chunk, value=User.id))
+                        .execution_options(synchronize_session=False)
+                    )
+                key_ids = list(key_uses)
+                for i in range(0, len(key_ids), FLUSH_CHUNK_SIZE):
+                    chunk = key_ids[i:i + FLUSH_CHUNK_SIZE]
+                    await db.execute(
+                        update(APIKey)
+                        .where(APIKey.id.in_(chunk))
+                        .values(
+                            usage_count=func.coalesce(APIKey.usage_count, 0) + case(
+                                {key_id: key_uses[key_id][0] for key_id in chunk}, value=APIKey.id
+                            ),
+                            last_used=case({key_id: key_uses[key_id][1] for key_id in chunk}, value=APIKey.id)
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
+                await db.commit()
+        except BaseException:
+            self.failed_flushes_total += 1
+            self._restore(logins, key_uses, touches)
+            raise
+
+        elapsed = time.perf_counter() - start
+        rows = len(logins) + len(key_uses)
+        self.flushes_total += 1
+        self.rows_written_total += rows
+        self.last_flush_rows = rows
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self.flush_seconds_total += elapsed
+
+    def _restore(self, logins: Dict[str, datetime], key_uses: Dict[str, List], touches: int):
+        """Merge touches from a failed flush back into the pending ones"""
+        for user_id, at in logins.items():
+            self._logins[user_id] = max(at, self._logins.get(user_id, at))
+        for key_id, (uses, at) in key_uses.items():
+            entry = self._key_uses.setdefault(key_id, [0, at])
+            entry[0] += uses
+            entry[1] = max(entry[1], at)
+        self._touches += touches
+
+    async def shutdown(self):
+        """Stop the flusher, let a flush in progress finish and write what is
+        still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._flushing is not None:
+            await asyncio.gather(self._flushing, return_exceptions=True)
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"❌ Failed to flush user activity on shutdown: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Flush statistics; commits_saved_total counts the per-request
+        commits the batching replaced"""
+        flushed_touches = self.touches_total - self._touches
+        return {
+            "pending_logins": len(self._logins),
+            "pending_api_keys": len(self._key_uses),
+            "touches_total": self.touches_total,
+            "flushes_total": self.flushes_total,
+            "failed_flushes_total": self.failed_flushes_total,
+            "rows_written_total": self.rows_written_total,
+            "commits_saved_total": max(flushed_touches - self.flushes_total, 0),
+            "last_flush_rows": self.last_flush_rows,
+            "last_flush_seconds": round(self.last_flush_seconds, 6),
+            "max_flush_seconds": round(self.max_flush_seconds, 6),
+            "flush_seconds_total": round(self.flush_seconds_total, 6)
+        }
+
+
+activity_tracker = ActivityTracker()
@@ -2,14 +2,32 @@
 AI Service for handling multiple AI models
 """
 import asyncio
-from typing import Dict, Any, List, Optional, AsyncGenerator
+from typing import Dict, Any, List, Optional, AsyncGenerator, Awaitable, Callable, Tuple
 import json
+import re
+import time
 import uuid
 from datetime import datetime
 from abc import ABC, abstractmethod
 
+import httpx
+
 from app.core.config import settings
+from app.core.metrics import register_collector
 from app.models.database import User
+from app.services.cache import ResponseCache
+from app.services.circuit_breaker import CircuitBreakers, CircuitOpen
+from app.services.generations import Generation, GenerationRegistry, ResumeError
+from app.services.hedging import Hedger, LatencyTracker
+from app.services.mock_profiles import MockRequest, get_mock_profiles
+from app.services.model_loader import ModelLoader, ModelUnavailable
+from app.services.rate_limiter import RateLimiter, RateLimitExceeded
+from app.services.singleflight import SingleFlight
+from app.services.streaming import StreamAccumulator, StreamStats, coalesce, coalesce_settings
+from app.services.tokenizer import get_tokenizer
+
+# Fair scheduler queue for background work (summaries), weighted below every plan
+BACKGROUND_SCHEDULE_KEY = {"plan": "background", "user_key": "background"}
 
 class AIModel(ABC):
     """Abstract base class for AI models"""
@@ -29,28 +47,73 @@ class AIModel(ABC):
     async def stream(self, prompt: str, **kwargs) -> AsyncGenerator[str, None]:
         """Stream response from model"""
         pass
+    
+    async def warmup(self):
+        """Prepare the model before it takes traffic (client setup, credential checks)"""
+        pass
 
 class MockModel(AIModel):
-    """Mock model for development/testing"""
+    """Mock model for development/testing and load generation
+    
+    Time to first token, inter-token latency, response length and failures
+    follow the model's profile (MOCK_PROFILES, see app.services.mock_profiles).
+    """
+    
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self.profiles = get_mock_profiles()
     
     async def generate(self, prompt: str, **kwargs) -> str:
-        await asyncio.sleep(0.5)  # Simulate processing time
+        request = self.profiles.request(self.name, prompt)
+        await self._first_token(request)
+        text = self._text(prompt, request)
         
-        # Detect request type and generate appropriate response
-        if any(word in prompt.lower() for word in ["код", "code", "function", "программ"]):
-            return self._generate_code_response(prompt)
-        elif any(word in prompt.lower() for word in ["анализ", "analyze", "исследов"]):
-            return self._generate_analysis_response(prompt)
-        else:
-            return self._generate_chat_response(prompt)
+        if request.profile.decode_in_generate:
+            words = len(text.split())
+            if request.failure:
+                words = int(request.failure_point * words)
+            await asyncio.sleep(sum(request.itl() for _ in range(words - 1)))
+        if request.failure:
+            raise self._failure(request)
+        return text
     
     async def stream(self, prompt: str, **kwargs) -> AsyncGenerator[str, None]:
-        response = await self.generate(prompt, **kwargs)
-        words = response.split()
+        request = self.profiles.request(self.name, prompt)
+        await self._first_token(request)
+        words = self._text(prompt, request).split()
+        fail_at = int(request.failure_point * len(words)) if request.failure else None
         
         for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(request.itl())
+            if i == fail_at:
+                raise self._failure(request)
             yield word + (" " if i < len(words) - 1 else "")
-            await asyncio.sleep(0.05)  # Simulate streaming delay
+    
+    async def _first_token(self, request: MockRequest):
+        if request.timeout:
+            await asyncio.sleep(request.profile.timeout_seconds)
+            raise httpx.ReadTimeout(f"Simulated {self.name} timeout")
+        await asyncio.sleep(request.ttft)
+    
+    def _failure(self, request: MockRequest) -> Exception:
+        from app.services.providers import UpstreamError
+        return UpstreamError("mock", request.profile.failure_status, f"Simulated {self.name} failure")
+    
+    def _text(self, prompt: str, request: MockRequest) -> str:
+        # Detect request type and generate appropriate response
+        if any(word in prompt.lower() for word in ["код", "code", "function", "программ"]):
+            text = self._generate_code_response(prompt)
+        elif any(word in prompt.lower() for word in ["анализ", "analyze", "исследов"]):
+            text = self._generate_analysis_response(prompt)
+        else:
+            text = self._generate_chat_response(prompt)
+        
+        if request.length is None:
+            return text
+        # Repeat or cut the canned response to the profile's length
+        words = text.split()
+        return " ".join(words[i % len(words)] for i in range(max(request.length, 1)))
     
     def _generate_code_response(self, prompt: str) -> str:
         return f"""Анализируя ваш запрос о коде, вот решение от {self.name}:
@@ -135,32 +198,114 @@ class AIService:
     def __init__(self):
         self.models: Dict[str, AIModel] = {}
         self.default_model = "HoYo-GPT-4"
+        self.client_pool = None
+        self.response_cache = ResponseCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl=settings.CACHE_TTL
+        )
+        self.single_flight = SingleFlight()
+        self.rate_limiter = RateLimiter(settings.HOYO_MODELS)
+        self.latency = LatencyTracker(window=settings.LATENCY_WINDOW_SECONDS)
+        self.hedger = Hedger()
+        self.circuit_breakers = CircuitBreakers()
+        self.stream_stats = StreamStats()
+        self.generations = GenerationRegistry(
+            buffer_chars=settings.STREAM_RESUME_BUFFER_CHARS,
+            ttl=settings.STREAM_RESUME_TTL,
+            grace=settings.STREAM_RESUME_GRACE,
+            max_retained=settings.STREAM_RESUME_MAX_RETAINED
+        )
+        self.loader = ModelLoader(self.models, self._load_model)
+        for config in settings.HOYO_MODELS.values():
+            self.circuit_breakers.get(config.get("provider", "mock"))
     
     async def initialize(self):
-        """Initialize all AI models"""
-        for model_name, config in settings.HOYO_MODELS.items():
-            try:
-                # For now, use mock models (can be extended with real API integrations)
-                self.models[model_name] = MockModel(config)
-                print(f"✅ Loaded model: {model_name}")
-            except Exception as e:
-                print(f"❌ Failed to load model {model_name}: {e}")
+        """Start loading the AI models
+        
+        Models load concurrently; this returns once the models MODEL_INIT_WAIT
+        asks for are ready (or failed) and the rest finish in the background.
+        """
+        from app.services.providers import ProviderClientPool
+        
+        self.client_pool = ProviderClientPool()
+        register_collector("response_cache", self.response_cache.stats)
+        register_collector("single_flight", self.single_flight.stats)
+        register_collector("tokenizer", get_tokenizer().stats)
+        register_collector("model_limiter", self.rate_limiter.stats, label="model")
+        register_collector("scheduler", self.rate_limiter.scheduler_stats, label="plan")
+        register_collector("hedging", self.hedger.stats)
+        register_collector("model_latency", self.latency.stats, label="model")
+        register_collector("circuit_breaker", self.circuit_breakers.stats, label="provider")
+        register_collector("streams", self.stream_stats.stats)
+        register_collector("generations", self.generations.stats)
+        register_collector("models", self.loader.stats)
+        
+        lazy = [
+            name for name, config in settings.HOYO_MODELS.items()
+            if config.get("lazy", settings.MODEL_LAZY_LOAD) and name != self.default_model
+        ]
+        self.loader.start(settings.HOYO_MODELS, lazy)
+        
+        if settings.MODEL_INIT_WAIT == "all":
+            await self.loader.wait(settings.HOYO_MODELS)
+        elif settings.MODEL_INIT_WAIT == "default":
+            await self.loader.wait([self.default_model])
+    
+    async def _load_model(self, config: dict) -> AIModel:
+        """Create one model and get it ready for traffic"""
+        model = self._create_model(config)
+        await model.warmup()
+        if settings.MODEL_WARMUP_CALL:
+            await model.generate("ping", max_tokens=1)
+        return model
+    
+    async def _require_model(self, model_name: str) -> Optional[Dict[str, Any]]:
+        """Error payload if the model is unknown or unavailable; loads lazy models"""
+        if model_name in self.models:
+            return None
+        if not self.loader.is_configured(model_name):
+            return {
+                "error": f"Model {model_name} not found",
+                "available_models": list(self.loader.states) or list(self.models.keys())
+            }
+        try:
+            await self.loader.require(model_name)
+        except ModelUnavailable as e:
+            return self._model_unavailable_error(e)
+        return None
+    
+    def _create_model(self, config: dict) -> AIModel:
+        """Create a provider adapter or a mock model depending on AI_BACKEND"""
+        from app.services.providers import create_provider_model, provider_api_key
+        
+        backend = settings.AI_BACKEND
+        use_provider = backend == "live" or (
+            backend == "auto" and provider_api_key(config.get("provider", ""))
+        )
+        if use_provider:
+            model = create_provider_model(config, self.client_pool)
+            if model is not None:
+                return model
+        return MockModel(config)
     
     async def process_chat(
         self, 
         message: str, 
         model: str = None,
         conversation_id: Optional[str] = None,
-        user: Optional[User] = None
+        user: Optional[User] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        use_cache: Optional[bool] = None,
+        context: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        """Process a chat message"""
+        """Process a chat message (optionally with assembled conversation context)"""
         model_name = model or self.default_model
         
-        if model_name not in self.models:
-            return {
-                "error": f"Model {model_name} not found",
-                "available_models": list(self.models.keys())
-            }
+        error = await self._require_model(model_name)
+        if error is not None:
+            return error
         
         # Check user plan restrictions
         if user and not self._check_model_access(user, model_name):
@@ -169,19 +314,36 @@ class AIService:
                 "required_plan": self._get_required_plan(model_name)
             }
         
-        # Generate response
-        ai_model = self.models[model_name]
-        response = await ai_model.generate(message)
+        params = self._sampling_params(model_name, temperature, top_p, max_tokens)
+        if context:
+            params["messages"] = context["messages"]
+        request_key = self._request_key(model_name, message, params)
+        cache_key = self._cache_key(request_key, model_name, params, use_cache)
         
-        # Calculate tokens and cost
-        tokens_used = self._estimate_tokens(message + response)
-        cost = self._calculate_cost(tokens_used, model_name)
+        # Serve repeated prompts from cache, otherwise generate response
+        response = self.response_cache.get(cache_key) if cache_key else None
+        cached = response is not None
+        served_model = model_name
+        if not cached:
+            try:
+                response, served_model = await self._generate(model_name, message, params, request_key, user)
+            except RateLimitExceeded as e:
+                return self._rate_limit_error(e)
+            except CircuitOpen as e:
+                return self._unavailable_error(e)
+            if cache_key:
+                self.response_cache.set(cache_key, response)
+        
+        # Calculate tokens and cost (billed to the model that answered)
+        tokens_used = self._prompt_tokens(message, context) + self._count_tokens(response)
+        cost = self._calculate_cost(tokens_used, served_model)
         
         return {
             "response": response,
-            "model": model_name,
+            "model": served_model,
             "tokens_used": tokens_used,
             "cost": cost,
+            "cached": cached,
             "conversation_id": conversation_id,
             "timestamp": datetime.utcnow().isoformat()
         }
@@ -191,56 +353,589 @@ class AIService:
         message: str,
         model: str = None,
         conversation_id: Optional[str] = None,
-        user: Optional[User] = None
+        user: Optional[User] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        use_cache: Optional[bool] = None,
+        context: Optional[Dict[str, Any]] = None,
+        coalesce_ms: Optional[float] = None,
+        coalesce_bytes: Optional[int] = None,
+        generation_id: Optional[str] = None,
+        offset: int = 0,
+        on_finish: Optional[Callable[[str, Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]] = None,
+        on_checkpoint: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None
     ) -> AsyncGenerator[Dict[str, Any], None]:
-        """Stream a chat response"""
-        model_name = model or self.default_model
+        """Stream a chat response (optionally with assembled conversation context)
         
-        if model_name not in self.models:
-            yield {
-                "error": f"Model {model_name} not found",
-                "available_models": list(self.models.keys())
-            }
+        Model chunks are coalesced into frames of at most ``coalesce_ms`` latency
+        or ``coalesce_bytes`` size; the first chunk is sent as soon as it arrives.
+        
+        The generation runs in the background: a client that disconnects can
+        pass ``generation_id`` and the ``offset`` of the last frame it received
+        to continue the stream, while it runs or for STREAM_RESUME_TTL after.
+        ``on_finish(response, result)`` is awaited once per generation to
+        persist the response, also when it was cut short; its return value is
+        sent as "message" in the done frame. A generation that fails or is
+        cancelled mid-stream ends with an error frame ("truncated", "cancelled",
+        "offset") instead of raising. With STREAM_CHECKPOINT_ENABLED,
+        ``on_checkpoint(partial_response, progress)`` is awaited in the
+        background every STREAM_CHECKPOINT_TOKENS tokens or
+        STREAM_CHECKPOINT_SECONDS (one at a time, always before on_finish).
+        """
+        owner = self._schedule_key(user)["user_key"]
+        resumed = generation_id is not None
+        
+        if resumed:
+            generation = self.generations.get(generation_id, owner)
+            if generation is None:
+                yield {
+                    "error": f"Generation {generation_id} not found or expired",
+                    "status_code": 404
+                }
+                return
+        else:
+            model_name = model or self.default_model
+            
+            error = await self._require_model(model_name)
+            if error is not None:
+                yield error
+                return
+            
+            # Check user plan restrictions
+            if user and not self._check_model_access(user, model_name):
+                yield {
+                    "error": f"Your plan doesn't have access to {model_name}",
+                    "required_plan": self._get_required_plan(model_name)
+                }
+                return
+            
+            params = self._sampling_params(model_name, temperature, top_p, max_tokens)
+            if context:
+                params["messages"] = context["messages"]
+            request_key = self._request_key(model_name, message, params)
+            cache_key = self._cache_key(request_key, model_name, params, use_cache)
+            cached_response = self.response_cache.get(cache_key) if cache_key else None
+            
+            # Stream response (replay cached responses as chunks); a stream is routed
+            # away from a provider with an open breaker before it starts
+            served_model = model_name
+            if cached_response is not None:
+                chunks = self._replay_chunks(cached_response)
+            else:
+                served_model = self._route(model_name, user)
+                if served_model != model_name:
+                    params = self._fallback_params(served_model, params)
+                chunks = self._stream(served_model, message, params, request_key, user)
+            
+            generation = self.generations.start(
+                owner,
+                served_model,
+                lambda gen: self._run_generation(
+                    gen, chunks, self._prompt_tokens(message, context), conversation_id,
+                    cache_key if cached_response is None else None, cached_response is not None,
+                    on_finish, on_checkpoint
+                )
+            )
+            offset = 0
+        
+        try:
+            text = self.generations.follow(generation, offset, resumed=resumed)
+        except ResumeError as e:
+            yield {"error": str(e), "status_code": e.status_code, "generation_id": generation.id}
             return
         
-        # Check user plan restrictions
-        if user and not self._check_model_access(user, model_name):
-            yield {
-                "error": f"Your plan doesn't have access to {model_name}",
-                "required_plan": self._get_required_plan(model_name)
-            }
+        chunks = coalesce(text, *coalesce_settings(coalesce_ms, coalesce_bytes))
+        try:
+            async for chunk in chunks:
+                offset += len(chunk)
+                yield {
+                    "chunk": chunk,
+                    "model": generation.model,
+                    "conversation_id": conversation_id,
+                    "generation_id": generation.id,
+                    "offset": offset,
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+        finally:
+            # A consumer that stops early (client disconnect) detaches from the
+            # generation, which is cancelled if nobody resumes it in time
+            await chunks.aclose()
+        
+        yield generation.final
+    
+    async def _run_generation(
+        self,
+        generation: Generation,
+        chunks: AsyncGenerator[str, None],
+        prompt_tokens: int,
+        conversation_id: Optional[str],
+        cache_key: Optional[str],
+        cached: bool,
+        on_finish: Optional[Callable[[str, Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]],
+        on_checkpoint: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None
+    ):
+        """Pull a generation's chunks into its replay buffer, then persist and finish it"""
+        accumulator = StreamAccumulator()
+        checkpoint: Optional[asyncio.Task] = None
+        error: Optional[BaseException] = None
+        cancelled = False
+        if not settings.STREAM_CHECKPOINT_ENABLED:
+            on_checkpoint = None
+        
+        try:
+            async for chunk in chunks:
+                accumulator.append(chunk)
+                generation.append(chunk)
+                if on_checkpoint and accumulator.checkpoint_due() and (checkpoint is None or checkpoint.done()):
+                    # Written in the background so a slow database never stalls the stream
+                    accumulator.checkpointed()
+                    checkpoint = asyncio.create_task(self._checkpoint(
+                        generation, accumulator.text(), accumulator.tokens, on_checkpoint
+                    ))
+        except RateLimitExceeded as e:
+            generation.finish(self._rate_limit_error(e))
             return
+        except CircuitOpen as e:
+            generation.finish(self._unavailable_error(e))
+            return
+        except asyncio.CancelledError:
+            error = RuntimeError("Generation cancelled")
+            cancelled = True
+        except Exception as e:
+            print(f"❌ Generation {generation.id} failed: {e}")
+            error = e
+        finally:
+            await chunks.aclose()
+            if checkpoint is not None:
+                await asyncio.gather(checkpoint, return_exceptions=True)
         
-        # Stream response
-        ai_model = self.models[model_name]
-        full_response = ""
-        
-        async for chunk in ai_model.stream(message):
-            full_response += chunk
-            yield {
-                "chunk": chunk,
-                "model": model_name,
-                "conversation_id": conversation_id,
-                "timestamp": datetime.utcnow().isoformat()
-            }
+        response = accumulator.text()
+        if error is None and cache_key:
+            self.response_cache.set(cache_key, response)
         
         # Final message with stats
-        tokens_used = self._estimate_tokens(message + full_response)
-        cost = self._calculate_cost(tokens_used, model_name)
-        
-        yield {
-            "done": True,
+        tokens_used = prompt_tokens + accumulator.tokens
+        result = {
+            "done": error is None,
+            "model": generation.model,
             "tokens_used": tokens_used,
-            "cost": cost,
-            "conversation_id": conversation_id
+            "completion_tokens": accumulator.tokens,
+            "cost": self._calculate_cost(tokens_used, generation.model),
+            "cached": cached,
+            "conversation_id": conversation_id,
+            "generation_id": generation.id
+        }
+        if error is not None:
+            # Terminal error frame: followers end on it instead of an exception
+            result.update(
+                error=str(error),
+                cancelled=cancelled,
+                truncated=True,
+                offset=generation.end_offset
+            )
+            if not cancelled:
+                result["status_code"] = getattr(error, "status_code", 500)
+        
+        # Persist once per generation, whichever client (if any) is following it
+        if on_finish and (error is None or response):
+            try:
+                saved = await on_finish(response, result)
+                if saved is not None:
+                    result["message"] = saved
+            except Exception as e:
+                print(f"❌ Failed to save generation {generation.id}: {e}")
+        
+        generation.finish(result)
+    
+    async def _checkpoint(
+        self,
+        generation: Generation,
+        partial: str,
+        tokens: int,
+        on_checkpoint: Callable[[str, Dict[str, Any]], Awaitable[None]]
+    ):
+        """Persist a generation's partial response; a failure only costs this checkpoint"""
+        try:
+            await on_checkpoint(partial, {
+                "model": generation.model,
+                "completion_tokens": tokens,
+                "generation_id": generation.id
+            })
+        except Exception as e:
+            print(f"❌ Failed to checkpoint generation {generation.id}: {e}")
+    
+    async def background_completion(self, message: str, model: str, max_tokens: int) -> str:
+        """Complete a prompt for background work, without cache, hedging or fallback
+        
+        Queues for the model's slots as the low-weight "background" plan, so
+        interactive requests are served first; raises RateLimitExceeded or
+        CircuitOpen like any model call, and ModelUnavailable if the model
+        cannot be loaded.
+        """
+        if model not in self.models:
+            await self.loader.require(model)
+        params = self._sampling_params(model, None, None, max_tokens)
+        return await self._call_model(model, message, params, schedule_key=BACKGROUND_SCHEDULE_KEY)
+    
+    def cancel_generation(self, generation_id: str, user: Optional[User] = None) -> bool:
+        """Stop a running generation right away instead of after the resume grace period"""
+        generation = self.generations.get(generation_id, self._schedule_key(user)["user_key"])
+        return generation is not None and self.generations.cancel(generation)
+    
+    def _sampling_params(
+        self,
+        model_name: str,
+        temperature: Optional[float],
+        top_p: Optional[float],
+        max_tokens: Optional[int]
+    ) -> Dict[str, Any]:
+        """Resolve sampling parameters against the model defaults"""
+        config = settings.HOYO_MODELS.get(model_name, {})
+        return {
+            "temperature": config.get("temperature", 0.7) if temperature is None else temperature,
+            "top_p": config.get("top_p", 1.0) if top_p is None else top_p,
+            "max_tokens": config.get("max_tokens", 2000) if max_tokens is None else max_tokens
+        }
+    
+    def _request_key(self, model_name: str, message: str, params: Dict[str, Any]) -> str:
+        """Identity of a generation request, shared by the cache and single-flight"""
+        return ResponseCache.make_key(
+            model_name,
+            message,
+            params["temperature"],
+            params["top_p"],
+            params["max_tokens"],
+            params.get("messages")
+        )
+    
+    def _cache_key(
+        self,
+        request_key: str,
+        model_name: str,
+        params: Dict[str, Any],
+        use_cache: Optional[bool]
+    ) -> Optional[str]:
+        """Get the response cache key, or None when the request must bypass the cache"""
+        if not settings.RESPONSE_CACHE_ENABLED or use_cache is False:
+            return None
+        
+        # Sampled (temperature > 0) responses are only cached when opted in
+        if params["temperature"] > 0 and not (
+            use_cache
+            or settings.RESPONSE_CACHE_SAMPLED
+            or settings.HOYO_MODELS.get(model_name, {}).get("cache_sampled", False)
+        ):
+            return None
+        
+        return request_key
+    
+    async def _generate(
+        self,
+        model_name: str,
+        message: str,
+        params: Dict[str, Any],
+        request_key: str,
+        user: Optional[User] = None
+    ) -> Tuple[str, str]:
+        """Generate a response, sharing one upstream call between identical requests
+        
+        Returns (response, name of the model that answered).
+        """
+        call = lambda: self._call_hedged(model_name, message, params, user)
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await call()
+        return await self.single_flight.do(request_key, call)
+    
+    def _stream(
+        self,
+        model_name: str,
+        message: str,
+        params: Dict[str, Any],
+        request_key: str,
+        user: Optional[User] = None
+    ) -> AsyncGenerator[str, None]:
+        """Stream a response, fanning one upstream stream out to identical requests"""
+        factory = lambda: self._stream_model(model_name, message, params, user)
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return factory()
+        return self.single_flight.stream(request_key, factory)
+    
+    async def _call_hedged(
+        self,
+        model_name: str,
+        message: str,
+        params: Dict[str, Any],
+        user: Optional[User] = None
+    ) -> Tuple[str, str]:
+        """Call the model, racing a hedged call once it runs past its usual latency"""
+        routed_model = self._route(model_name, user)
+        if routed_model != model_name:
+            model_name = routed_model
+            params = self._fallback_params(routed_model, params)
+        
+        primary = lambda: self._call_served(model_name, message, params, user)
+        delay = self._hedge_delay(model_name)
+        if delay is None:
+            return await primary()
+        
+        backup = lambda: self._hedge_call(model_name, message, params, user)
+        return await self.hedger.race(primary, backup, delay)
+    
+    def _hedge_delay(self, model_name: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None when the model is not hedged"""
+        if not settings.HEDGING_ENABLED:
+            return None
+        latency = self.latency.percentile(model_name, settings.HEDGE_PERCENTILE, settings.HEDGE_MIN_SAMPLES)
+        if latency is None:
+            return None
+        return max(latency, settings.HEDGE_MIN_DELAY)
+    
+    def _hedge_call(
+        self,
+        model_name: str,
+        message: str,
+        params: Dict[str, Any],
+        user: Optional[User] = None
+    ) -> Optional[Awaitable[Tuple[str, str]]]:
+        """Start the hedged call, or return None to keep waiting on the primary"""
+        target = self._hedge_target(model_name, user)
+        if target is None:
+            return None
+        if target != model_name:
+            params = self._fallback_params(target, params)
+        return self._call_served(target, message, params, user)
+    
+    def _hedge_target(self, model_name: str, user: Optional[User]) -> Optional[str]:
+        """Route the hedge to the configured fallback unless it is slower than the
+        primary or off the user's plan; None when the target has no free slot"""
+        target = model_name
+        fallback = self._fallback_model(model_name, user)
+        if fallback is not None:
+            primary_p50 = self.latency.percentile(model_name, 50, settings.HEDGE_MIN_SAMPLES)
+            fallback_p50 = self.latency.percentile(fallback, 50, settings.HEDGE_MIN_SAMPLES)
+            if fallback_p50 is None or fallback_p50 <= primary_p50:
+                target = fallback
+        
+        # Hedging into a queue or a failing provider only adds load where it hurts
+        if not self.has_capacity(target):
+            return None
+        breaker = self._breaker(target)
+        if breaker is not None and not breaker.available():
+            return None
+        return target
+    
+    def _route(self, model_name: str, user: Optional[User]) -> str:
+        """Reroute to the fallback model while the model's provider breaker is open"""
+        breaker = self._breaker(model_name)
+        if breaker is None or breaker.available():
+            return model_name
+        
+        fallback = self._fallback_model(model_name, user)
+        fallback_breaker = self._breaker(fallback) if fallback else None
+        if fallback is not None and fallback_breaker.available():
+            return fallback
+        return model_name
+    
+    def _fallback_model(self, model_name: str, user: Optional[User]) -> Optional[str]:
+        """The model's configured fallback, if it is loaded and on the user's plan"""
+        fallback = settings.HOYO_MODELS.get(model_name, {}).get("fallback")
+        if fallback not in self.models:
+            return None
+        if user is not None and not self._check_model_access(user, fallback):
+            return None
+        return fallback
+    
+    def _fallback_params(self, fallback: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Request params for a fallback model, capped at its max_tokens"""
+        fallback_max_tokens = settings.HOYO_MODELS[fallback].get("max_tokens", params["max_tokens"])
+        return dict(params, max_tokens=min(params["max_tokens"], fallback_max_tokens))
+    
+    async def _call_served(
+        self,
+        model_name: str,
+        message: str,
+        params: Dict[str, Any],
+        user: Optional[User] = None
+    ) -> Tuple[str, str]:
+        return await self._call_model(model_name, message, params, user), model_name
+    
+    async def _call_model(
+        self,
+        model_name: str,
+        message: str,
+        params: Dict[str, Any],
+        user: Optional[User] = None,
+        schedule_key: Optional[Dict[str, str]] = None
+    ) -> str:
+        """Call AIModel.generate inside the model's rate limit and fair-share slot
+        
+        The call's latency, admission wait included, feeds the model's histogram.
+        """
+        ai_model = self.models[model_name]
+        limiter = self._limiter(model_name)
+        breaker = self._breaker(model_name)
+        probe = breaker.allow() if breaker else False
+        start = time.monotonic()
+        try:
+            if limiter is None:
+                response = await self._call_provider(ai_model, message, params, breaker, probe)
+            else:
+                async with limiter.slot(**(schedule_key or self._schedule_key(user))):
+                    response = await self._call_provider(ai_model, message, params, breaker, probe)
+        except asyncio.CancelledError:
+            # A cancelled hedge loser took at least this long; keep it in the tail
+            self.latency.record(model_name, time.monotonic() - start)
+            if breaker is not None:
+                breaker.release(probe)
+            raise
+        except RateLimitExceeded:
+            if breaker is not None:
+                breaker.release(probe)
+            raise
+        self.latency.record(model_name, time.monotonic() - start)
+        return response
+    
+    async def _call_provider(
+        self,
+        ai_model: AIModel,
+        message: str,
+        params: Dict[str, Any],
+        breaker,
+        probe: bool
+    ) -> str:
+        """Call AIModel.generate and report the outcome to the provider's breaker"""
+        start = time.monotonic()
+        try:
+            response = await ai_model.generate(message, **params)
+        except Exception as e:
+            self._record_outcome(breaker, e, time.monotonic() - start, probe)
+            raise
+        self._record_outcome(breaker, None, time.monotonic() - start, probe)
+        return response
+    
+    async def _stream_model(
+        self,
+        model_name: str,
+        message: str,
+        params: Dict[str, Any],
+        user: Optional[User] = None
+    ) -> AsyncGenerator[str, None]:
+        """Call AIModel.stream inside the model's rate limit and fair-share slot
+        
+        Closing or cancelling this generator cancels the upstream stream; the
+        tokens generated until then are counted in stream_stats.
+        """
+        ai_model = self.models[model_name]
+        limiter = self._limiter(model_name)
+        breaker = self._breaker(model_name)
+        probe = breaker.allow() if breaker else False
+        acquired = settled = False
+        token_counter = get_tokenizer().counter()
+        
+        try:
+            if limiter is not None:
+                await limiter.acquire(**self._schedule_key(user))
+                acquired = True
+            
+            # Time to first chunk is what the breaker's latency threshold judges
+            start = time.monotonic()
+            first_chunk = None
+            try:
+                async for chunk in ai_model.stream(message, **params):
+                    if first_chunk is None:
+                        first_chunk = time.monotonic() - start
+                    token_counter.feed(chunk)
+                    yield chunk
+            except Exception as e:
+                settled = True
+                self._record_outcome(breaker, e, first_chunk or time.monotonic() - start, probe)
+                raise
+            settled = True
+            self._record_outcome(breaker, None, first_chunk or time.monotonic() - start, probe)
+            self.stream_stats.completed(model_name, token_counter.total)
+        except (asyncio.CancelledError, GeneratorExit):
+            if acquired:
+                self.stream_stats.cancelled(model_name, token_counter.total, params["max_tokens"])
+            raise
+        finally:
+            if breaker is not None and not settled:
+                breaker.release(probe)
+            if acquired:
+                limiter.release()
+    
+    def _breaker(self, model_name: str):
+        """Get the circuit breaker of the model's provider, or None when disabled"""
+        if not settings.CIRCUIT_BREAKER_ENABLED:
+            return None
+        provider = settings.HOYO_MODELS.get(model_name, {}).get("provider", "mock")
+        return self.circuit_breakers.get(provider)
+    
+    def _record_outcome(self, breaker, error: Optional[Exception], latency: float, probe: bool):
+        """Report a provider call to its breaker; client errors (4xx) are not the provider's fault"""
+        if breaker is None:
+            return
+        status_code = getattr(error, "status_code", None)
+        failed = error is not None and (status_code is None or status_code >= 500 or status_code == 429)
+        breaker.record(not failed, latency, probe)
+    
+    def has_capacity(self, model_name: str, max_load: float = 1.0) -> bool:
+        """Whether nobody queues for the model and at most ``max_load`` of its slots are busy"""
+        limiter = self._limiter(model_name)
+        if limiter is None:
+            return True
+        return not limiter.waiting and limiter.in_flight < limiter.max_concurrency * max_load
+    
+    def _limiter(self, model_name: str):
+        """Get the model's limiter, or None when per-model limits are disabled"""
+        if not settings.MODEL_RATE_LIMIT_ENABLED:
+            return None
+        return self.rate_limiter.get(model_name)
+    
+    def _schedule_key(self, user: Optional[User]) -> Dict[str, str]:
+        """Fair scheduler queue for a user: their plan, then the user id"""
+        if user is None:
+            return {"plan": "free", "user_key": "anonymous"}
+        return {
+            "plan": user.plan.value if user.plan else "free",
+            "user_key": user.id or "anonymous"
+        }
+    
+    def _rate_limit_error(self, error: RateLimitExceeded) -> Dict[str, Any]:
+        """Error payload for a request rejected by the model limiter"""
+        return {
+            "error": f"Model {error.model_name} is busy ({error.reason}), retry after {error.retry_after:.1f}s",
+            "retry_after": round(error.retry_after, 1),
+            "status_code": 429
         }
     
+    def _model_unavailable_error(self, error: ModelUnavailable) -> Dict[str, Any]:
+        """Error payload for a model that failed to load"""
+        return {
+            "error": str(error),
+            "retry_after": round(error.retry_after, 1),
+            "status_code": 503
+        }
+    
+    def _unavailable_error(self, error: CircuitOpen) -> Dict[str, Any]:
+        """Error payload for a request failed fast by an open circuit breaker"""
+        return {
+            "error": f"Provider {error.provider} is temporarily unavailable, retry after {error.retry_after:.1f}s",
+            "retry_after": round(error.retry_after, 1),
+            "status_code": 503
+        }
+    
+    async def _replay_chunks(self, response: str) -> AsyncGenerator[str, None]:
+        """Replay a cached response as word chunks"""
+        for chunk in re.findall(r"\S+\s*|\s+", response):
+            yield chunk
+    
     def _check_model_access(self, user: User, model_name: str) -> bool:
         """Check if user has access to model"""
         plan_access = {
             "free": ["HoYo-Fast"],
             "pro": ["HoYo-Fast", "HoYo-GPT-4", "HoYo-Claude", "HoYo-Code", "HoYo-Gemini"],
-            "enterprise": list(self.models.keys())
+            "enterprise": list(settings.HOYO_MODELS.keys())
         }
         
         user_plan = user.plan.value if user.plan else "free"
@@ -255,9 +950,15 @@ class AIService:
         else:
             return "enterprise"
     
-    def _estimate_tokens(self, text: str) -> int:
-        """Estimate token count (rough approximation)"""
-        return len(text) // 4
+    def _prompt_tokens(self, message: str, context: Optional[Dict[str, Any]]) -> int:
+        """Prompt tokens, reusing the count from context assembly when available"""
+        if context and "prompt_tokens" in context:
+            return context["prompt_tokens"]
+        return self._count_tokens(message)
+    
+    def _count_tokens(self, *texts: str) -> int:
+        """Count tokens with the configured tokenizer"""
+        return sum(get_tokenizer().count_tokens(list(texts)))
     
     def _calculate_cost(self, tokens: int, model_name: str) -> float:
         """Calculate cost based on tokens and model"""
@@ -270,10 +971,15 @@ class AIService:
         return {
             "models_loaded": len(self.models),
             "active_models": list(self.models.keys()),
-            "default_model": self.default_model
+            "default_model": self.default_model,
+            "http_clients": self.client_pool.stats() if self.client_pool else None
         }
     
     async def cleanup(self):
         """Cleanup resources"""
+        await self.generations.shutdown()
+        await self.loader.shutdown()
         self.models.clear()
+        if self.client_pool:
+            await self.client_pool.aclose()
         print("✅ AI Service cleaned up")
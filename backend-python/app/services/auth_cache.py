@@ -0,0 +1,107 @@
+"""
+In-process caches for the authentication fast path
+"""
+import hashlib
+import time
+from datetime import datetime
+from typing import Dict, Any, NamedTuple, Optional
+
+from app.core.config import settings
+from app.models.database import User
+from app.services.cache import TTLCache
+
+
+class APIKeyIdentity(NamedTuple):
+    """What a valid API key resolves to"""
+    key_id: str
+    user_id: str
+    expires_at: Optional[datetime]
+
+
+class AuthCache:
+    """Decoded access tokens and users, so a request with a cached token
+    and user needs neither a JWT decode nor a database read.
+
+    Tokens are keyed by their SHA-256 (raw tokens are never kept) and an
+    entry never outlives the token's ``exp``. Users are detached ORM
+    objects shared read-only between requests: whatever changes a user
+    through the API calls ``invalidate_user``, and changes made elsewhere
+    show up within AUTH_USER_CACHE_TTL.
+
+    API keys are keyed by their digest. Unknown digests are cached too
+    (for AUTH_BAD_API_KEY_CACHE_TTL), so scanning with made-up keys costs
+    one lookup per key rather than one per request.
+    """
+
+    def __init__(self):
+        self.tokens = TTLCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+        self.users = TTLCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+        self.api_keys = TTLCache(settings.AUTH_API_KEY_CACHE_SIZE, settings.AUTH_API_KEY_CACHE_TTL)
+        self.bad_api_keys = TTLCache(settings.AUTH_API_KEY_CACHE_SIZE, settings.AUTH_BAD_API_KEY_CACHE_TTL)
+
+    @staticmethod
+    def token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get_token(self, token: str) -> Optional[Dict[str, Any]]:
+        if not settings.AUTH_CACHE_ENABLED:
+            return None
+        return self.tokens.get(self.token_key(token))
+
+    def set_token(self, token: str, payload: Dict[str, Any]):
+        if not settings.AUTH_CACHE_ENABLED:
+            return
+        ttl = settings.AUTH_TOKEN_CACHE_TTL
+        if payload.get("exp") is not None:
+            ttl = min(ttl, payload["exp"] - time.time())
+        if ttl > 0:
+            self.tokens.set(self.token_key(token), payload, ttl)
+
+    def forget_token(self, token: str):
+        self.tokens.pop(self.token_key(token))
+
+    def get_user(self, user_id: str) -> Optional[User]:
+        if not settings.AUTH_CACHE_ENABLED:
+            return None
+        return self.users.get(user_id)
+
+    def set_user(self, user: User):
+        if settings.AUTH_CACHE_ENABLED:
+            self.users.set(user.id, user)
+
+    def invalidate_user(self, user_id: str):
+        self.users.pop(user_id)
+
+    def get_api_key(self, digest: str) -> Optional[APIKeyIdentity]:
+        if not settings.AUTH_CACHE_ENABLED:
+            return None
+        return self.api_keys.get(digest)
+
+    def set_api_key(self, digest: str, identity: APIKeyIdentity):
+        if settings.AUTH_CACHE_ENABLED:
+            self.bad_api_keys.pop(digest)
+            self.api_keys.set(digest, identity)
+
+    def is_bad_api_key(self, digest: str) -> bool:
+        return settings.AUTH_CACHE_ENABLED and self.bad_api_keys.get(digest) is not None
+
+    def set_bad_api_key(self, digest: str):
+        if settings.AUTH_CACHE_ENABLED:
+            self.bad_api_keys.set(digest, True)
+
+    def invalidate_api_key(self, digest: str):
+        self.api_keys.pop(digest)
+        self.bad_api_keys.pop(digest)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Cache statistics as {metric: {cache: value}}"""
+        caches = {
+            "tokens": self.tokens.stats(),
+            "users": self.users.stats(),
+            "api_keys": self.api_keys.stats(),
+            "bad_api_keys": self.bad_api_keys.stats()
+        }
+        return {metric: {name: stats[metric] for name, stats in caches.items()} for metric in caches["tokens"]}
+
+
+auth_cache = AuthCache()
@@ -0,0 +1,272 @@
+"""
+Background processing of batch chat jobs (JSONL in, JSONL out)
+"""
+import asyncio
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.database import BatchJob, BatchStatus, User
+
+ITEM_OPTIONS = ("temperature", "top_p", "max_tokens", "cache")
+
+
+class BatchInputError(ValueError):
+    """Raised when an uploaded batch file is malformed"""
+
+    def __init__(self, line_number: int, message: str):
+        super().__init__(f"Line {line_number}: {message}")
+        self.line_number = line_number
+
+
+def parse_batch_item(line: str, line_number: int) -> Dict[str, Any]:
+    """Parse and validate one JSONL batch item"""
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise BatchInputError(line_number, f"invalid JSON ({e.msg})")
+
+    if not isinstance(item, dict):
+        raise BatchInputError(line_number, "expected a JSON object")
+    message = item.get("message")
+    if not isinstance(message, str) or not message.strip():
+        raise BatchInputError(line_number, "'message' must be a non-empty string")
+    if len(message) > 10000:
+        raise BatchInputError(line_number, "'message' is longer than 10000 characters")
+    if "model" in item and item["model"] not in settings.HOYO_MODELS:
+        raise BatchInputError(line_number, f"unknown model {item['model']}")
+    return item
+
+
+def count_batch_items(data: bytes) -> int:
+    """Validate an uploaded JSONL file and return its number of items"""
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        raise BatchInputError(0, "file is not valid UTF-8")
+
+    count = 0
+    for line_number, line in enumerate(text.splitlines(), 1):
+        if line.strip():
+            parse_batch_item(line, line_number)
+            count += 1
+    return count
+
+
+def iter_batch_items(path: Path, skip: Set[int]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (index, item) for input items whose index is not in ``skip``"""
+    index = 0
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            if index not in skip:
+                yield index, parse_batch_item(line, line_number)
+            index += 1
+
+
+class BatchService:
+    """Runs batch jobs in background tasks.
+
+    Items are processed through AIService with BATCH_CONCURRENCY in flight
+    per job, so they go through the same per-model rate limits and fair
+    scheduler as interactive traffic; 429/503 answers are retried after
+    their retry_after. Each result is appended to the job's output JSONL as
+    soon as it is ready, and the output file is the source of truth for
+    progress: after a restart a job re-reads it and skips finished items.
+    """
+
+    def __init__(self):
+        self.ai_service = None
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def start(self, ai_service):
+        """Resume jobs that were queued or running when the server stopped"""
+        self.ai_service = ai_service
+        self._slots = asyncio.Semaphore(settings.BATCH_MAX_ACTIVE_JOBS)
+        settings.BATCH_STORAGE_PATH.mkdir(parents=True, exist_ok=True)
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(BatchJob.id)
+                .where(BatchJob.status.in_([BatchStatus.QUEUED, BatchStatus.RUNNING]))
+                .order_by(BatchJob.created_at)
+            )
+            job_ids = result.scalars().all()
+
+        for job_id in job_ids:
+            self.submit(job_id)
+        if job_ids:
+            print(f"♻️ Resuming {len(job_ids)} batch job(s)")
+
+    def job_dir(self, job_id: str) -> Path:
+        return settings.BATCH_STORAGE_PATH / job_id
+
+    def submit(self, job_id: str):
+        """Schedule a persisted job for processing"""
+        task = asyncio.create_task(self._run(job_id))
+        self.tasks[job_id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(job_id, None))
+
+    def cancel(self, job_id: str):
+        """Stop a job's task; the caller records the cancelled status"""
+        task = self.tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+
+    async def shutdown(self):
+        """Stop all jobs, leaving them queued/running so they resume on startup"""
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job_id: str):
+        async with self._slots:
+            async with AsyncSessionLocal() as db:
+                job = await db.get(BatchJob, job_id)
+                if job is None or job.status not in (BatchStatus.QUEUED, BatchStatus.RUNNING):
+                    return
+                user = await db.get(User, job.user_id)
+                job.status = BatchStatus.RUNNING
+                job.started_at = job.started_at or datetime.utcnow()
+                await db.commit()
+                db.expunge_all()
+
+            progress = self._recover_output(Path(job.output_path))
+            try:
+                await self._process(job, user, progress)
+            except asyncio.CancelledError:
+                await self._save_progress(job_id, progress)
+                raise
+            except Exception as e:
+                print(f"❌ Batch job {job_id} failed: {e}")
+                await self._save_progress(job_id, progress, BatchStatus.FAILED, error=str(e))
+                return
+
+            await self._save_progress(job_id, progress, BatchStatus.COMPLETED)
+            print(f"✅ Batch job {job_id} completed: {progress['completed_items']} ok, {progress['failed_items']} failed")
+
+    async def _process(self, job: BatchJob, user: User, progress: Dict[str, Any]):
+        items = iter_batch_items(Path(job.input_path), progress.pop("done"))
+        last_saved = time.monotonic()
+
+        with open(job.output_path, "a", encoding="utf-8") as output:
+            async def worker():
+                nonlocal last_saved
+                for index, item in items:
+                    record = await self._process_item(job, user, index, item)
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+
+                    if "error" in record:
+                        progress["failed_items"] += 1
+                    else:
+                        progress["completed_items"] += 1
+                        progress["tokens_used"] += record["tokens_used"]
+                        progress["cost"] += record["cost"]
+
+                    if time.monotonic() - last_saved >= settings.BATCH_PROGRESS_INTERVAL:
+                        last_saved = time.monotonic()
+                        await self._save_progress(job.id, progress)
+
+            workers = [asyncio.create_task(worker()) for _ in range(settings.BATCH_CONCURRENCY)]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                # One failing worker must not leave the others writing to a closed file
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _process_item(self, job: BatchJob, user: User, index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one item, retrying rate-limited or unavailable answers"""
+        options = {**(job.options or {}), **{key: item[key] for key in ITEM_OPTIONS if key in item}}
+        record: Dict[str, Any] = {"index": index, "custom_id": item.get("custom_id")}
+
+        for attempt in range(settings.BATCH_MAX_RETRIES + 1):
+            try:
+                result = await self.ai_service.process_chat(
+                    message=item["message"],
+                    model=item.get("model") or job.model,
+                    user=user,
+                    temperature=options.get("temperature"),
+                    top_p=options.get("top_p"),
+                    max_tokens=options.get("max_tokens"),
+                    use_cache=options.get("cache")
+                )
+            except Exception as e:
+                result = {"error": str(e)}
+
+            if "retry_after" in result and attempt < settings.BATCH_MAX_RETRIES:
+                await asyncio.sleep(result["retry_after"])
+                continue
+            break
+
+        if "error" in result:
+            record["error"] = result["error"]
+        else:
+            record.update({
+                "response": result["response"],
+                "model": result["model"],
+                "tokens_used": result["tokens_used"],
+                "cost": result["cost"]
+            })
+        return record
+
+    def _recover_output(self, path: Path) -> Dict[str, Any]:
+        """Rebuild progress from the output file, dropping a torn last line"""
+        progress = {"done": set(), "completed_items": 0, "failed_items": 0, "tokens_used": 0, "cost": 0.0}
+        if not path.exists():
+            return progress
+
+        data = path.read_bytes()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            with open(path, "r+b") as f:
+                f.truncate(end)
+
+        for line in data[:end].decode("utf-8").splitlines():
+            record = json.loads(line)
+            progress["done"].add(record["index"])
+            if "error" in record:
+                progress["failed_items"] += 1
+            else:
+                progress["completed_items"] += 1
+                progress["tokens_used"] += record.get("tokens_used", 0)
+                progress["cost"] += record.get("cost", 0.0)
+        return progress
+
+    async def _save_progress(
+        self,
+        job_id: str,
+        progress: Dict[str, Any],
+        status: Optional[BatchStatus] = None,
+        error: Optional[str] = None
+    ):
+        values = {
+            "completed_items": progress["completed_items"],
+            "failed_items": progress["failed_items"],
+            "tokens_used": progress["tokens_used"],
+            "cost": progress["cost"]
+        }
+        if status is not None:
+            values.update(status=status, completed_at=datetime.utcnow(), error=error)
+
+        async with AsyncSessionLocal() as db:
+            query = update(BatchJob).where(BatchJob.id == job_id)
+            if status is not None:
+                # Never overwrite a cancellation recorded while the job was finishing
+                query = query.where(BatchJob.status == BatchStatus.RUNNING)
+            await db.execute(query.values(**values))
+            await db.commit()
+
+
+batch_service = BatchService()
@@ -0,0 +1,148 @@
+"""
+Exact-match response cache for AI model calls, and a generic TTL cache
+"""
+import hashlib
+import json
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+class ResponseCache:
+    """In-memory response cache with size-bounded LRU and TTL eviction"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """Normalize a prompt so trivially different spellings share an entry"""
+        return " ".join(unicodedata.normalize("NFC", prompt).split())
+
+    @classmethod
+    def make_key(
+        cls,
+        model: str,
+        prompt: str,
+        temperature: float,
+        top_p: float,
+        max_tokens: int,
+        context: Any = None
+    ) -> str:
+        """Build a cache key from the model, normalized prompt and sampling params"""
+        raw = json.dumps(
+            [model, cls.normalize_prompt(prompt), temperature, top_p, max_tokens, context],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response, refreshing its LRU position"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        """Store a response, evicting the least recently used entries"""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all cached responses"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits_total": self.hits,
+            "misses_total": self.misses,
+            "evictions_total": self.evictions,
+            "expirations_total": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class TTLCache:
+    """Size-bounded LRU cache of arbitrary values with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Any) -> Optional[Any]:
+        """Get a live value (None on a miss), refreshing its LRU position"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None):
+        """Store a value for ``ttl`` seconds (default: the cache TTL)"""
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Any):
+        """Drop one entry if present"""
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits_total": self.hits,
+            "misses_total": self.misses,
+            "evictions_total": self.evictions,
+            "expirations_total": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,196 @@
+"""
+Per-provider circuit breakers with error-rate and latency thresholds
+"""
+import time
+from collections import deque
+from typing import Dict, Any, Deque, Tuple
+
+from app.core.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    """Raised when a provider's breaker rejects a call without trying it"""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"Provider {provider} is unavailable, retry after {retry_after:.1f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Circuit breaker for one provider.
+
+    Closed: calls pass and their outcomes are kept for a rolling window.
+    Once the window holds enough calls and the error rate or the slow-call
+    rate crosses its threshold, the breaker opens and fails calls fast.
+    After a cool-down it goes half-open and lets a few probe calls through:
+    all probes succeeding closes it, any probe failing re-opens it.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        window: float,
+        min_calls: int,
+        error_rate: float,
+        slow_call_seconds: float,
+        slow_call_rate: float,
+        open_seconds: float,
+        half_open_probes: int
+    ):
+        self.provider = provider
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+
+        # (timestamp, failed, slow) for calls in the rolling window
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()
+        self._failures = 0
+        self._slow = 0
+
+        self.opened_total = 0
+        self.rejected_total = 0
+
+    def retry_after(self) -> float:
+        return max(self.opened_at + self.open_seconds - time.monotonic(), 1.0)
+
+    def available(self) -> bool:
+        """Whether a call would currently be let through (no side effects)"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at < self.open_seconds:
+            return False
+        return self.probes_in_flight < self.half_open_probes
+
+    def allow(self) -> bool:
+        """Admit a call or raise CircuitOpen; returns True when the call is a probe"""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+            self.probe_successes = 0
+
+        if self.state == CLOSED:
+            return False
+        if self.state == HALF_OPEN and self.probes_in_flight < self.half_open_probes:
+            self.probes_in_flight += 1
+            return True
+
+        self.rejected_total += 1
+        raise CircuitOpen(self.provider, self.retry_after())
+
+    def record(self, success: bool, latency: float, probe: bool = False):
+        """Record the outcome of an admitted call"""
+        slow = latency >= self.slow_call_seconds
+        if probe:
+            self.probes_in_flight = max(self.probes_in_flight - 1, 0)
+            if self.state != HALF_OPEN:
+                return
+            if not success or slow:
+                self._open()
+                return
+            self.probe_successes += 1
+            if self.probe_successes >= self.half_open_probes:
+                self._close()
+            return
+
+        if self.state != CLOSED:
+            return
+
+        now = time.monotonic()
+        self._outcomes.append((now, not success, slow))
+        self._failures += not success
+        self._slow += slow
+        self._expire(now)
+
+        calls = len(self._outcomes)
+        if calls >= self.min_calls and (
+            self._failures / calls >= self.error_rate or self._slow / calls >= self.slow_call_rate
+        ):
+            self._open()
+
+    def release(self, probe: bool):
+        """Forget an admitted call that ended without an outcome (e.g. cancelled)"""
+        if probe:
+            self.probes_in_flight = max(self.probes_in_flight - 1, 0)
+
+    def _expire(self, now: float):
+        horizon = now - self.window
+        while self._outcomes and self._outcomes[0][0] < horizon:
+            _, failed, slow = self._outcomes.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _open(self):
+        if self.state != OPEN:
+            self.opened_total += 1
+            print(f"⚠️ Circuit breaker opened for provider {self.provider}")
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+
+    def _close(self):
+        self.state = CLOSED
+        self._outcomes.clear()
+        self._failures = 0
+        self._slow = 0
+        print(f"✅ Circuit breaker closed for provider {self.provider}")
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire(time.monotonic())
+        calls = len(self._outcomes)
+        return {
+            "state": STATE_GAUGE[self.state],
+            "window_calls": calls,
+            "error_rate": round(self._failures / calls, 4) if calls else 0.0,
+            "slow_call_rate": round(self._slow / calls, 4) if calls else 0.0,
+            "opened_total": self.opened_total,
+            "rejected_total": self.rejected_total
+        }
+
+
+class CircuitBreakers:
+    """Circuit breakers keyed by provider, created on first use"""
+
+    def __init__(self):
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, provider: str) -> CircuitBreaker:
+        breaker = self.breakers.get(provider)
+        if breaker is None:
+            breaker = self.breakers[provider] = CircuitBreaker(
+                provider,
+                window=settings.CIRCUIT_BREAKER_WINDOW,
+                min_calls=settings.CIRCUIT_BREAKER_MIN_CALLS,
+                error_rate=settings.CIRCUIT_BREAKER_ERROR_RATE,
+                slow_call_seconds=settings.CIRCUIT_BREAKER_SLOW_CALL_SECONDS,
+                slow_call_rate=settings.CIRCUIT_BREAKER_SLOW_CALL_RATE,
+                open_seconds=settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+                half_open_probes=settings.CIRCUIT_BREAKER_HALF_OPEN_PROBES
+            )
+        return breaker
+
+    def states(self) -> Dict[str, str]:
+        """Breaker state per provider, for the health check"""
+        return {provider: breaker.state for provider, breaker in self.breakers.items()}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-provider stats grouped by metric: {metric: {provider: value}}"""
+        grouped: Dict[str, Dict[str, Any]] = {}
+        for provider, breaker in self.breakers.items():
+            for metric, value in breaker.stats().items():
+                grouped.setdefault(metric, {})[provider] = value
+        return grouped
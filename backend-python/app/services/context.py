@@ -0,0 +1,89 @@
+"""
+Token-budgeted conversation context assembly
+"""
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.database import Message
+from app.services.tokenizer import get_tokenizer
+
+
+class ContextBuilder:
+    """Assemble the conversation history that fits a model's context window.
+
+    Messages are read newest-first and accumulated using the ``token_count``
+    stored on each row at write time, so assembly costs O(messages included)
+    and never re-tokenizes history. When older messages do not fit, the
+    conversation summary (if any) stands in for the truncated prefix.
+    """
+
+    def __init__(self, batch_size: int = None):
+        self.batch_size = batch_size or settings.CONTEXT_BATCH_SIZE
+
+    def budget(self, model_name: str, max_tokens: Optional[int] = None) -> int:
+        """Prompt token budget: context window minus the reserved completion"""
+        config = settings.HOYO_MODELS.get(model_name, {})
+        context_window = config.get("context_window", 8000)
+        reserved = max_tokens or config.get("max_tokens", 2000)
+        return max(context_window - reserved, 0)
+
+    async def build(
+        self,
+        db: AsyncSession,
+        conversation_id: str,
+        model_name: str,
+        message: str,
+        summary: Optional[str] = None,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Build chat messages (summary + history tail) for a new user message"""
+        tokenizer = get_tokenizer()
+        remaining = self.budget(model_name, max_tokens) - tokenizer.count(message)
+
+        history: List[Dict[str, str]] = []
+        truncated = False
+
+        result = await db.stream(
+            select(Message.role, Message.content, Message.token_count)
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at.desc())
+            .execution_options(yield_per=self.batch_size)
+        )
+        try:
+            async for role, content, token_count in result:
+                if len(history) >= settings.CONTEXT_MAX_MESSAGES:
+                    truncated = True
+                    break
+                # Rows written before token counts were stored are counted once here
+                tokens = token_count if token_count is not None else tokenizer.count(content)
+                if tokens > remaining:
+                    truncated = True
+                    break
+                remaining -= tokens
+                history.append({"role": role.value if hasattr(role, "value") else role, "content": content})
+        finally:
+            await result.close()
+
+        history.reverse()
+        used_summary = False
+        if truncated and summary:
+            summary_message = f"Краткое содержание предыдущей части разговора:\n{summary}"
+            summary_tokens = tokenizer.count(summary_message)
+            if summary_tokens <= remaining:
+                remaining -= summary_tokens
+                history.insert(0, {"role": "system", "content": summary_message})
+                used_summary = True
+
+        return {
+            "messages": history + [{"role": "user", "content": message}],
+            "history_messages": len(history) - int(used_summary),
+            "truncated": truncated,
+            "used_summary": used_summary,
+            "prompt_tokens": self.budget(model_name, max_tokens) - remaining
+        }
+
+
+context_builder = ContextBuilder()
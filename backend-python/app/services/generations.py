@@ -0,0 +1,241 @@
+"""
+Resumable streamed generations with bounded replay buffers
+"""
+import asyncio
+import itertools
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, Any, Callable, Coroutine, Deque, List, Optional, Tuple
+
+
+class ResumeError(Exception):
+    """Raised when a generation cannot be followed from the requested offset"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Generation:
+    """One streamed generation, decoupled from the clients reading it.
+
+    A background task appends the generated text; clients follow it from a
+    character offset, so a client that reconnects continues where it left
+    off. Only the last ``buffer_chars`` characters are kept for replay, but
+    text a connected follower has not read yet is never dropped.
+    """
+
+    def __init__(self, generation_id: str, owner: str, model: str, buffer_chars: int):
+        self.id = generation_id
+        self.owner = owner
+        self.model = model
+        self.buffer_chars = buffer_chars
+
+        # (start offset, text) of retained chunks
+        self._chunks: Deque[Tuple[int, str]] = deque()
+        self.base_offset = 0
+        self.end_offset = 0
+
+        self.done = False
+        self.final: Optional[Dict[str, Any]] = None  # done or error frame
+
+        self.task: Optional[asyncio.Task] = None
+        self._cursors: Dict[int, int] = {}
+        self._follower_ids = itertools.count()
+        self._waiters: List[asyncio.Future] = []
+        self._grace_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def followers(self) -> int:
+        return len(self._cursors)
+
+    def append(self, text: str):
+        """Add generated text and wake followers"""
+        if not text:
+            return
+        self._chunks.append((self.end_offset, text))
+        self.end_offset += len(text)
+        self._trim()
+        self._notify()
+
+    def finish(self, final: Dict[str, Any]):
+        """Mark the generation finished with its final (done or error) frame"""
+        self.done = True
+        self.final = final
+        self._trim()
+        self._notify()
+
+    def follow(self, offset: int = 0):
+        """Iterate the text from ``offset``; raises ResumeError if it is not retained"""
+        if offset > self.end_offset:
+            raise ResumeError(f"Offset {offset} is past the end of the generation", 416)
+        if offset < self.base_offset:
+            raise ResumeError(f"Offset {offset} is no longer buffered", 410)
+
+        # Register now so the buffer keeps this reader's text from here on
+        follower_id = next(self._follower_ids)
+        self._cursors[follower_id] = offset
+        if self._grace_handle is not None:
+            self._grace_handle.cancel()
+            self._grace_handle = None
+        return self._read(follower_id)
+
+    async def _read(self, follower_id: int):
+        try:
+            while True:
+                cursor = self._cursors[follower_id]
+                if cursor < self.end_offset:
+                    text = self._text_from(cursor)
+                    self._cursors[follower_id] = self.end_offset
+                    self._trim()
+                    yield text
+                    continue
+
+                if self.done:
+                    break
+
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                await waiter
+        finally:
+            self._cursors.pop(follower_id, None)
+            self._trim()
+
+    def on_idle(self, grace: float, callback: Callable[[], None]):
+        """Run ``callback`` if nobody follows the running generation for ``grace`` seconds"""
+        if self.done or self._cursors or self._grace_handle is not None:
+            return
+        self._grace_handle = asyncio.get_running_loop().call_later(grace, self._idle, callback)
+
+    def _idle(self, callback: Callable[[], None]):
+        self._grace_handle = None
+        if not self.done and not self._cursors:
+            callback()
+
+    def _text_from(self, offset: int) -> str:
+        parts: List[str] = []
+        for start, text in reversed(self._chunks):
+            if start + len(text) <= offset:
+                break
+            parts.append(text[max(offset - start, 0):])
+        parts.reverse()
+        return "".join(parts)
+
+    def _trim(self):
+        keep_from = self.end_offset - self.buffer_chars
+        if self._cursors:
+            keep_from = min(keep_from, min(self._cursors.values()))
+        while self._chunks and self._chunks[0][0] + len(self._chunks[0][1]) <= keep_from:
+            start, text = self._chunks.popleft()
+            self.base_offset = start + len(text)
+
+    def _notify(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+class GenerationRegistry:
+    """Running and recently finished generations, looked up by generation_id.
+
+    Finished generations are retained for ``ttl`` seconds (at most
+    ``max_retained`` of them); a running generation that nobody follows for
+    ``grace`` seconds is cancelled.
+    """
+
+    def __init__(self, buffer_chars: int, ttl: float, grace: float, max_retained: int):
+        self.buffer_chars = buffer_chars
+        self.ttl = ttl
+        self.grace = grace
+        self.max_retained = max_retained
+        self.generations: "OrderedDict[str, Generation]" = OrderedDict()
+
+        self.started_total = 0
+        self.resumed_total = 0
+        self.abandoned_total = 0
+        self.resume_failed_total = 0
+
+    def start(
+        self,
+        owner: str,
+        model: str,
+        run: Callable[[Generation], Coroutine[Any, Any, None]]
+    ) -> Generation:
+        """Register a generation and start ``run(generation)`` in a background task"""
+        generation = Generation(str(uuid.uuid4()), owner, model, self.buffer_chars)
+        self.generations[generation.id] = generation
+        self.started_total += 1
+        self._evict()
+
+        generation.task = asyncio.create_task(run(generation))
+        generation.task.add_done_callback(lambda _: self._finished(generation))
+        return generation
+
+    def get(self, generation_id: str, owner: str) -> Optional[Generation]:
+        generation = self.generations.get(generation_id)
+        if generation is None or generation.owner != owner:
+            return None
+        return generation
+
+    def follow(self, generation: Generation, offset: int, resumed: bool = False):
+        """Follow a generation, cancelling it after the grace period once every follower left"""
+        try:
+            source = generation.follow(offset)
+        except ResumeError:
+            self.resume_failed_total += 1
+            raise
+        if resumed:
+            self.resumed_total += 1
+        return self._watch(generation, source)
+
+    async def _watch(self, generation: Generation, source):
+        try:
+            async for text in source:
+                yield text
+        finally:
+            await source.aclose()
+            generation.on_idle(self.grace, lambda: self._abandon(generation))
+
+    def cancel(self, generation: Generation) -> bool:
+        """Cancel a running generation; returns False if it already finished"""
+        if generation.task is None or generation.task.done():
+            return False
+        generation.task.cancel()
+        return True
+
+    def _abandon(self, generation: Generation):
+        if self.cancel(generation):
+            self.abandoned_total += 1
+
+    def _finished(self, generation: Generation):
+        asyncio.get_running_loop().call_later(self.ttl, self._expire, generation.id)
+
+    def _expire(self, generation_id: str):
+        generation = self.generations.get(generation_id)
+        if generation is not None and generation.done:
+            del self.generations[generation_id]
+
+    def _evict(self):
+        """Drop the oldest finished generations beyond max_retained"""
+        excess = len(self.generations) - self.max_retained
+        for generation_id in [gid for gid, gen in self.generations.items() if gen.done][:max(excess, 0)]:
+            del self.generations[generation_id]
+
+    async def shutdown(self):
+        tasks = [gen.task for gen in self.generations.values() if gen.task and not gen.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        running = sum(1 for gen in self.generations.values() if not gen.done)
+        return {
+            "running": running,
+            "retained": len(self.generations) - running,
+            "buffered_chars": sum(gen.end_offset - gen.base_offset for gen in self.generations.values()),
+            "started_total": self.started_total,
+            "resumed_total": self.resumed_total,
+            "abandoned_total": self.abandoned_total,
+            "resume_failed_total": self.resume_failed_total
+        }
@@ -0,0 +1,165 @@
+"""
+Rolling latency histograms and hedged request helpers
+"""
+import asyncio
+import math
+import time
+from typing import Dict, Any, List, Optional, Tuple, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Log-scale bucket upper bounds from 10ms to ~2 minutes (25% apart)
+BUCKET_BOUNDS: List[float] = [0.01 * 1.25 ** i for i in range(43)]
+
+
+class LatencyHistogram:
+    """Rolling log-bucketed latency histogram.
+
+    The window is split into slices; each slice holds its own bucket counts
+    and expires as a whole, so recording and percentile queries are O(buckets)
+    regardless of traffic.
+    """
+
+    def __init__(self, window: float = 60.0, slices: int = 6):
+        self.slice_seconds = window / slices
+        self.slices = slices
+        self._slices: List[Tuple[float, List[int]]] = []
+
+    def _current(self, now: float) -> List[int]:
+        slice_start = now - (now % self.slice_seconds)
+        if not self._slices or self._slices[-1][0] != slice_start:
+            self._slices.append((slice_start, [0] * (len(BUCKET_BOUNDS) + 1)))
+        self._expire(now)
+        return self._slices[-1][1]
+
+    def _expire(self, now: float):
+        horizon = now - self.slice_seconds * self.slices
+        while self._slices and self._slices[0][0] <= horizon:
+            self._slices.pop(0)
+
+    def record(self, seconds: float):
+        """Record one observation"""
+        counts = self._current(time.monotonic())
+        index = min(_bucket_index(seconds), len(BUCKET_BOUNDS))
+        counts[index] += 1
+
+    def count(self) -> int:
+        self._expire(time.monotonic())
+        return sum(sum(counts) for _, counts in self._slices)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket containing the q-th percentile"""
+        self._expire(time.monotonic())
+        totals = [0] * (len(BUCKET_BOUNDS) + 1)
+        for _, counts in self._slices:
+            for index, value in enumerate(counts):
+                totals[index] += value
+
+        total = sum(totals)
+        if not total:
+            return None
+
+        rank = q / 100.0 * total
+        cumulative = 0
+        for index, value in enumerate(totals):
+            cumulative += value
+            if cumulative >= rank:
+                return BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else BUCKET_BOUNDS[-1]
+        return BUCKET_BOUNDS[-1]
+
+
+def _bucket_index(seconds: float) -> int:
+    if seconds <= BUCKET_BOUNDS[0]:
+        return 0
+    return max(0, math.ceil(math.log(seconds / BUCKET_BOUNDS[0], 1.25)))
+
+
+class LatencyTracker:
+    """Per-model rolling latency histograms maintained by the AI service"""
+
+    def __init__(self, window: float = 60.0, slices: int = 6):
+        self.window = window
+        self.slices = slices
+        self.histograms: Dict[str, LatencyHistogram] = {}
+
+    def record(self, model_name: str, seconds: float):
+        histogram = self.histograms.get(model_name)
+        if histogram is None:
+            histogram = self.histograms[model_name] = LatencyHistogram(self.window, self.slices)
+        histogram.record(seconds)
+
+    def percentile(self, model_name: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """Latency percentile for a model, or None without enough samples"""
+        histogram = self.histograms.get(model_name)
+        if histogram is None or histogram.count() < min_samples:
+            return None
+        return histogram.percentile(q)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model percentiles grouped by metric: {metric: {model: value}}"""
+        stats: Dict[str, Dict[str, Any]] = {"samples": {}, "p50_seconds": {}, "p95_seconds": {}, "p99_seconds": {}}
+        for model_name, histogram in self.histograms.items():
+            stats["samples"][model_name] = histogram.count()
+            for q in (50, 95, 99):
+                value = histogram.percentile(q)
+                if value is not None:
+                    stats[f"p{q}_seconds"][model_name] = round(value, 4)
+        return stats
+
+
+class Hedger:
+    """Races a hedged request against a slow primary call.
+
+    The primary starts immediately; if it has not finished after ``delay``
+    the backup factory is asked for a second call (it may return None to
+    skip hedging, e.g. when the target is saturated). Whichever call
+    succeeds first wins and the other is cancelled. If both fail, the
+    primary's error is raised.
+    """
+
+    def __init__(self):
+        self.hedged = 0
+        self.backup_wins = 0
+        self.skipped = 0
+
+    async def race(
+        self,
+        primary: Callable[[], Awaitable[T]],
+        backup: Callable[[], Optional[Awaitable[T]]],
+        delay: float
+    ) -> T:
+        primary_task = asyncio.ensure_future(primary())
+        backup_task: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=delay)
+            if done:
+                return primary_task.result()
+
+            call = backup()
+            if call is None:
+                self.skipped += 1
+                return await primary_task
+
+            self.hedged += 1
+            backup_task = asyncio.ensure_future(call)
+            pending = {primary_task, backup_task}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        if task is backup_task:
+                            self.backup_wins += 1
+                        return task.result()
+
+            return primary_task.result()
+        finally:
+            for task in (primary_task, backup_task):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedged_total": self.hedged,
+            "backup_wins_total": self.backup_wins,
+            "skipped_total": self.skipped
+        }
@@ -0,0 +1,187 @@
+"""
+Latency, length and failure profiles for MockModel (load generation)
+"""
+import hashlib
+import json
+import math
+import random
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from app.core.config import settings
+
+# Distinct prompts whose occurrence count a seeded MockProfiles remembers
+SEEN_MAX_PROMPTS = 100_000
+
+
+class Distribution(ABC):
+    """A source of non-negative samples"""
+
+    @abstractmethod
+    def sample(self, rng: random.Random) -> float:
+        pass
+
+
+class Fixed(Distribution):
+    def __init__(self, value: float):
+        self.value = value
+
+    def sample(self, rng: random.Random) -> float:
+        return self.value
+
+
+class LogNormal(Distribution):
+    """Lognormal given its median and sigma (the spread of log values), clamped"""
+
+    def __init__(self, median: float, sigma: float, min_value: float = 0.0, max_value: float = math.inf):
+        self.mu = math.log(median)
+        self.sigma = sigma
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def sample(self, rng: random.Random) -> float:
+        return min(max(rng.lognormvariate(self.mu, self.sigma), self.min_value), self.max_value)
+
+
+class Trace(Distribution):
+    """Replays recorded samples, drawn uniformly at random.
+
+    The file holds one sample per line: a bare number or a JSON object
+    whose ``field`` is a number or a list of numbers (e.g. the inter-token
+    gaps of one recorded request).
+    """
+
+    def __init__(self, path: str, field: Optional[str] = None):
+        self.path = path
+        self.samples: List[float] = []
+        for line in Path(path).read_text().splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            value = json.loads(line)
+            if isinstance(value, dict):
+                value = value.get(field)
+            if isinstance(value, list):
+                self.samples.extend(float(v) for v in value)
+            elif value is not None:
+                self.samples.append(float(value))
+        if not self.samples:
+            raise ValueError(f"Trace {path} has no samples for {field!r}")
+
+    def sample(self, rng: random.Random) -> float:
+        return self.samples[rng.randrange(len(self.samples))]
+
+
+def create_distribution(spec: Any) -> Distribution:
+    """Build a distribution from its settings form
+
+    A bare number is a fixed value; otherwise a dict with "type" one of
+    "fixed" (value), "lognormal" (median, sigma, min, max) or "trace"
+    (path, field).
+    """
+    if isinstance(spec, (int, float)):
+        return Fixed(float(spec))
+    kind = spec.get("type", "fixed")
+    if kind == "fixed":
+        return Fixed(float(spec["value"]))
+    if kind == "lognormal":
+        return LogNormal(
+            float(spec["median"]),
+            float(spec.get("sigma", 0.5)),
+            float(spec.get("min", 0.0)),
+            float(spec.get("max", math.inf))
+        )
+    if kind == "trace":
+        return Trace(spec["path"], spec.get("field"))
+    raise ValueError(f"Unknown distribution type: {kind}")
+
+
+class MockRequest:
+    """Everything random about one mock request, drawn up front"""
+
+    def __init__(self, profile: "MockProfile", rng: random.Random):
+        self.profile = profile
+        self.rng = rng
+        self.ttft = profile.ttft.sample(rng)
+        self.length = round(profile.length.sample(rng)) if profile.length else None
+        self.timeout = rng.random() < profile.timeout_rate
+        self.failure = not self.timeout and rng.random() < profile.failure_rate
+        # Fraction of the response streamed before the failure
+        self.failure_point = rng.random() if self.failure else None
+
+    def itl(self) -> float:
+        return self.profile.itl.sample(self.rng)
+
+
+class MockProfile:
+    """How a mock model behaves: time to first token, inter-token latency,
+    response length (words) and failure/timeout rates.
+
+    ``decode_in_generate`` makes non-streaming calls also wait out the
+    inter-token latency of every word, like a real model; without it they
+    take just the time to first token.
+    """
+
+    def __init__(self, name: str, config: Dict[str, Any]):
+        self.name = name
+        self.ttft = create_distribution(config.get("ttft", 0.5))
+        self.itl = create_distribution(config.get("itl", 0.05))
+        self.length = create_distribution(config["length"]) if "length" in config else None
+        self.failure_rate = float(config.get("failure_rate", 0.0))
+        self.failure_status = int(config.get("failure_status", 503))
+        self.timeout_rate = float(config.get("timeout_rate", 0.0))
+        self.timeout_seconds = float(config.get("timeout_seconds", 30.0))
+        self.decode_in_generate = bool(config.get("decode_in_generate", False))
+
+
+class MockProfiles:
+    """Resolves each model's profile and hands out per-request randomness.
+
+    With a seed, a request's draws come from its own generator seeded by
+    (seed, model, prompt, how many times this model saw the prompt), so a
+    replayed workload gets the same latencies, lengths and failures however
+    its requests interleave. Occurrence counts are kept for the
+    SEEN_MAX_PROMPTS most recently seen prompts; a workload with more
+    distinct prompts than that is only reproducible for the recent ones.
+    """
+
+    def __init__(self, profiles: Dict[str, Dict[str, Any]], model_profiles: Dict[str, str],
+                 default: str, seed: Optional[int] = None):
+        self.profiles = {name: MockProfile(name, config) for name, config in profiles.items()}
+        self.model_profiles = model_profiles
+        self.default = default
+        self.seed = seed
+        self._seen: "OrderedDict[str, int]" = OrderedDict()
+        for name in [default, *model_profiles.values()]:
+            if name not in self.profiles:
+                raise ValueError(f"Unknown mock profile: {name}")
+
+    def profile(self, model: str) -> MockProfile:
+        return self.profiles[self.model_profiles.get(model, self.default)]
+
+    def request(self, model: str, prompt: str) -> MockRequest:
+        if self.seed is None:
+            rng = random.Random()
+        else:
+            key = hashlib.sha256(f"{model}\0{prompt}".encode()).hexdigest()
+            occurrence = self._seen.pop(key, 0)
+            self._seen[key] = occurrence + 1
+            if len(self._seen) > SEEN_MAX_PROMPTS:
+                self._seen.popitem(last=False)
+            rng = random.Random(f"{self.seed}:{key}:{occurrence}")
+        return MockRequest(self.profile(model), rng)
+
+
+_profiles: Optional[MockProfiles] = None
+
+
+def get_mock_profiles() -> MockProfiles:
+    """Profiles from settings (MOCK_PROFILES, MOCK_MODEL_PROFILES, MOCK_SEED)"""
+    global _profiles
+    if _profiles is None:
+        _profiles = MockProfiles(
+            settings.MOCK_PROFILES, settings.MOCK_MODEL_PROFILES, settings.MOCK_PROFILE, settings.MOCK_SEED
+        )
+    return _profiles
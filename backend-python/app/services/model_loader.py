@@ -0,0 +1,125 @@
+"""
+Concurrent, fault-isolated model initialization with per-model readiness
+"""
+import asyncio
+import time
+from typing import Dict, Any, Awaitable, Callable, Iterable, Optional
+
+from app.core.config import settings
+
+
+class ModelUnavailable(Exception):
+    """Raised when a configured model failed to load"""
+
+    def __init__(self, model_name: str, retry_after: float, reason: Optional[str] = None):
+        super().__init__(f"Model {model_name} failed to load" + (f": {reason}" if reason else ""))
+        self.model_name = model_name
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class ModelLoader:
+    """Loads models concurrently and tracks each one's readiness.
+
+    Every model loads in its own task within MODEL_INIT_TIMEOUT, so a slow
+    or broken adapter (client setup, credential check, warm-up call)
+    neither delays nor takes down the others. Lazy models load on first
+    use; a model that failed is retried on use once
+    MODEL_INIT_RETRY_SECONDS have passed. Loaded models are put into the
+    shared ``models`` dict, which therefore only ever holds ready models.
+
+    States: "lazy" (not requested yet), "loading", "ready", "failed".
+    """
+
+    def __init__(self, models: Dict[str, Any], create: Callable[[dict], Awaitable[Any]]):
+        self.models = models
+        self.create = create
+        self.states: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, configs: Dict[str, dict], lazy: Iterable[str] = ()):
+        """Begin loading every model not in ``lazy`` in the background"""
+        lazy = set(lazy)
+        for name, config in configs.items():
+            self.states[name] = {
+                "state": "lazy",
+                "error": None,
+                "load_seconds": None,
+                "failed_at": None,
+                "config": config
+            }
+            if name not in lazy:
+                self._spawn(name)
+
+    def _spawn(self, name: str) -> asyncio.Task:
+        task = self._tasks.get(name)
+        if task is None or task.done():
+            self.states[name].update(state="loading", error=None)
+            task = asyncio.create_task(self._load(name))
+            self._tasks[name] = task
+        return task
+
+    async def _load(self, name: str):
+        state = self.states[name]
+        start = time.monotonic()
+        try:
+            model = await asyncio.wait_for(self.create(state["config"]), settings.MODEL_INIT_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = f"timed out after {settings.MODEL_INIT_TIMEOUT:g}s" if isinstance(e, asyncio.TimeoutError) else str(e)
+            state.update(state="failed", error=error, failed_at=time.monotonic(),
+                         load_seconds=round(time.monotonic() - start, 3))
+            print(f"❌ Failed to load model {name}: {error}")
+            return
+        self.models[name] = model
+        state.update(state="ready", load_seconds=round(time.monotonic() - start, 3))
+        print(f"✅ Loaded model: {name} ({type(model).__name__}) in {state['load_seconds']:.2f}s")
+
+    async def require(self, name: str):
+        """Wait until a configured model is ready, loading it if needed
+
+        Raises ModelUnavailable if it fails to load or failed recently.
+        """
+        if name in self.models:
+            return
+        state = self.states[name]
+        if state["state"] == "failed":
+            retry_after = settings.MODEL_INIT_RETRY_SECONDS - (time.monotonic() - state["failed_at"])
+            if retry_after > 0:
+                raise ModelUnavailable(name, retry_after, state["error"])
+        # Shielded: a caller giving up does not abort the load for everyone else
+        await asyncio.shield(self._spawn(name))
+        if name not in self.models:
+            raise ModelUnavailable(name, settings.MODEL_INIT_RETRY_SECONDS, state["error"])
+
+    async def wait(self, names: Iterable[str]):
+        """Wait for the given models' loads in progress (failures are not raised)"""
+        tasks = [self._tasks[name] for name in names if name in self._tasks]
+        if tasks:
+            await asyncio.wait(tasks)
+
+    def is_configured(self, name: str) -> bool:
+        return name in self.states
+
+    def is_ready(self, name: str) -> bool:
+        return name in self.models
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                "state": "ready" if name in self.models else state["state"],
+                "error": state["error"],
+                "load_seconds": state["load_seconds"]
+            }
+            for name, state in self.states.items()
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        states = [entry["state"] for entry in self.status().values()]
+        return {name: states.count(name) for name in ["lazy", "loading", "ready", "failed"]}
+
+    async def shutdown(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
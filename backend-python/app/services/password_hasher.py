@@ -0,0 +1,133 @@
+"""
+Password hashing and verification off the event loop, in a bounded worker pool
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional
+
+from passlib.context import CryptContext
+
+from app.core.config import settings
+
+# Password hashing - using sha256_crypt instead of bcrypt for compatibility
+pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    """Hash a password (blocking; runs in the pool's workers)"""
+    return pwd_context.hash(password)
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password (blocking; runs in the pool's workers)"""
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class HasherSaturated(Exception):
+    """Raised when the hashing queue is full"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Password hashing is saturated, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Runs hashing in a pool of PASSWORD_HASH_WORKERS workers.
+
+    A sha256_crypt hash takes hundreds of milliseconds of CPU, and the
+    os_crypt backend holds the GIL while it runs, so the default pool is
+    processes ("thread" only helps backends that release the GIL). At most
+    PASSWORD_HASH_MAX_QUEUE calls wait for a worker; past that calls fail
+    fast with HasherSaturated instead of piling up behind a login storm.
+    """
+
+    def __init__(self, executor: Optional[str] = None, workers: Optional[int] = None,
+                 max_queue: Optional[int] = None):
+        self.executor_kind = executor or settings.PASSWORD_HASH_EXECUTOR
+        self.workers = workers or settings.PASSWORD_HASH_WORKERS
+        self.max_queue = settings.PASSWORD_HASH_MAX_QUEUE if max_queue is None else max_queue
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._queued = 0
+        self._running = 0
+        self._waits = deque(maxlen=1000)
+        self.calls_total = 0
+        self.rejected_total = 0
+        self.queue_wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+
+    def start(self):
+        """Create the pool (and fork its processes while the server has no other threads)"""
+        if self._executor is not None:
+            return
+        if self.executor_kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._executor.submit(int).result()
+        elif self.executor_kind == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        else:
+            raise ValueError(f"Unknown password hash executor: {self.executor_kind}")
+        self._slots = asyncio.Semaphore(self.workers)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(check_password, plain_password, hashed_password)
+
+    async def _run(self, fn: Callable, *args):
+        if self._executor is None:
+            self.start()
+        if self._queued >= self.max_queue and self._slots.locked():
+            self.rejected_total += 1
+            raise HasherSaturated(self._retry_after())
+
+        self._queued += 1
+        queued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self._queued -= 1
+        started_at = time.perf_counter()
+        wait = started_at - queued_at
+        self._waits.append(wait)
+        self.queue_wait_seconds_total += wait
+        self.calls_total += 1
+
+        self._running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._running -= 1
+            self._slots.release()
+            self.run_seconds_total += time.perf_counter() - started_at
+
+    def _retry_after(self) -> float:
+        """Time for the current queue to drain at the average hash duration"""
+        average = self.run_seconds_total / self.calls_total if self.calls_total else 0.5
+        return max(average * (self._queued + self._running) / self.workers, 1.0)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "queued": self._queued,
+            "calls_total": self.calls_total,
+            "rejected_total": self.rejected_total,
+            "queue_wait_seconds_total": round(self.queue_wait_seconds_total, 6),
+            "queue_wait_p95_seconds": round(waits[math.ceil(len(waits) * 0.95) - 1], 6) if waits else 0.0,
+            "queue_wait_max_seconds": round(waits[-1], 6) if waits else 0.0,
+            "run_seconds_total": round(self.run_seconds_total, 6)
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,282 @@
+"""
+Provider adapters for real AI model APIs (OpenAI, Anthropic, Google)
+"""
+import json
+from typing import Dict, Any, List, Optional, AsyncGenerator, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.services.ai_service import AIModel
+
+
+class UpstreamError(Exception):
+    """Error returned by an upstream provider API"""
+
+    def __init__(self, provider: str, status_code: int, message: str):
+        super().__init__(f"{provider} upstream error {status_code}: {message}")
+        self.provider = provider
+        self.status_code = status_code
+        self.message = message
+
+
+class ProviderClientPool:
+    """Shared pooled HTTP clients, one per provider.
+
+    Every model of a provider reuses the same ``httpx.AsyncClient`` so
+    connections are kept alive and multiplexed (HTTP/2) across requests
+    instead of being opened per call.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        """Get (or lazily create) the shared client for a provider"""
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._create_client(provider)
+            self._clients[provider] = client
+        return client
+
+    def _create_client(self, provider: str) -> httpx.AsyncClient:
+        base_url, headers = provider_endpoint(provider)
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            http2=settings.HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.HTTP_CONNECT_TIMEOUT,
+                read=settings.HTTP_READ_TIMEOUT,
+                write=settings.HTTP_WRITE_TIMEOUT,
+                pool=settings.HTTP_POOL_TIMEOUT,
+            ),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool statistics"""
+        return {
+            "providers": list(self._clients.keys()),
+            "http2": settings.HTTP2_ENABLED,
+            "max_connections": settings.HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        }
+
+    async def aclose(self):
+        """Close all provider clients"""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+
+def provider_endpoint(provider: str) -> Tuple[str, Dict[str, str]]:
+    """Get base URL and auth headers for a provider"""
+    api_key = provider_api_key(provider)
+    if provider == "openai":
+        base_url = settings.OPENAI_BASE_URL
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    elif provider == "anthropic":
+        base_url = settings.ANTHROPIC_BASE_URL
+        headers = {"anthropic-version": settings.ANTHROPIC_VERSION}
+        if api_key:
+            headers["x-api-key"] = api_key
+    elif provider == "google":
+        base_url = settings.GOOGLE_BASE_URL
+        headers = {"x-goog-api-key": api_key} if api_key else {}
+    else:
+        raise ValueError(f"Unknown provider: {provider}")
+    return base_url, headers
+
+
+def provider_api_key(provider: str) -> str:
+    """Get the configured API key for a provider"""
+    return {
+        "openai": settings.OPENAI_API_KEY,
+        "anthropic": settings.ANTHROPIC_API_KEY,
+        "google": settings.GOOGLE_API_KEY,
+    }.get(provider, "")
+
+
+async def iter_sse(response: httpx.Response) -> AsyncGenerator[Tuple[str, str], None]:
+    """Parse a server-sent events stream into (event, data) pairs"""
+    event = "message"
+    data_lines: List[str] = []
+
+    async for line in response.aiter_lines():
+        if not line:
+            if data_lines:
+                yield event, "\n".join(data_lines)
+            event = "message"
+            data_lines = []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+
+    if data_lines:
+        yield event, "\n".join(data_lines)
+
+
+class HTTPModel(AIModel):
+    """Base class for models served over a provider HTTP API"""
+
+    provider = ""
+
+    def __init__(self, config: dict, client: httpx.AsyncClient):
+        super().__init__(config)
+        self.client = client
+        self.base_model = config["base_model"]
+        self.top_p = config.get("top_p", 1.0)
+
+    def _messages(self, prompt: str, kwargs: dict) -> List[Dict[str, str]]:
+        """Chat messages for the request (explicit history or single prompt)"""
+        return kwargs.get("messages") or [{"role": "user", "content": prompt}]
+
+    def _params(self, kwargs: dict) -> Dict[str, Any]:
+        """Sampling parameters with model defaults"""
+        return {
+            "temperature": kwargs.get("temperature", self.temperature),
+            "top_p": kwargs.get("top_p", self.top_p),
+            "max_tokens": kwargs.get("max_tokens", self.max_tokens),
+        }
+
+    async def _post(self, path: str, payload: dict) -> dict:
+        response = await self.client.post(path, json=payload)
+        if response.status_code >= 400:
+            raise UpstreamError(self.provider, response.status_code, response.text[:500])
+        return response.json()
+
+    async def _stream_events(self, path: str, payload: dict) -> AsyncGenerator[Tuple[str, str], None]:
+        async with self.client.stream("POST", path, json=payload) as response:
+            if response.status_code >= 400:
+                body = await response.aread()
+                raise UpstreamError(self.provider, response.status_code, body.decode(errors="replace")[:500])
+            async for event, data in iter_sse(response):
+                yield event, data
+
+
+class OpenAIModel(HTTPModel):
+    """OpenAI chat completions adapter"""
+
+    provider = "openai"
+
+    def _payload(self, prompt: str, kwargs: dict, stream: bool) -> dict:
+        return {
+            "model": self.base_model,
+            "messages": self._messages(prompt, kwargs),
+            "stream": stream,
+            **self._params(kwargs),
+        }
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        data = await self._post("/chat/completions", self._payload(prompt, kwargs, False))
+        return data["choices"][0]["message"]["content"] or ""
+
+    async def stream(self, prompt: str, **kwargs) -> AsyncGenerator[str, None]:
+        async for _, data in self._stream_events("/chat/completions", self._payload(prompt, kwargs, True)):
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or []
+            if choices:
+                text = choices[0].get("delta", {}).get("content")
+                if text:
+                    yield text
+
+
+class AnthropicModel(HTTPModel):
+    """Anthropic messages API adapter"""
+
+    provider = "anthropic"
+
+    def _payload(self, prompt: str, kwargs: dict, stream: bool) -> dict:
+        messages = self._messages(prompt, kwargs)
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        payload = {
+            "model": self.base_model,
+            "messages": [m for m in messages if m["role"] != "system"],
+            "stream": stream,
+            **self._params(kwargs),
+        }
+        if system:
+            payload["system"] = system
+        return payload
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        data = await self._post("/messages", self._payload(prompt, kwargs, False))
+        return "".join(block.get("text", "") for block in data.get("content", []))
+
+    async def stream(self, prompt: str, **kwargs) -> AsyncGenerator[str, None]:
+        async for event, data in self._stream_events("/messages", self._payload(prompt, kwargs, True)):
+            if event == "message_stop":
+                break
+            if event == "content_block_delta":
+                text = json.loads(data).get("delta", {}).get("text")
+                if text:
+                    yield text
+
+
+class GoogleModel(HTTPModel):
+    """Google Gemini generateContent adapter"""
+
+    provider = "google"
+
+    def _payload(self, prompt: str, kwargs: dict) -> dict:
+        messages = self._messages(prompt, kwargs)
+        params = self._params(kwargs)
+        payload = {
+            "contents": [
+                {
+                    "role": "model" if m["role"] == "assistant" else "user",
+                    "parts": [{"text": m["content"]}]
+                }
+                for m in messages if m["role"] != "system"
+            ],
+            "generationConfig": {
+                "temperature": params["temperature"],
+                "topP": params["top_p"],
+                "maxOutputTokens": params["max_tokens"],
+            },
+        }
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        if system:
+            payload["systemInstruction"] = {"parts": [{"text": system}]}
+        return payload
+
+    @staticmethod
+    def _text(data: dict) -> str:
+        candidates = data.get("candidates") or []
+        if not candidates:
+            return ""
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        data = await self._post(f"/models/{self.base_model}:generateContent", self._payload(prompt, kwargs))
+        return self._text(data)
+
+    async def stream(self, prompt: str, **kwargs) -> AsyncGenerator[str, None]:
+        path = f"/models/{self.base_model}:streamGenerateContent?alt=sse"
+        async for _, data in self._stream_events(path, self._payload(prompt, kwargs)):
+            text = self._text(json.loads(data))
+            if text:
+                yield text
+
+
+PROVIDER_MODELS = {
+    "openai": OpenAIModel,
+    "anthropic": AnthropicModel,
+    "google": GoogleModel,
+}
+
+
+def create_provider_model(config: dict, pool: ProviderClientPool) -> Optional[AIModel]:
+    """Create a provider adapter for a model config, if the provider is supported"""
+    model_class = PROVIDER_MODELS.get(config.get("provider"))
+    if model_class is None:
+        return None
+    return model_class(config, pool.get(config["provider"]))
@@ -0,0 +1,173 @@
+"""
+Per-model rate limiting with async token buckets and bounded queueing
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, AsyncIterator
+
+from app.core.config import settings
+from app.services.scheduler import FairScheduler
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request cannot be admitted within the wait budget"""
+
+    def __init__(self, model_name: str, retry_after: float, reason: str = "rate limit"):
+        super().__init__(f"{model_name} {reason} exceeded, retry after {retry_after:.1f}s")
+        self.model_name = model_name
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucket:
+    """Requests-per-minute token bucket that hands out future reservations"""
+
+    def __init__(self, rate_per_minute: float, burst: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(burst, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self) -> float:
+        """Seconds until a new reservation would be served"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def reserve(self) -> float:
+        """Take a token (possibly going into debt) and return the wait time"""
+        wait = self.delay()
+        self.tokens -= 1
+        return wait
+
+    def refund(self):
+        """Return a reserved token that was not used"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class ModelLimiter:
+    """Requests-per-minute and concurrency limiter for one model"""
+
+    def __init__(self, model_name: str, rate_limit: float, max_concurrency: int, max_wait: float, max_queue: int):
+        self.model_name = model_name
+        self.bucket = TokenBucket(rate_limit, rate_limit / 60.0 * settings.MODEL_RATE_LIMIT_BURST_SECONDS)
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.scheduler = FairScheduler(max_concurrency, settings.SCHEDULER_PLAN_WEIGHTS)
+
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def acquire(self, max_wait: Optional[float] = None, plan: str = "free", user_key: str = ""):
+        """Wait for a rate-limit token and a fair-share concurrency slot, or fail fast"""
+        if not settings.SCHEDULER_ENABLED:
+            plan = user_key = "fifo"
+        budget = self.max_wait if max_wait is None else max_wait
+        start = time.monotonic()
+
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise RateLimitExceeded(self.model_name, max(self.bucket.delay(), 1.0), "queue")
+
+        # Reject up front when the bucket alone would blow the wait budget
+        delay = self.bucket.delay()
+        if delay > budget:
+            self.rejected += 1
+            raise RateLimitExceeded(self.model_name, delay, "rate limit")
+
+        self.waiting += 1
+        wait = self.bucket.reserve()
+        try:
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            remaining = budget - (time.monotonic() - start)
+            try:
+                await self.scheduler.acquire(plan, user_key, timeout=max(remaining, 0.001))
+            except asyncio.TimeoutError:
+                self.bucket.refund()
+                self.rejected += 1
+                raise RateLimitExceeded(self.model_name, max(budget / 2, 1.0), "concurrency")
+        except asyncio.CancelledError:
+            # A waiter that gave up (client disconnect, hedge loser) used no rate budget
+            self.bucket.refund()
+            raise
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - start
+        self.in_flight += 1
+        self.admitted += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def release(self):
+        """Release a concurrency slot"""
+        self.in_flight -= 1
+        self.scheduler.release()
+
+    @asynccontextmanager
+    async def slot(self, max_wait: Optional[float] = None, plan: str = "free", user_key: str = "") -> AsyncIterator[None]:
+        await self.acquire(max_wait, plan, user_key)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "admitted_total": self.admitted,
+            "rejected_total": self.rejected,
+            "wait_seconds_avg": round(self.wait_seconds_total / self.admitted, 4) if self.admitted else 0.0,
+            "wait_seconds_max": round(self.wait_seconds_max, 4)
+        }
+
+
+class RateLimiter:
+    """Limiters for every model, built from HOYO_MODELS rate_limit settings"""
+
+    def __init__(self, model_configs: Dict[str, dict]):
+        self.limiters: Dict[str, ModelLimiter] = {
+            model_name: ModelLimiter(
+                model_name,
+                rate_limit=config.get("rate_limit", settings.RATE_LIMIT_REQUESTS),
+                max_concurrency=config.get("max_concurrency", settings.MODEL_MAX_CONCURRENCY),
+                max_wait=settings.MODEL_MAX_QUEUE_WAIT,
+                max_queue=settings.MODEL_MAX_QUEUE_SIZE
+            )
+            for model_name, config in model_configs.items()
+        }
+
+    def get(self, model_name: str) -> Optional[ModelLimiter]:
+        return self.limiters.get(model_name)
+
+    def scheduler_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Fair scheduler stats summed over models: {metric: {plan: value}}"""
+        totals: Dict[str, Dict[str, Any]] = {}
+        for limiter in self.limiters.values():
+            for metric, per_plan in limiter.scheduler.stats().items():
+                for plan, value in per_plan.items():
+                    bucket = totals.setdefault(metric, {})
+                    bucket[plan] = round(bucket.get(plan, 0) + value, 4)
+        return totals
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model stats grouped by metric: {metric: {model: value}}"""
+        grouped: Dict[str, Dict[str, Any]] = {}
+        for model_name, limiter in self.limiters.items():
+            for metric, value in limiter.stats().items():
+                grouped.setdefault(metric, {})[model_name] = value
+        return grouped
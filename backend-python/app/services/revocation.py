@@ -0,0 +1,171 @@
+"""
+Revoked-token checks: a persisted denylist fronted by an in-memory Bloom filter
+"""
+import asyncio
+import hashlib
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterator, Optional, Set
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import register_collector
+from app.models.database import RevokedToken
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # One digest, split into two hashes combined as h1 + i * h2
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenRevocations:
+    """Revoked JWT ids (jti), checked on every authenticated request.
+
+    Revocations are rows in revoked_tokens; the Bloom filter holds all of
+    them, so a token that was never revoked is cleared with one hash and
+    only filter positives (revoked tokens and the rare false positive)
+    query the table. The filter is rebuilt from the table on startup and
+    updated in place on revoke; every REVOCATION_SYNC_SECONDS it also picks
+    up revocations made by other workers, and once it holds more entries
+    than it was sized for it is rebuilt larger, dropping expired rows.
+    """
+
+    def __init__(self):
+        self.bloom = BloomFilter(settings.REVOCATION_BLOOM_CAPACITY, settings.REVOCATION_BLOOM_ERROR_RATE)
+        self._synced_at: Optional[datetime] = None
+        # jtis revoked here while a rebuild reads the table, for the new filter
+        self._revoked_during_rebuild: Optional[Set[str]] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.checks_total = 0
+        self.positives_total = 0
+        self.false_positives_total = 0
+        self.revoked_total = 0
+
+    async def start(self):
+        """Build the filter from the table and start syncing"""
+        await self._rebuild()
+        self._task = asyncio.create_task(self._run())
+        register_collector("token_revocations", self.stats)
+
+    async def _rebuild(self):
+        self._revoked_during_rebuild = set()
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(delete(RevokedToken).where(RevokedToken.expires_at < datetime.utcnow()))
+                await db.commit()
+                result = await db.execute(select(RevokedToken.jti, RevokedToken.revoked_at))
+                rows = result.all()
+
+            capacity = max(settings.REVOCATION_BLOOM_CAPACITY, 2 * len(rows))
+            bloom = BloomFilter(capacity, settings.REVOCATION_BLOOM_ERROR_RATE)
+            for jti, _ in rows:
+                bloom.add(jti)
+            # Revocations committed after the select only reached the old filter
+            for jti in self._revoked_during_rebuild:
+                if jti not in bloom:
+                    bloom.add(jti)
+            self.bloom = bloom
+        finally:
+            self._revoked_during_rebuild = None
+        self._synced_at = max((revoked_at for _, revoked_at in rows), default=self._synced_at)
+        print(f"🔒 Loaded {len(rows)} revoked token(s)")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.REVOCATION_SYNC_SECONDS)
+            try:
+                await self._sync()
+            except Exception as e:
+                print(f"❌ Failed to sync revoked tokens: {e}")
+
+    async def _sync(self):
+        """Add revocations recorded since the last sync (by any worker)
+
+        revoked_at is stamped before the row commits, so under write
+        contention an earlier-stamped row can become visible after a later
+        one; each sync reads back REVOCATION_SYNC_SECONDS before the newest
+        timestamp seen so such rows are not skipped.
+        """
+        query = select(RevokedToken.jti, RevokedToken.revoked_at)
+        if self._synced_at is not None:
+            since = self._synced_at - timedelta(seconds=settings.REVOCATION_SYNC_SECONDS)
+            query = query.where(RevokedToken.revoked_at >= since)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(query)).all()
+        for jti, revoked_at in rows:
+            # Rows inside the lookback come back again
+            if jti not in self.bloom:
+                self.bloom.add(jti)
+            self._synced_at = max(revoked_at, self._synced_at or revoked_at)
+        if self.bloom.count > self.bloom.capacity:
+            await self._rebuild()
+
+    async def is_revoked(self, jti: Optional[str], db: AsyncSession) -> bool:
+        """Whether a token id was revoked; tokens without a jti cannot be"""
+        if not settings.TOKEN_REVOCATION_ENABLED or jti is None:
+            return False
+        self.checks_total += 1
+        if jti not in self.bloom:
+            return False
+        self.positives_total += 1
+        result = await db.execute(select(RevokedToken.jti).where(RevokedToken.jti == jti))
+        if result.first() is None:
+            self.false_positives_total += 1
+            return False
+        return True
+
+    async def revoke(self, jti: str, user_id: str, expires_at: datetime, db: AsyncSession):
+        """Persist a revocation and add it to the filter"""
+        if await db.get(RevokedToken, jti) is None:
+            db.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at, revoked_at=datetime.utcnow()))
+            await db.commit()
+        if jti not in self.bloom:
+            self.bloom.add(jti)
+        if self._revoked_during_rebuild is not None:
+            self._revoked_during_rebuild.add(jti)
+        self.revoked_total += 1
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": self.bloom.count,
+            "capacity": self.bloom.capacity,
+            "bloom_bytes": len(self.bloom.bits),
+            "bloom_hashes": self.bloom.hashes,
+            "checks_total": self.checks_total,
+            "positives_total": self.positives_total,
+            "false_positives_total": self.false_positives_total,
+            "revoked_total": self.revoked_total
+        }
+
+
+token_revocations = TokenRevocations()
@@ -0,0 +1,128 @@
+"""
+Plan-aware weighted fair scheduling of model concurrency slots
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Any, Deque, Tuple
+
+
+class FairScheduler:
+    """Weighted fair queueing of a model's concurrency slots.
+
+    Waiters are grouped by plan and, within a plan, by user. When a slot
+    frees up the backlogged plan with the lowest virtual pass is served
+    (stride scheduling: each grant advances the plan's pass by 1/weight), and
+    users inside the plan are served round-robin. Under saturation every
+    plan receives slots in proportion to its weight, so enterprise and pro
+    traffic keeps its share while free users still make progress.
+    """
+
+    def __init__(self, slots: int, weights: Dict[str, float], default_weight: float = 1.0):
+        self.slots = slots
+        self.weights = weights
+        self.default_weight = default_weight
+        self.in_use = 0
+
+        # plan -> user -> queue of (future, enqueued_at)
+        self._queues: Dict[str, "OrderedDict[str, Deque[Tuple[asyncio.Future, float]]]"] = {}
+        self._pass: Dict[str, float] = {}
+        self._virtual_time = 0.0
+
+        self.granted: Dict[str, int] = {}
+        self.timed_out: Dict[str, int] = {}
+        self.wait_seconds: Dict[str, float] = {}
+
+    def waiting(self, plan: str = None) -> int:
+        """Number of queued callers (for one plan or in total)"""
+        plans = [plan] if plan is not None else list(self._queues)
+        return sum(
+            len(queue)
+            for name in plans
+            for queue in self._queues.get(name, {}).values()
+        )
+
+    async def acquire(self, plan: str, user_key: str, timeout: float):
+        """Wait for a slot in plan/user order; raises asyncio.TimeoutError"""
+        if self.in_use < self.slots and not self._queues:
+            self._grant(plan, 0.0)
+            return
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        entry = (future, time.monotonic())
+
+        if plan not in self._queues:
+            self._queues[plan] = OrderedDict()
+            # A plan returning from idle does not get credit for the idle time
+            self._pass[plan] = max(self._pass.get(plan, 0.0), self._virtual_time)
+        self._queues[plan].setdefault(user_key, deque()).append(entry)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if future.done() and not future.cancelled():
+                # Granted while timing out: hand the slot back
+                self.release()
+            else:
+                future.cancel()
+                self._remove(plan, user_key, entry)
+                self.timed_out[plan] = self.timed_out.get(plan, 0) + 1
+            raise
+
+    def release(self):
+        """Release a slot and hand it to the next waiter"""
+        self.in_use -= 1
+        self._dispatch()
+
+    def _grant(self, plan: str, waited: float):
+        self.in_use += 1
+        self.granted[plan] = self.granted.get(plan, 0) + 1
+        self.wait_seconds[plan] = self.wait_seconds.get(plan, 0.0) + waited
+
+    def _dispatch(self):
+        while self.in_use < self.slots and self._queues:
+            plan = min(self._queues, key=lambda name: self._pass[name])
+            users = self._queues[plan]
+            user_key, queue = next(iter(users.items()))
+            future, enqueued_at = queue.popleft()
+
+            # Round-robin users within the plan
+            if queue:
+                users.move_to_end(user_key)
+            else:
+                del users[user_key]
+            if not users:
+                del self._queues[plan]
+
+            if future.cancelled():
+                continue
+
+            self._virtual_time = self._pass[plan]
+            self._pass[plan] += 1.0 / self.weights.get(plan, self.default_weight)
+            self._grant(plan, time.monotonic() - enqueued_at)
+            future.set_result(None)
+
+    def _remove(self, plan: str, user_key: str, entry: Tuple[asyncio.Future, float]):
+        users = self._queues.get(plan)
+        if not users or user_key not in users:
+            return
+        queue = users[user_key]
+        try:
+            queue.remove(entry)
+        except ValueError:
+            return
+        if not queue:
+            del users[user_key]
+        if not users:
+            del self._queues[plan]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-plan stats grouped by metric: {metric: {plan: value}}"""
+        plans = set(self.granted) | set(self._queues) | set(self.weights)
+        return {
+            "queue_depth": {plan: self.waiting(plan) for plan in plans},
+            "granted_total": {plan: self.granted.get(plan, 0) for plan in plans},
+            "timed_out_total": {plan: self.timed_out.get(plan, 0) for plan in plans},
+            "wait_seconds_total": {plan: round(self.wait_seconds.get(plan, 0.0), 4) for plan in plans}
+        }
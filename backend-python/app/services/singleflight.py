@@ -0,0 +1,136 @@
+"""
+Single-flight coalescing of identical in-flight model calls
+"""
+import asyncio
+from typing import Dict, Any, List, Optional, Callable, Awaitable, AsyncIterator, TypeVar
+
+T = TypeVar("T")
+
+
+class StreamFlight:
+    """One upstream stream fanned out to any number of subscribers.
+
+    Chunks are kept for the lifetime of the flight so subscribers that join
+    late replay the response from the start before following it live. When
+    the last subscriber goes away before the stream ends, the upstream
+    stream is cancelled.
+    """
+
+    def __init__(self, source: AsyncIterator[str]):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._source = source
+        self._condition = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._on_done: Callable[[], None] = lambda: None
+
+    def start(self, on_done: Callable[[], None]):
+        """Start pulling the upstream stream in a background task"""
+        self._on_done = on_done
+        self._task = asyncio.create_task(self._pump())
+
+    async def _pump(self):
+        try:
+            async for chunk in self._source:
+                async with self._condition:
+                    self.chunks.append(chunk)
+                    self._condition.notify_all()
+        except asyncio.CancelledError:
+            self.error = RuntimeError("Upstream stream cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            # Unregister before waking subscribers so no new request joins a finished flight
+            self._on_done()
+            async with self._condition:
+                self.done = True
+                self._condition.notify_all()
+
+    def subscribe(self) -> AsyncIterator[str]:
+        """Iterate over all chunks, replaying the ones already produced"""
+        # Count the subscriber now, not on first iteration, so an early leaver
+        # cannot cancel a flight someone else is about to read
+        self.subscribers += 1
+        return self._follow()
+
+    async def _follow(self) -> AsyncIterator[str]:
+        index = 0
+        try:
+            while True:
+                async with self._condition:
+                    while index >= len(self.chunks) and not self.done:
+                        await self._condition.wait()
+                    pending = self.chunks[index:]
+                    finished = self.done
+
+                for chunk in pending:
+                    yield chunk
+                index += len(pending)
+
+                if finished and index >= len(self.chunks):
+                    break
+
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done and self._task is not None:
+                self._task.cancel()
+
+
+class SingleFlight:
+    """Share one upstream call between identical concurrent requests"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, StreamFlight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run ``fn`` once per key; concurrent callers await the same result"""
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._finish_call(key, f))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        # Shield so one cancelled caller does not cancel the shared call
+        return await asyncio.shield(future)
+
+    def _finish_call(self, key: str, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            future.exception()  # mark as retrieved even if every caller went away
+
+    def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Subscribe to the shared stream for a key, starting it if needed"""
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = StreamFlight(factory())
+            self._streams[key] = flight
+            flight.start(on_done=lambda: self._finish_stream(key, flight))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        return flight.subscribe()
+
+    def _finish_stream(self, key: str, flight: StreamFlight):
+        if self._streams.get(key) is flight:
+            del self._streams[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get coalescing statistics"""
+        return {
+            "in_flight_calls": len(self._calls),
+            "in_flight_streams": len(self._streams),
+            "leaders_total": self.leaders,
+            "coalesced_total": self.coalesced
+        }
@@ -0,0 +1,175 @@
+"""
+Streaming helpers: coalescing model chunks into client frames, accumulating responses
+"""
+import asyncio
+import time
+from typing import Dict, Any, AsyncIterator, AsyncGenerator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.tokenizer import get_tokenizer
+
+def coalesce_settings(max_latency_ms: Optional[float] = None, max_bytes: Optional[int] = None) -> Tuple[float, int]:
+    """Resolve per-client coalescing options against the defaults (seconds, bytes)"""
+    if not settings.STREAM_COALESCE_ENABLED and max_latency_ms is None:
+        return 0.0, 0
+    latency_ms = settings.STREAM_COALESCE_MS if max_latency_ms is None else max_latency_ms
+    size = settings.STREAM_COALESCE_MAX_BYTES if max_bytes is None else max_bytes
+    return latency_ms / 1000.0, size
+
+
+async def coalesce(
+    chunks: AsyncIterator[str],
+    max_latency: float,
+    max_bytes: int
+) -> AsyncGenerator[str, None]:
+    """Batch text chunks into frames.
+
+    The first chunk is passed through immediately so time-to-first-token is
+    unchanged. After that, a frame opens with the next chunk and is flushed
+    once it has been open ``max_latency`` seconds or holds ``max_bytes``.
+    A pump task drains the source into the open frame and only wakes the
+    consumer when a frame opens, fills up or the source ends, so the cost
+    per chunk is a list append. Errors from the source are re-raised after
+    the buffered text has been flushed.
+    """
+    if max_latency <= 0:
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            # Close the source now rather than whenever it is garbage collected
+            await chunks.aclose()
+        return
+
+    buffer: List[str] = []
+    state = {"size": 0, "ended": False, "error": None}
+    wake = asyncio.Event()
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                buffer.append(chunk)
+                state["size"] += len(chunk.encode("utf-8"))
+                if len(buffer) == 1 or state["size"] >= max_bytes:
+                    wake.set()
+        except Exception as e:
+            state["error"] = e
+        finally:
+            state["ended"] = True
+            wake.set()
+
+    def take() -> str:
+        frame = "".join(buffer)
+        buffer.clear()
+        state["size"] = 0
+        return frame
+
+    task = asyncio.create_task(pump())
+    first = True
+    try:
+        while True:
+            # The pump may have filled the buffer and ended before the last frame was taken
+            if not buffer and not state["ended"]:
+                await wake.wait()
+            wake.clear()
+
+            if first and buffer:
+                first = False
+                yield take()
+                continue
+
+            # A frame is open: wait out the window unless it fills up or the source ends
+            if buffer and not state["ended"] and state["size"] < max_bytes:
+                try:
+                    await asyncio.wait_for(wake.wait(), max_latency)
+                except asyncio.TimeoutError:
+                    pass
+                wake.clear()
+
+            if buffer:
+                yield take()
+            if state["ended"] and not buffer:
+                if state["error"] is not None:
+                    raise state["error"]
+                return
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+class StreamAccumulator:
+    """Collects a streamed response in linear time with a running token count.
+
+    Chunks are appended to a list that is joined only when the text is
+    read; the join is kept, so reading at every checkpoint stays cheap.
+    ``checkpoint_due`` tells when STREAM_CHECKPOINT_TOKENS new tokens or
+    STREAM_CHECKPOINT_SECONDS have passed since the last ``checkpointed``.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._counter = get_tokenizer().counter()
+        self._checkpoint_tokens = 0
+        self._checkpoint_at = time.monotonic()
+
+    def append(self, chunk: str):
+        self._parts.append(chunk)
+        self._counter.feed(chunk)
+
+    @property
+    def tokens(self) -> int:
+        return self._counter.total
+
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts[:] = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def checkpoint_due(self) -> bool:
+        new_tokens = self.tokens - self._checkpoint_tokens
+        if new_tokens <= 0:
+            return False
+        return (
+            new_tokens >= settings.STREAM_CHECKPOINT_TOKENS
+            or time.monotonic() - self._checkpoint_at >= settings.STREAM_CHECKPOINT_SECONDS
+        )
+
+    def checkpointed(self):
+        self._checkpoint_tokens = self.tokens
+        self._checkpoint_at = time.monotonic()
+
+
+class StreamStats:
+    """Completed vs cancelled upstream streams and the tokens cancellation saved.
+
+    Tokens saved are estimated per model from a moving average of completed
+    stream lengths (capped at the request's max_tokens) minus what had been
+    generated when the stream was cancelled.
+    """
+
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self.average_tokens: Dict[str, float] = {}
+        self.completed_total = 0
+        self.cancelled_total = 0
+        self.cancelled_generated_tokens = 0
+        self.saved_tokens = 0
+
+    def completed(self, model_name: str, tokens: int):
+        self.completed_total += 1
+        average = self.average_tokens.get(model_name)
+        self.average_tokens[model_name] = tokens if average is None else average + self.alpha * (tokens - average)
+
+    def cancelled(self, model_name: str, tokens: int, max_tokens: int):
+        self.cancelled_total += 1
+        self.cancelled_generated_tokens += tokens
+        expected = min(self.average_tokens.get(model_name, 0.0), max_tokens)
+        self.saved_tokens += max(int(expected) - tokens, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "completed_total": self.completed_total,
+            "cancelled_total": self.cancelled_total,
+            "cancelled_generated_tokens_total": self.cancelled_generated_tokens,
+            "saved_tokens_total": self.saved_tokens
+        }
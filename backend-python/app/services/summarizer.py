@@ -0,0 +1,197 @@
+"""
+Background incremental conversation summaries
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update, func
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import register_collector
+from app.models.database import Conversation, Message
+from app.services.tokenizer import get_tokenizer
+
+SUMMARY_PROMPT = """Ты ведёшь краткое содержание разговора пользователя с ассистентом.
+Дополни текущее краткое содержание новыми сообщениями. Сохрани факты, решения,
+договорённости и открытые вопросы, убери повторы. Ответь только обновлённым
+кратким содержанием, не длиннее {max_tokens} токенов.
+
+Текущее краткое содержание:
+{summary}
+
+Новые сообщения:
+{messages}"""
+
+
+class ConversationSummarizer:
+    """Keeps Conversation.summary up to date in a background worker.
+
+    Conversations are queued when a response is saved. Once the tokens
+    written after a conversation's ``summary_watermark`` reach
+    SUMMARY_TRIGGER_TOKENS, the oldest of those messages (up to
+    SUMMARY_CHUNK_TOKENS) are folded into the existing summary and the
+    watermark moves to the last one folded, so each call reads only new
+    messages, never the whole history.
+
+    One worker runs the calls. It waits until the summary model has idle
+    capacity (SUMMARY_MAX_LOAD) and then queues as the low-weight
+    "background" plan, so summaries only use capacity that interactive
+    traffic leaves unused.
+    """
+
+    def __init__(self):
+        self.ai_service = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+        self.summarized_total = 0
+        self.folded_messages_total = 0
+        self.folded_tokens_total = 0
+        self.deferred_total = 0
+        self.failed_total = 0
+
+    def start(self, ai_service):
+        """Start the worker"""
+        self.ai_service = ai_service
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        register_collector("summarizer", self.stats)
+
+    def notify(self, conversation_id: str):
+        """Queue a conversation whose history grew; cheap and never blocks"""
+        if not settings.SUMMARY_ENABLED or self._queue is None or conversation_id in self._queued:
+            return
+        self._queued.add(conversation_id)
+        self._queue.put_nowait(conversation_id)
+
+    async def shutdown(self):
+        """Stop the worker; queued conversations are picked up again on their next message"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            conversation_id = await self._queue.get()
+            self._queued.discard(conversation_id)
+            try:
+                more = await self.summarize(conversation_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed_total += 1
+                print(f"❌ Failed to summarize conversation {conversation_id}: {e}")
+                continue
+            if more:
+                self.notify(conversation_id)
+
+    async def summarize(self, conversation_id: str) -> bool:
+        """Fold the next chunk of new messages into the summary if enough piled up
+
+        Returns True if another chunk is still over the trigger.
+        """
+        async with AsyncSessionLocal() as db:
+            conversation = await db.get(Conversation, conversation_id)
+            if conversation is None:
+                return False
+            summary = conversation.summary
+            watermark = conversation.summary_watermark
+
+            pending = Message.conversation_id == conversation_id
+            if watermark is not None:
+                pending = pending & (Message.created_at > watermark)
+
+            pending_tokens = await db.scalar(
+                select(func.coalesce(func.sum(Message.token_count), 0)).where(pending)
+            )
+            if pending_tokens < settings.SUMMARY_TRIGGER_TOKENS:
+                return False
+
+            messages = await self._load_chunk(db, pending)
+            if not messages:
+                return False
+
+        folded_tokens = sum(tokens for _, _, tokens, _ in messages)
+        prompt = SUMMARY_PROMPT.format(
+            max_tokens=settings.SUMMARY_MAX_TOKENS,
+            summary=summary or "(пока нет)",
+            messages="\n\n".join(f"{role}: {content}" for role, content, _, _ in messages)
+        )
+
+        await self._wait_for_capacity(settings.SUMMARY_MODEL)
+        new_summary = await self.ai_service.background_completion(
+            prompt, settings.SUMMARY_MODEL, settings.SUMMARY_MAX_TOKENS
+        )
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id)
+                .values(
+                    summary=new_summary.strip(),
+                    summary_watermark=messages[-1][3],
+                    # A summary is not activity: keep the conversation's position in lists
+                    updated_at=Conversation.updated_at
+                )
+            )
+            await db.commit()
+
+        self.summarized_total += 1
+        self.folded_messages_total += len(messages)
+        self.folded_tokens_total += folded_tokens
+        return pending_tokens - folded_tokens >= settings.SUMMARY_TRIGGER_TOKENS
+
+    async def _load_chunk(self, db, pending) -> List[Tuple[str, str, int, datetime]]:
+        """Oldest unsummarized messages up to SUMMARY_CHUNK_TOKENS (at least
+        one), stopping before the first partial message
+
+        A checkpointed response that is still streaming is completed in place
+        later with its original created_at; folding it now would move the
+        watermark past it and its final text would never be summarized.
+        """
+        tokenizer = get_tokenizer()
+        messages: List[Tuple[str, str, int, datetime]] = []
+        total = 0
+
+        result = await db.stream(
+            select(Message.role, Message.content, Message.token_count, Message.created_at,
+                   Message.message_metadata)
+            .where(pending)
+            .order_by(Message.created_at)
+            .execution_options(yield_per=settings.CONTEXT_BATCH_SIZE)
+        )
+        try:
+            async for role, content, token_count, created_at, metadata in result:
+                if metadata and metadata.get("partial"):
+                    break
+                tokens = token_count if token_count is not None else tokenizer.count(content)
+                if messages and total + tokens > settings.SUMMARY_CHUNK_TOKENS:
+                    break
+                total += tokens
+                messages.append((role.value if hasattr(role, "value") else role, content, tokens, created_at))
+        finally:
+            await result.close()
+        return messages
+
+    async def _wait_for_capacity(self, model_name: str):
+        if self.ai_service.has_capacity(model_name, settings.SUMMARY_MAX_LOAD):
+            return
+        self.deferred_total += 1
+        while not self.ai_service.has_capacity(model_name, settings.SUMMARY_MAX_LOAD):
+            await asyncio.sleep(settings.SUMMARY_IDLE_POLL)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queued),
+            "summarized_total": self.summarized_total,
+            "folded_messages_total": self.folded_messages_total,
+            "folded_tokens_total": self.folded_tokens_total,
+            "deferred_total": self.deferred_total,
+            "failed_total": self.failed_total
+        }
+
+
+summarizer = ConversationSummarizer()
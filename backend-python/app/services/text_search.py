@@ -0,0 +1,237 @@
+"""
+Full-text search over messages and conversation titles (SQLite FTS5)
+"""
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+WORD_RE = re.compile(r"\w+")
+
+# unicode61 only strips diacritics from Latin letters, so Cyrillic ё is
+# folded to е on both sides (indexed text and queries)
+def fold_sql(expression: str) -> str:
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def fold(value: str) -> str:
+    return value.replace("ё", "е").replace("Ё", "Е")
+
+
+# One row per message and per conversation, identified by (kind, ref) with
+# ref the message or conversation id; "owner" holds the user id so a search
+# is scoped to one user inside the full-text match itself
+SEARCH_TABLE = """
+CREATE VIRTUAL TABLE search_fts USING fts5(
+    title, content, owner,
+    kind UNINDEXED, ref UNINDEXED, conversation_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+# Maps (kind, ref) to the FTS row so triggers update and delete by index.
+# The source tables have string keys and their rowids may change on VACUUM,
+# so nothing is keyed on them
+SEARCH_REFS_TABLE = """
+CREATE TABLE IF NOT EXISTS search_refs (
+    kind TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    fts_rowid INTEGER NOT NULL,
+    PRIMARY KEY (kind, ref)
+) WITHOUT ROWID
+"""
+
+# Titles weigh double, the owner column not at all
+SEARCH_RANK = "INSERT INTO search_fts(search_fts, rank) VALUES ('rank', 'bm25(2.0, 1.0, 0.0)')"
+
+
+def fts_rowid_sql(kind: str, ref: str) -> str:
+    return f"(SELECT fts_rowid FROM search_refs WHERE kind = '{kind}' AND ref = {ref})"
+
+
+SEARCH_TRIGGER_NAMES = [
+    "messages_search_insert", "messages_search_update", "messages_search_delete",
+    "conversations_search_insert", "conversations_search_update", "conversations_search_delete"
+]
+
+SEARCH_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_search_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO search_fts(title, content, owner, kind, ref, conversation_id)
+        SELECT '', {fold_sql("NEW.content")}, user_id, 'message', NEW.id, NEW.conversation_id
+        FROM conversations WHERE id = NEW.conversation_id;
+        INSERT INTO search_refs(kind, ref, fts_rowid)
+        SELECT 'message', NEW.id, last_insert_rowid() WHERE changes() > 0;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_search_update AFTER UPDATE OF content ON messages BEGIN
+        UPDATE search_fts SET content = {fold_sql("NEW.content")}
+        WHERE rowid = {fts_rowid_sql("message", "NEW.id")};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_search_delete AFTER DELETE ON messages BEGIN
+        DELETE FROM search_fts WHERE rowid = {fts_rowid_sql("message", "OLD.id")};
+        DELETE FROM search_refs WHERE kind = 'message' AND ref = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS conversations_search_insert AFTER INSERT ON conversations BEGIN
+        INSERT INTO search_fts(title, content, owner, kind, ref, conversation_id)
+        VALUES ({fold_sql("NEW.title")}, '', NEW.user_id, 'conversation', NEW.id, NEW.id);
+        INSERT INTO search_refs(kind, ref, fts_rowid) VALUES ('conversation', NEW.id, last_insert_rowid());
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS conversations_search_update AFTER UPDATE OF title ON conversations BEGIN
+        UPDATE search_fts SET title = {fold_sql("NEW.title")}
+        WHERE rowid = {fts_rowid_sql("conversation", "NEW.id")};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS conversations_search_delete AFTER DELETE ON conversations BEGIN
+        DELETE FROM search_fts WHERE rowid = {fts_rowid_sql("conversation", "OLD.id")};
+        DELETE FROM search_refs WHERE kind = 'conversation' AND ref = OLD.id;
+    END
+    """
+]
+
+SEARCH_QUERY = """
+SELECT f.rowid, f.kind, f.ref, f.conversation_id, c.title, m.role, m.created_at,
+       snippet(search_fts, -1, '<mark>', '</mark>', '…', 16) AS snippet, f.rank
+FROM search_fts f
+JOIN conversations c ON c.id = f.conversation_id
+LEFT JOIN messages m ON f.kind = 'message' AND m.id = f.ref
+WHERE search_fts MATCH :match {after}
+ORDER BY f.rank, f.rowid
+LIMIT :limit
+"""
+
+SEARCH_AFTER = "AND (f.rank > :rank OR (f.rank = :rank AND f.rowid > :rowid))"
+
+
+class SearchCursorError(ValueError):
+    """Raised for a malformed pagination cursor"""
+
+
+def create_search_index(connection) -> bool:
+    """Create the FTS table and its triggers (SQLite only)
+
+    A new table is filled from the existing rows, as is an index from
+    before search_refs (whose rows were keyed on source rowids). Returns
+    False when SQLite has no FTS5 support.
+    """
+    if connection.dialect.name != "sqlite":
+        return False
+
+    def table_exists(name: str) -> bool:
+        return connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).first() is not None
+
+    rebuild = False
+    if not table_exists("search_fts"):
+        try:
+            connection.exec_driver_sql(SEARCH_TABLE)
+        except OperationalError as e:
+            print(f"⚠️ Full-text search unavailable: {e}")
+            return False
+        connection.exec_driver_sql(SEARCH_RANK)
+        rebuild = True
+    if not table_exists("search_refs"):
+        connection.exec_driver_sql(SEARCH_REFS_TABLE)
+        for name in SEARCH_TRIGGER_NAMES:
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        rebuild = True
+    if rebuild:
+        rebuild_search_index(connection)
+
+    for trigger in SEARCH_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+    return True
+
+
+def rebuild_search_index(connection):
+    """Re-index every message and conversation"""
+    connection.exec_driver_sql("DELETE FROM search_fts")
+    connection.exec_driver_sql("DELETE FROM search_refs")
+    connection.exec_driver_sql(f"""
+        INSERT INTO search_fts(title, content, owner, kind, ref, conversation_id)
+        SELECT {fold_sql("title")}, '', user_id, 'conversation', id, id FROM conversations
+    """)
+    connection.exec_driver_sql(f"""
+        INSERT INTO search_fts(title, content, owner, kind, ref, conversation_id)
+        SELECT '', {fold_sql("m.content")}, c.user_id, 'message', m.id, m.conversation_id
+        FROM messages m JOIN conversations c ON c.id = m.conversation_id
+    """)
+    connection.exec_driver_sql("INSERT INTO search_refs(kind, ref, fts_rowid) SELECT kind, ref, rowid FROM search_fts")
+
+
+def match_expression(query: str, user_id: str) -> Optional[str]:
+    """FTS5 query for the user's words (all required, the last one as a prefix)"""
+    terms = WORD_RE.findall(fold(query))
+    if not terms:
+        return None
+    phrases = [f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*']
+    owner = user_id.replace('"', '""')
+    return f'owner : "{owner}" AND {{title content}} : ({" ".join(phrases)})'
+
+
+def encode_cursor(rank: float, rowid: int) -> str:
+    return f"{rank!r}:{rowid}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        rank, rowid = cursor.split(":")
+        return float(rank), int(rowid)
+    except ValueError:
+        raise SearchCursorError(f"Invalid cursor {cursor!r}")
+
+
+async def search_text(
+    db: AsyncSession,
+    user_id: str,
+    query: str,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """Rank the user's messages and conversation titles by bm25
+
+    Pages are keyset-paginated on (rank, rowid): pass the returned
+    ``next_cursor`` to continue. Ranks shift slightly as the corpus grows,
+    so a page boundary is approximate under concurrent writes.
+    """
+    match = match_expression(query, user_id)
+    if match is None:
+        return {"results": [], "next_cursor": None}
+
+    params: Dict[str, Any] = {"match": match, "limit": limit + 1}
+    after = ""
+    if cursor:
+        params["rank"], params["rowid"] = decode_cursor(cursor)
+        after = SEARCH_AFTER
+
+    rows = (await db.execute(text(SEARCH_QUERY.format(after=after)), params)).all()
+
+    results: List[Dict[str, Any]] = []
+    for rowid, kind, ref, conversation_id, title, role, created_at, snippet, rank in rows[:limit]:
+        results.append({
+            "type": kind,
+            "id": ref,
+            "conversation_id": conversation_id,
+            "conversation_title": title,
+            "role": role.lower() if role else None,
+            "created_at": created_at,
+            "snippet": snippet,
+            "score": round(-rank, 6)
+        })
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.rank, last.rowid)
+    return {"results": results, "next_cursor": next_cursor}
@@ -0,0 +1,309 @@
+"""
+Tokenizer service for token counting and cost accounting
+
+Provides a pure-Python byte-level BPE tokenizer loaded from a local vocab
+file, a character heuristic fallback, batch counting and incremental
+counting for streamed responses.
+"""
+import heapq
+import json
+import re
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+DEFAULT_VOCAB_PATH = Path(__file__).resolve().parent.parent / "data" / "tokenizer" / "hoyo_bpe.json"
+
+# Pre-tokenization: letters with an optional leading space, digit groups,
+# punctuation runs and whitespace. Works on Cyrillic as well as Latin text.
+PRETOKENIZE_PATTERN = r" ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+(?!\S)|\s+"
+
+
+class Tokenizer(ABC):
+    """Abstract base class for tokenizers"""
+
+    name = "base"
+
+    @abstractmethod
+    def encode(self, text: str) -> List[int]:
+        """Encode text into token ids"""
+        pass
+
+    def count(self, text: str) -> int:
+        """Count tokens in text"""
+        return len(self.encode(text))
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Count tokens for a batch of texts"""
+        return [self.count(text) for text in texts]
+
+    def counter(self) -> "StreamTokenCounter":
+        """Create an incremental counter for streamed text"""
+        return StreamTokenCounter(self)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get tokenizer statistics"""
+        return {"name": self.name}
+
+
+class HeuristicTokenizer(Tokenizer):
+    """Character-based estimate (about four characters per token)"""
+
+    name = "heuristic"
+
+    def encode(self, text: str) -> List[int]:
+        return list(range(self.count(text)))
+
+    def count(self, text: str) -> int:
+        return len(text) // 4
+
+
+class BPETokenizer(Tokenizer):
+    """Byte-level BPE tokenizer.
+
+    Token ids 0-255 are raw bytes; every merge ``(a, b)`` in the vocab file
+    adds id ``256 + rank``. Encodings of pre-tokenized pieces are kept in an
+    LRU cache, so repeated words cost a single dictionary lookup.
+    """
+
+    name = "bpe"
+
+    def __init__(self, merges: List[Tuple[int, int]], pattern: str = PRETOKENIZE_PATTERN, cache_size: int = 65536):
+        self.merges = [tuple(pair) for pair in merges]
+        self.ranks: Dict[Tuple[int, int], int] = {pair: rank for rank, pair in enumerate(self.merges)}
+        self.pattern = re.compile(pattern)
+        self._encode_piece = lru_cache(maxsize=cache_size)(self._bpe)
+
+    @classmethod
+    def load(cls, path: Path, cache_size: int = 65536) -> "BPETokenizer":
+        """Load a tokenizer from a vocab file"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["merges"], data.get("pattern", PRETOKENIZE_PATTERN), cache_size)
+
+    def save(self, path: Path):
+        """Save the vocab file"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": 1, "type": "byte-bpe", "pattern": self.pattern.pattern, "merges": self.merges},
+                f,
+                separators=(",", ":")
+            )
+
+    @property
+    def vocab_size(self) -> int:
+        return 256 + len(self.merges)
+
+    def _bpe(self, piece: str) -> Tuple[int, ...]:
+        ids = list(piece.encode("utf-8"))
+        ranks = self.ranks
+
+        while len(ids) > 1:
+            # Find the lowest-rank adjacent pair
+            best_rank = None
+            for pair in zip(ids, ids[1:]):
+                rank = ranks.get(pair)
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank = rank
+            if best_rank is None:
+                break
+
+            first, second = self.merges[best_rank]
+            new_id = 256 + best_rank
+            merged = []
+            i = 0
+            while i < len(ids):
+                if i < len(ids) - 1 and ids[i] == first and ids[i + 1] == second:
+                    merged.append(new_id)
+                    i += 2
+                else:
+                    merged.append(ids[i])
+                    i += 1
+            ids = merged
+
+        return tuple(ids)
+
+    def pieces(self, text: str) -> List[str]:
+        """Split text into pre-tokenized pieces"""
+        return self.pattern.findall(text)
+
+    def encode(self, text: str) -> List[int]:
+        ids: List[int] = []
+        for piece in self.pattern.findall(text):
+            ids.extend(self._encode_piece(piece))
+        return ids
+
+    def count(self, text: str) -> int:
+        encode_piece = self._encode_piece
+        return sum(len(encode_piece(piece)) for piece in self.pattern.findall(text))
+
+    def decode(self, ids: Iterable[int]) -> str:
+        """Decode token ids back into text"""
+        vocab = self._byte_vocab()
+        return b"".join(vocab[i] for i in ids).decode("utf-8", errors="replace")
+
+    def _byte_vocab(self) -> List[bytes]:
+        vocab = [bytes([i]) for i in range(256)]
+        for first, second in self.merges:
+            vocab.append(vocab[first] + vocab[second])
+        return vocab
+
+    def stats(self) -> Dict[str, Any]:
+        info = self._encode_piece.cache_info()
+        return {
+            "name": self.name,
+            "vocab_size": self.vocab_size,
+            "cache_entries": info.currsize,
+            "cache_hits_total": info.hits,
+            "cache_misses_total": info.misses
+        }
+
+    @classmethod
+    def train(cls, texts: Iterable[str], vocab_size: int, pattern: str = PRETOKENIZE_PATTERN) -> "BPETokenizer":
+        """Train merges on a corpus (word-frequency BPE with incremental pair counts)"""
+        regex = re.compile(pattern)
+        word_counts: Counter = Counter()
+        for text in texts:
+            word_counts.update(regex.findall(text))
+
+        words = [list(word.encode("utf-8")) for word in word_counts]
+        freqs = list(word_counts.values())
+
+        pair_counts: Counter = Counter()
+        pair_words: Dict[Tuple[int, int], set] = defaultdict(set)
+        for index, ids in enumerate(words):
+            for pair in zip(ids, ids[1:]):
+                pair_counts[pair] += freqs[index]
+                pair_words[pair].add(index)
+
+        # Max-heap of (count, pair) with lazy invalidation of stale entries
+        heap = [(-count, pair) for pair, count in pair_counts.items()]
+        heapq.heapify(heap)
+
+        merges: List[Tuple[int, int]] = []
+        while 256 + len(merges) < vocab_size and heap:
+            negative_count, best = heapq.heappop(heap)
+            if pair_counts.get(best, 0) != -negative_count:
+                continue
+            if -negative_count < 2:
+                break
+            new_id = 256 + len(merges)
+            merges.append(best)
+            touched = set()
+
+            for index in list(pair_words.pop(best, ())):
+                ids = words[index]
+                freq = freqs[index]
+                for pair in zip(ids, ids[1:]):
+                    pair_counts[pair] -= freq
+                    touched.add(pair)
+
+                merged = []
+                i = 0
+                while i < len(ids):
+                    if i < len(ids) - 1 and (ids[i], ids[i + 1]) == best:
+                        merged.append(new_id)
+                        i += 2
+                    else:
+                        merged.append(ids[i])
+                        i += 1
+                words[index] = merged
+
+                for pair in zip(merged, merged[1:]):
+                    pair_counts[pair] += freq
+                    pair_words[pair].add(index)
+                    touched.add(pair)
+
+            for pair in touched:
+                count = pair_counts.get(pair, 0)
+                if count > 0:
+                    heapq.heappush(heap, (-count, pair))
+                else:
+                    pair_counts.pop(pair, None)
+
+        return cls(merges, pattern)
+
+
+class StreamTokenCounter:
+    """Incremental token counter for streamed chunks.
+
+    BPE never merges across pre-tokenized pieces, so every piece except the
+    trailing (possibly incomplete) one can be counted as soon as it arrives.
+    """
+
+    def __init__(self, tokenizer: Tokenizer):
+        self.tokenizer = tokenizer
+        self._counted = 0
+        self._tail = ""
+        self._pattern = getattr(tokenizer, "pattern", None)
+
+    def feed(self, chunk: str) -> int:
+        """Add a chunk and return the running token count"""
+        if self._pattern is None:
+            self._tail += chunk
+            return self.total
+
+        text = self._tail + chunk
+        pieces = self._pattern.findall(text)
+        if len(pieces) > 1:
+            complete = pieces[:-1]
+            self._counted += sum(self.tokenizer.count(piece) for piece in complete)
+            self._tail = pieces[-1]
+        else:
+            self._tail = text
+        return self.total
+
+    @property
+    def total(self) -> int:
+        """Tokens counted so far, including the pending tail"""
+        return self._counted + (self.tokenizer.count(self._tail) if self._tail else 0)
+
+
+TOKENIZERS = {
+    "bpe": lambda: BPETokenizer.load(
+        Path(settings.TOKENIZER_VOCAB_PATH) if settings.TOKENIZER_VOCAB_PATH else DEFAULT_VOCAB_PATH,
+        settings.TOKENIZER_CACHE_SIZE
+    ),
+    "heuristic": HeuristicTokenizer,
+}
+
+_tokenizer: Optional[Tokenizer] = None
+
+
+def get_tokenizer() -> Tokenizer:
+    """Get the configured tokenizer (loaded once per process)"""
+    global _tokenizer
+    if _tokenizer is None:
+        factory = TOKENIZERS.get(settings.TOKENIZER, HeuristicTokenizer)
+        try:
+            _tokenizer = factory()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Failed to load tokenizer {settings.TOKENIZER}: {e}, using heuristic")
+            _tokenizer = HeuristicTokenizer()
+    return _tokenizer
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    """Count tokens for a batch of texts with the configured tokenizer"""
+    return get_tokenizer().count_tokens(texts)
+
+
+if __name__ == "__main__":
+    # Train a vocab file: python -m app.services.tokenizer corpus.txt [...] -o vocab.json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train a byte-level BPE vocab")
+    parser.add_argument("corpus", nargs="+", help="UTF-8 text files")
+    parser.add_argument("-o", "--output", default=str(DEFAULT_VOCAB_PATH))
+    parser.add_argument("--vocab-size", type=int, default=16384)
+    args = parser.parse_args()
+
+    corpus = [Path(path).read_text(encoding="utf-8") for path in args.corpus]
+    tokenizer = BPETokenizer.train(corpus, args.vocab_size)
+    tokenizer.save(Path(args.output))
+    print(f"✅ Saved {tokenizer.vocab_size} tokens to {args.output}")
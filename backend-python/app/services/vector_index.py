@@ -0,0 +1,484 @@
+"""
+In-process vector index for semantic search over message history
+"""
+import asyncio
+import json
+import os
+import re
+import zlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select, tuple_
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import register_collector
+from app.models.database import Conversation, Message
+
+WORD_RE = re.compile(r"\w+")
+STEM_CHARS = 5
+INITIAL_CAPACITY = 1024
+
+# (user_id, message_id, conversation_id, content)
+IndexItem = Tuple[str, str, str, str]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so a dot product is the cosine similarity"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+class Embedder(ABC):
+    """Turns texts into L2-normalized float32 vectors of ``dim`` dimensions"""
+
+    name = ""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    @property
+    def signature(self) -> str:
+        """Identifies the vector space; vectors from another signature are not comparable"""
+        return f"{self.name}:{self.dim}"
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        pass
+
+
+class HashingEmbedder(Embedder):
+    """Deterministic local embedder: signed feature hashing of words, word stems
+    (the first STEM_CHARS characters, so inflected forms meet) and word bigrams.
+
+    Needs no model or network, so it is the default and gives stable vectors
+    in tests; it matches shared vocabulary rather than meaning.
+    """
+
+    name = "hashing"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed_sync, texts)
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = WORD_RE.findall(text.lower())
+            stems = [word[:STEM_CHARS] + "~" for word in words if len(word) > STEM_CHARS]
+            for feature in words + stems + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += -1.0 if h >> 31 else 1.0
+        return normalize(vectors)
+
+
+class OpenAIEmbedder(Embedder):
+    """OpenAI embeddings API over the shared provider client"""
+
+    name = "openai"
+
+    def __init__(self, client, model: str, dim: int):
+        super().__init__(dim)
+        self.client = client
+        self.model = model
+
+    @property
+    def signature(self) -> str:
+        return f"{self.name}:{self.model}:{self.dim}"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        from app.services.providers import UpstreamError
+
+        response = await self.client.post(
+            "/embeddings",
+            json={"model": self.model, "input": texts, "dimensions": self.dim}
+        )
+        if response.status_code >= 400:
+            raise UpstreamError("openai", response.status_code, response.text[:500])
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        return normalize(np.array([item["embedding"] for item in data], dtype=np.float32))
+
+
+def create_embedder(name: str, client_pool=None) -> Embedder:
+    """Create the configured embedder (VECTOR_EMBEDDER)"""
+    if name == "openai":
+        return OpenAIEmbedder(client_pool.get("openai"), settings.OPENAI_EMBEDDING_MODEL, settings.VECTOR_DIM)
+    return HashingEmbedder(settings.VECTOR_DIM)
+
+
+def top_k(
+    vectors: np.ndarray,
+    mask: np.ndarray,
+    message_ids: List[str],
+    query: np.ndarray,
+    k: int
+) -> List[Tuple[str, float]]:
+    """Best ``k`` (message_id, cosine) among the rows selected by ``mask``, positive scores only"""
+    scores = np.asarray(vectors @ query)
+    scores[~mask] = -np.inf
+    k = min(k, int(mask.sum()))
+    if k <= 0:
+        return []
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best])]
+    return [(message_ids[i], float(scores[i])) for i in best if scores[i] > 0]
+
+
+class VectorPartition:
+    """One user's vectors: a memory-mapped float32 matrix plus a JSONL row log.
+
+    Rows are appended (vectors first, then the log line, so the log never
+    names a row without a vector; a torn last line is dropped on load).
+    Deleting a conversation only masks its rows; ``compact`` rewrites the
+    partition without them as a new generation of files and ``switch``
+    moves to it by atomically replacing meta.json.
+    """
+
+    def __init__(self, path: Path, signature: str, dim: int):
+        self.path = path
+        self.signature = signature
+        self.dim = dim
+        self.lock = asyncio.Lock()
+
+        self.generation = 0
+        self.count = 0
+        self.vectors: Optional[np.memmap] = None
+        self.message_ids: List[str] = []
+        self.indexed: Set[str] = set()
+        self.codes = np.zeros(0, dtype=np.int32)  # conversation code per row
+        self.alive = np.zeros(0, dtype=bool)
+        self.conversation_codes: Dict[str, int] = {}
+        self.deleted: Set[str] = set()
+        self._load()
+
+    def _files(self, generation: int) -> Tuple[Path, Path]:
+        return self.path / f"vectors.{generation}.f32", self.path / f"rows.{generation}.jsonl"
+
+    def _load(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta_path = self.path / "meta.json"
+        meta = json.loads(meta_path.read_text()) if meta_path.exists() else None
+        if meta is None or meta.get("signature") != self.signature:
+            # New partition, or vectors of another embedder: start over, backfill re-indexes
+            for file in self.path.iterdir():
+                file.unlink()
+            meta = {"signature": self.signature, "generation": 0, "deleted": []}
+            self._write_meta(meta)
+        self.generation = meta["generation"]
+        self.deleted = set(meta["deleted"])
+
+        vectors_path, rows_path = self._files(self.generation)
+        rows: List[Dict[str, str]] = []
+        if rows_path.exists():
+            data = rows_path.read_bytes()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                with open(rows_path, "r+b") as f:
+                    f.truncate(end)
+            rows = [json.loads(line) for line in data[:end].decode("utf-8").splitlines()]
+
+        self._open(vectors_path, self._capacity(len(rows)))
+        self.codes = np.zeros(len(self.vectors), dtype=np.int32)
+        self.alive = np.zeros(len(self.vectors), dtype=bool)
+        self._add_rows([row["m"] for row in rows], [row["c"] for row in rows])
+
+    def _write_meta(self, meta: Dict[str, Any]):
+        tmp_path = self.path / "meta.json.tmp"
+        tmp_path.write_text(json.dumps(meta))
+        os.replace(tmp_path, self.path / "meta.json")
+
+    def _capacity(self, rows: int) -> int:
+        capacity = INITIAL_CAPACITY
+        while capacity < rows:
+            capacity *= 2
+        return capacity
+
+    def _open(self, path: Path, capacity: int):
+        size = capacity * self.dim * 4
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self.vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _code(self, conversation_id: str) -> int:
+        code = self.conversation_codes.get(conversation_id)
+        if code is None:
+            code = self.conversation_codes[conversation_id] = len(self.conversation_codes)
+        return code
+
+    def _add_rows(self, message_ids: List[str], conversation_ids: List[str]):
+        start = self.count
+        for offset, (message_id, conversation_id) in enumerate(zip(message_ids, conversation_ids)):
+            self.codes[start + offset] = self._code(conversation_id)
+            self.alive[start + offset] = conversation_id not in self.deleted
+        self.message_ids.extend(message_ids)
+        self.indexed.update(message_ids)
+        self.count += len(message_ids)
+
+    def append(self, message_ids: List[str], conversation_ids: List[str], vectors: np.ndarray):
+        """Append rows; arrays are replaced, not resized, so search snapshots stay valid"""
+        end = self.count + len(message_ids)
+        if end > len(self.vectors):
+            capacity = self._capacity(end)
+            self._open(self._files(self.generation)[0], capacity)
+            self.codes = np.concatenate([self.codes, np.zeros(capacity - len(self.codes), dtype=np.int32)])
+            self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+
+        self.vectors[self.count:end] = vectors
+        self.vectors.flush()
+        with open(self._files(self.generation)[1], "a", encoding="utf-8") as f:
+            f.write("".join(
+                json.dumps({"m": message_id, "c": conversation_id}) + "\n"
+                for message_id, conversation_id in zip(message_ids, conversation_ids)
+            ))
+        self._add_rows(message_ids, conversation_ids)
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """Mask a conversation's rows; returns False if it has none
+
+        The deletion is recorded either way, so rows still queued or being
+        backfilled for the conversation are added already masked.
+        """
+        if conversation_id in self.deleted:
+            return False
+        self.deleted.add(conversation_id)
+        self._write_meta({"signature": self.signature, "generation": self.generation, "deleted": sorted(self.deleted)})
+        code = self.conversation_codes.get(conversation_id)
+        if code is None:
+            return False
+        self.alive[:self.count][self.codes[:self.count] == code] = False
+        return True
+
+    @property
+    def deleted_rows(self) -> int:
+        return self.count - int(self.alive[:self.count].sum())
+
+    def compact(self) -> Tuple[int, np.memmap, List[str], List[str]]:
+        """Write the partition without deleted rows as the next generation (worker thread, under ``lock``)"""
+        keep = np.flatnonzero(self.alive[:self.count])
+        generation = self.generation + 1
+        vectors_path, rows_path = self._files(generation)
+
+        vectors = np.memmap(vectors_path, dtype=np.float32, mode="w+", shape=(self._capacity(len(keep)), self.dim))
+        vectors[:len(keep)] = self.vectors[keep]
+        vectors.flush()
+        reverse_codes = {code: conversation_id for conversation_id, code in self.conversation_codes.items()}
+        message_ids = [self.message_ids[i] for i in keep]
+        conversation_ids = [reverse_codes[int(self.codes[i])] for i in keep]
+        with open(rows_path, "w", encoding="utf-8") as f:
+            f.write("".join(
+                json.dumps({"m": message_id, "c": conversation_id}) + "\n"
+                for message_id, conversation_id in zip(message_ids, conversation_ids)
+            ))
+        return generation, vectors, message_ids, conversation_ids
+
+    def switch(self, compacted: Tuple[int, np.memmap, List[str], List[str]]):
+        """Make a compacted generation current (event loop, under ``lock``)"""
+        generation, vectors, message_ids, conversation_ids = compacted
+        # Until meta.json names the new generation, the old one stays current on disk
+        self._write_meta({"signature": self.signature, "generation": generation, "deleted": sorted(self.deleted)})
+        old_files = self._files(self.generation)
+
+        self.generation = generation
+        self.vectors = vectors
+        self.count = 0
+        self.message_ids = []
+        self.indexed = set()
+        self.codes = np.zeros(len(vectors), dtype=np.int32)
+        self.alive = np.zeros(len(vectors), dtype=bool)
+        self._add_rows(message_ids, conversation_ids)
+
+        for file in old_files:
+            file.unlink(missing_ok=True)
+
+    def snapshot(self, conversation_id: Optional[str] = None) -> Optional[Tuple[np.ndarray, np.ndarray, List[str]]]:
+        """Consistent (vectors, mask, message_ids) view for scoring outside the event loop"""
+        n = self.count
+        mask = self.alive[:n].copy()
+        if conversation_id is not None:
+            code = self.conversation_codes.get(conversation_id)
+            if code is None:
+                return None
+            mask &= self.codes[:n] == code
+        if n == 0 or not mask.any():
+            return None
+        return self.vectors[:n], mask, self.message_ids
+
+
+class VectorIndex:
+    """Semantic search over each user's messages without an external vector DB.
+
+    New messages are queued and embedded in batches by a background worker
+    (a backfill indexes history the index has not seen). Vectors live in
+    per-user partitions on disk, memory-mapped, and a query is scored
+    against a whole partition with one matrix-vector product.
+    """
+
+    def __init__(self):
+        self.embedder: Optional[Embedder] = None
+        self.partitions: Dict[str, VectorPartition] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.indexed_total = 0
+        self.failed_total = 0
+        self.searches_total = 0
+        self.compactions_total = 0
+
+    async def start(self, ai_service):
+        """Start the indexing worker and backfill"""
+        if not settings.VECTOR_SEARCH_ENABLED:
+            return
+        self.embedder = create_embedder(settings.VECTOR_EMBEDDER, ai_service.client_pool)
+        settings.VECTOR_INDEX_PATH.mkdir(parents=True, exist_ok=True)
+        self._queue = asyncio.Queue()
+        self._spawn(self._run())
+        self._spawn(self._backfill())
+        register_collector("vector_index", self.stats)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def add(self, user_id: str, message: Message):
+        """Queue a saved message for indexing"""
+        if self._queue is None or not message.content:
+            return
+        self._queue.put_nowait((user_id, message.id, message.conversation_id, message.content))
+
+    async def remove_conversation(self, user_id: str, conversation_id: str):
+        """Drop a deleted conversation from search, compacting once enough is deleted"""
+        if self.embedder is None:
+            return
+        partition = self._partition(user_id)
+        async with partition.lock:
+            if not partition.delete_conversation(conversation_id):
+                return
+        if partition.deleted_rows >= partition.count * settings.VECTOR_COMPACT_RATIO:
+            self._spawn(self._compact(partition))
+
+    async def search(
+        self,
+        user_id: str,
+        query: str,
+        k: int = 10,
+        conversation_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Top ``k`` (message_id, cosine similarity) for the user's messages"""
+        if self.embedder is None:
+            return []
+        self.searches_total += 1
+        snapshot = self._partition(user_id).snapshot(conversation_id)
+        if snapshot is None:
+            return []
+        vector = (await self.embedder.embed([query[:settings.VECTOR_MAX_CHARS]]))[0]
+        return await asyncio.to_thread(top_k, *snapshot, vector, k)
+
+    async def shutdown(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _partition(self, user_id: str) -> VectorPartition:
+        partition = self.partitions.get(user_id)
+        if partition is None:
+            partition = VectorPartition(
+                settings.VECTOR_INDEX_PATH / user_id, self.embedder.signature, self.embedder.dim
+            )
+            self.partitions[user_id] = partition
+        return partition
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() < settings.VECTOR_BATCH_SIZE - 1:
+                await asyncio.sleep(settings.VECTOR_BATCH_WAIT)
+            while len(batch) < settings.VECTOR_BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                await self._index(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Picked up again by the backfill on the next start
+                self.failed_total += len(batch)
+                print(f"❌ Failed to index {len(batch)} message(s): {e}")
+
+    async def _index(self, items: List[IndexItem]) -> int:
+        """Embed and append items not indexed yet; returns how many were added"""
+        items = [item for item in items if item[1] not in self._partition(item[0]).indexed]
+        if not items:
+            return 0
+        vectors = await self.embedder.embed([content[:settings.VECTOR_MAX_CHARS] for _, _, _, content in items])
+
+        by_user: Dict[str, List[int]] = {}
+        for row, (user_id, _, _, _) in enumerate(items):
+            by_user.setdefault(user_id, []).append(row)
+
+        added = 0
+        for user_id, rows in by_user.items():
+            partition = self._partition(user_id)
+            async with partition.lock:
+                rows = [row for row in rows if items[row][1] not in partition.indexed]
+                if rows:
+                    partition.append(
+                        [items[row][1] for row in rows],
+                        [items[row][2] for row in rows],
+                        vectors[rows]
+                    )
+            added += len(rows)
+        self.indexed_total += added
+        return added
+
+    async def _backfill(self):
+        """Index messages saved while the index was off or not built yet"""
+        last = None
+        added = 0
+        while True:
+            # Short keyset-paged reads, so the scan never holds the database
+            async with AsyncSessionLocal() as db:
+                query = (
+                    select(Message.created_at, Message.id, Conversation.user_id, Message.conversation_id,
+                           Message.content, Message.message_metadata)
+                    .join(Conversation, Message.conversation_id == Conversation.id)
+                    .order_by(Message.created_at, Message.id)
+                    .limit(settings.VECTOR_BATCH_SIZE)
+                )
+                if last is not None:
+                    query = query.where(tuple_(Message.created_at, Message.id) > last)
+                rows = (await db.execute(query)).all()
+            if not rows:
+                break
+            last = (rows[-1][0], rows[-1][1])
+            # A checkpoint of a response still streaming is indexed by add()
+            # once it is saved; indexing it now would keep the partial text
+            added += await self._index([(user_id, message_id, conversation_id, content or "")
+                                        for _, message_id, user_id, conversation_id, content, metadata in rows
+                                        if not (metadata and metadata.get("partial"))])
+        if added:
+            print(f"🔎 Indexed {added} message(s) for search")
+
+    async def _compact(self, partition: VectorPartition):
+        async with partition.lock:
+            partition.switch(await asyncio.to_thread(partition.compact))
+        self.compactions_total += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "partitions": len(self.partitions),
+            "vectors": sum(partition.count for partition in self.partitions.values()),
+            "deleted_vectors": sum(partition.deleted_rows for partition in self.partitions.values()),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "indexed_total": self.indexed_total,
+            "failed_total": self.failed_total,
+            "searches_total": self.searches_total,
+            "compactions_total": self.compactions_total
+        }
+
+
+vector_index = VectorIndex()
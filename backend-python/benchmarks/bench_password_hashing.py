@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Event-loop latency under concurrent logins: inline hashing against the
+hashing pool
+
+A ticker task sleeps TICK_MS in a loop and records how late each wake-up
+is while a burst of concurrent password verifications runs, first inline
+on the event loop (how login used to verify) and then through
+app.services.password_hasher with thread and process workers.
+
+Usage:
+    python benchmarks/bench_password_hashing.py --logins 16 --workers 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.password_hasher import PasswordHasher, check_password, hash_password
+
+TICK_MS = 5
+
+
+async def ticker(lags: List[float], stop: asyncio.Event):
+    interval = TICK_MS / 1000
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+
+async def run(mode: str, logins: int, workers: int, hashed: str) -> Dict[str, float]:
+    hasher = None
+    if mode == "inline":
+        async def verify():
+            return check_password("hoyo123", hashed)
+    else:
+        hasher = PasswordHasher(executor=mode, workers=workers, max_queue=logins)
+        hasher.start()
+        verify = lambda: hasher.verify("hoyo123", hashed)
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[verify() for _ in range(logins)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    assert all(results)
+
+    result = {
+        "seconds": round(elapsed, 3),
+        "lag_p50_ms": round(statistics.median(lags) * 1000, 2),
+        "lag_p99_ms": round(percentile(lags, 0.99) * 1000, 2),
+        "lag_max_ms": round(max(lags) * 1000, 2),
+        "ticks": len(lags),
+    }
+    if hasher is not None:
+        result["queue_wait_max_ms"] = round(hasher.stats()["queue_wait_max_seconds"] * 1000, 2)
+        hasher.shutdown()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Password hashing event-loop latency benchmark")
+    parser.add_argument("--logins", type=int, default=16, help="Concurrent password verifications")
+    parser.add_argument("--workers", type=int, default=2, help="Pool size")
+    parser.add_argument("--modes", default="inline,thread,process")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    hashed = hash_password("hoyo123")
+    results = {mode: asyncio.run(run(mode, args.logins, args.workers, hashed)) for mode in args.modes.split(",")}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.logins} concurrent logins, {args.workers} workers, {os.cpu_count()} CPUs, ticker every {TICK_MS} ms")
+    print(f"  {'mode':10}{'total s':>10}{'lag p50 ms':>12}{'lag p99 ms':>12}{'lag max ms':>12}{'ticks':>8}")
+    for mode, r in results.items():
+        print(f"  {mode:10}{r['seconds']:>10}{r['lag_p50_ms']:>12}{r['lag_p99_ms']:>12}{r['lag_max_ms']:>12}{r['ticks']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Fair scheduler simulation: p50/p99 latency per plan under saturation
+
+Drives AIService.process_chat with MockModel on one model whose
+concurrency is deliberately small, with open-loop Poisson arrivals where
+free-tier traffic alone exceeds capacity. Runs once with the plan-aware
+fair scheduler and once with plain FIFO slots for comparison.
+
+Usage:
+    python benchmarks/bench_scheduler.py --duration 20 --slots 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from typing import Dict, List
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.models.database import User, UserPlan
+from app.services.ai_service import AIService
+
+MODEL = "HoYo-Fast"
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+async def simulate(fair: bool, args) -> Dict[str, Dict[str, float]]:
+    settings.SCHEDULER_ENABLED = fair
+    settings.RESPONSE_CACHE_ENABLED = False
+    settings.SINGLE_FLIGHT_ENABLED = False
+    settings.MODEL_MAX_QUEUE_WAIT = args.max_wait
+    settings.HOYO_MODELS[MODEL]["max_concurrency"] = args.slots
+    settings.HOYO_MODELS[MODEL]["rate_limit"] = 1_000_000  # isolate concurrency from RPM limits
+
+    service = AIService()
+    await service.initialize()
+
+    rng = random.Random(args.seed)
+    plans = {
+        "free": (UserPlan.FREE, args.free_rps, args.free_users),
+        "pro": (UserPlan.PRO, args.pro_rps, args.pro_users),
+        "enterprise": (UserPlan.ENTERPRISE, args.enterprise_rps, args.enterprise_users),
+    }
+    users = {
+        name: [User(id=str(uuid.uuid4()), username=f"{name}{i}", email="", hashed_password="", plan=plan)
+               for i in range(count)]
+        for name, (plan, _, count) in plans.items()
+    }
+    latencies: Dict[str, List[float]] = {name: [] for name in plans}
+    rejected: Dict[str, int] = {name: 0 for name in plans}
+    tasks = []
+
+    async def request(plan_name: str, user: User):
+        start = time.perf_counter()
+        result = await service.process_chat(f"{uuid.uuid4()}", model=MODEL, user=user)
+        if "error" in result:
+            rejected[plan_name] += 1
+        else:
+            latencies[plan_name].append(time.perf_counter() - start)
+
+    async def arrivals(plan_name: str, rate: float):
+        deadline = time.perf_counter() + args.duration
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(rng.expovariate(rate))
+            tasks.append(asyncio.create_task(request(plan_name, rng.choice(users[plan_name]))))
+
+    await asyncio.gather(*[arrivals(name, rate) for name, (_, rate, _) in plans.items() if rate > 0])
+    await asyncio.gather(*tasks)
+    await service.cleanup()
+
+    return {
+        name: {
+            "completed": len(values),
+            "rejected": rejected[name],
+            "p50": round(percentile(values, 50), 3),
+            "p95": round(percentile(values, 95), 3),
+            "p99": round(percentile(values, 99), 3),
+        }
+        for name, values in latencies.items()
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Fair scheduler simulation benchmark")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of arrivals")
+    parser.add_argument("--slots", type=int, default=4, help="Model concurrency slots")
+    parser.add_argument("--free-rps", type=float, default=12.0)
+    parser.add_argument("--pro-rps", type=float, default=2.0)
+    parser.add_argument("--enterprise-rps", type=float, default=1.0)
+    parser.add_argument("--free-users", type=int, default=50)
+    parser.add_argument("--pro-users", type=int, default=10)
+    parser.add_argument("--enterprise-users", type=int, default=3)
+    parser.add_argument("--max-wait", type=float, default=120.0, help="Queue wait budget (s)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    capacity = args.slots / 0.5  # MockModel.generate takes 0.5s
+    results = {
+        "capacity_rps": capacity,
+        "offered_rps": args.free_rps + args.pro_rps + args.enterprise_rps,
+        "weights": settings.SCHEDULER_PLAN_WEIGHTS,
+        "fair": await simulate(True, args),
+        "fifo": await simulate(False, args),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Capacity {results['capacity_rps']:.1f} req/s, offered {results['offered_rps']:.1f} req/s, "
+          f"weights {results['weights']}")
+    for mode in ["fair", "fifo"]:
+        print(f"\n{mode.upper()}")
+        print(f"  {'plan':12}{'done':>8}{'429':>8}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}")
+        for plan, r in results[mode].items():
+            print(f"  {plan:12}{r['completed']:>8}{r['rejected']:>8}{r['p50']:>10}{r['p95']:>10}{r['p99']:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
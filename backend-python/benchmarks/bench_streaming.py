@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Streaming frame coalescing: frames, serialization CPU and TTFT
+
+Streams a synthetic model (fixed inter-token latency) through
+AIService.stream_chat and serializes every frame the way the SSE endpoint
+does, once per-chunk and once with time/size coalescing.
+
+Usage:
+    python benchmarks/bench_streaming.py --tokens 2000 --itl 0.002 --window-ms 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import AsyncGenerator, Dict
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.ai_service import AIModel, AIService
+
+MODEL = "HoYo-Fast"
+
+
+class SyntheticModel(AIModel):
+    """Emits one short word per token at a fixed inter-token latency"""
+
+    def __init__(self, config: dict, tokens: int, itl: float):
+        super().__init__(config)
+        self.tokens = tokens
+        self.itl = itl
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        return " ".join(f"w{i}" for i in range(self.tokens))
+
+    async def stream(self, prompt: str, **kwargs) -> AsyncGenerator[str, None]:
+        for i in range(self.tokens):
+            await asyncio.sleep(self.itl)
+            yield f"w{i} "
+
+
+async def run(service: AIService, window_ms: float, max_bytes: int) -> Dict[str, float]:
+    frames = 0
+    serialize_cpu = 0.0
+    ttft = None
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    async for chunk in service.stream_chat(
+        "benchmark", model=MODEL, use_cache=False, coalesce_ms=window_ms, coalesce_bytes=max_bytes
+    ):
+        if "chunk" in chunk and ttft is None:
+            ttft = time.perf_counter() - start
+        t = time.process_time()
+        f"data: {json.dumps({'type': 'chunk', 'data': chunk})}\n\n"
+        serialize_cpu += time.process_time() - t
+        frames += 1
+
+    return {
+        "frames": frames,
+        "ttft_ms": round((ttft or 0.0) * 1000, 2),
+        "total_s": round(time.perf_counter() - start, 3),
+        "cpu_ms": round((time.process_time() - cpu_start) * 1000, 1),
+        "serialize_cpu_ms": round(serialize_cpu * 1000, 2)
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Streaming coalescing benchmark")
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--itl", type=float, default=0.002, help="Inter-token latency (s)")
+    parser.add_argument("--window-ms", type=float, default=30.0, help="Coalescing window")
+    parser.add_argument("--max-bytes", type=int, default=1024, help="Coalescing frame size")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    settings.AI_BACKEND = "mock"
+    settings.RESPONSE_CACHE_ENABLED = False
+    settings.MODEL_RATE_LIMIT_ENABLED = False
+
+    service = AIService()
+    await service.initialize()
+    service.models[MODEL] = SyntheticModel(settings.HOYO_MODELS[MODEL], args.tokens, args.itl)
+
+    results = {
+        "tokens": args.tokens,
+        "itl_s": args.itl,
+        "per_chunk": await run(service, 0.0, args.max_bytes),
+        "coalesced": await run(service, args.window_ms, args.max_bytes),
+    }
+    await service.cleanup()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.tokens} tokens, {args.itl * 1000:.1f} ms inter-token latency, "
+          f"window {args.window_ms} ms / {args.max_bytes} B")
+    print(f"  {'mode':12}{'frames':>8}{'ttft ms':>10}{'total s':>10}{'cpu ms':>10}{'ser. ms':>10}")
+    for mode in ["per_chunk", "coalesced"]:
+        r = results[mode]
+        print(f"  {mode:12}{r['frames']:>8}{r['ttft_ms']:>10}{r['total_s']:>10}{r['cpu_ms']:>10}{r['serialize_cpu_ms']:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Message search: FTS5 (bm25) against a LIKE scan
+
+Builds a throwaway SQLite database of synthetic Russian messages spread
+over several users, indexes it with the search_fts table from
+app.services.text_search and times one page of user-scoped results for
+both approaches.
+
+Usage:
+    python benchmarks/bench_text_search.py --messages 1000000 --users 50
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from app.core.database import Base
+from app.models import database  # noqa: F401  (registers the tables)
+from app.services.text_search import create_search_index, match_expression
+
+WORDS = (
+    "привет помоги проект код функция ошибка сервер запрос ответ модель данные "
+    "таблица индекс поиск база python fastapi docker деплой тест класс метод "
+    "переменная список словарь строка число файл папка пользователь пароль токен "
+    "ключ api стрим чат сообщение история контекст память кэш очередь задача "
+    "воркер лимит нагрузка профиль график отчёт анализ вопрос решение пример "
+    "документация настройка конфиг логи метрики время скорость задержка борщ "
+    "свёкла рецепт путешествие погода музыка фильм книга игра спорт"
+).split()
+
+# (label, query) pairs: common word, rare word, two words, prefix
+QUERIES = [
+    ("common", "сервер"),
+    ("rare", "борщ"),
+    ("two words", "ошибка токен"),
+    ("prefix", "настр"),
+]
+
+LIKE_QUERY = """
+SELECT m.id, m.conversation_id, c.title, m.content
+FROM messages m JOIN conversations c ON c.id = m.conversation_id
+WHERE c.user_id = ? AND {conditions}
+ORDER BY m.created_at DESC
+LIMIT ?
+"""
+
+FTS_QUERY = """
+SELECT f.rowid, f.ref, snippet(search_fts, -1, '<mark>', '</mark>', '…', 16), f.rank
+FROM search_fts f
+WHERE search_fts MATCH ?
+ORDER BY f.rank, f.rowid
+LIMIT ?
+"""
+
+
+def populate(path: str, messages: int, users: int, per_conversation: int, seed: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    rng = random.Random(seed)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+
+    connection.executemany(
+        "INSERT INTO users (id, username, email, hashed_password) VALUES (?, ?, ?, '')",
+        [(f"u{i}", f"user{i}", f"user{i}@example.com") for i in range(users)]
+    )
+    conversations = max(1, messages // per_conversation)
+    connection.executemany(
+        "INSERT INTO conversations (id, user_id, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+        [
+            (f"c{i}", f"u{i % users}", " ".join(rng.choices(WORDS, k=3)), "2024-01-01", "2024-01-01")
+            for i in range(conversations)
+        ]
+    )
+
+    def rows():
+        for i in range(messages):
+            yield (
+                f"m{i}",
+                f"c{i % conversations}",
+                "USER" if i % 2 == 0 else "ASSISTANT",
+                " ".join(rng.choices(WORDS, k=rng.randint(8, 40))),
+                f"2024-01-01 00:00:{i:012d}"
+            )
+
+    connection.executemany(
+        "INSERT INTO messages (id, conversation_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+        rows()
+    )
+    connection.commit()
+    connection.close()
+
+
+def build_index(path: str) -> float:
+    engine = create_engine(f"sqlite:///{path}")
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        create_search_index(connection)
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return elapsed
+
+
+def time_query(connection: sqlite3.Connection, sql: str, params: list, repeat: int) -> Dict[str, float]:
+    samples: List[float] = []
+    hits = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hits = len(connection.execute(sql, params).fetchall())
+        samples.append(time.perf_counter() - start)
+    return {"hits": hits, "median_ms": round(statistics.median(samples) * 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search benchmark")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--per-conversation", type=int, default=40, help="Messages per conversation")
+    parser.add_argument("--limit", type=int, default=20, help="Page size")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "search.db")
+
+        start = time.perf_counter()
+        populate(path, args.messages, args.users, args.per_conversation, args.seed)
+        populate_s = time.perf_counter() - start
+        index_s = build_index(path)
+
+        connection = sqlite3.connect(path)
+        user_id = "u0"
+        queries = {}
+        for label, query in QUERIES:
+            terms = query.split()
+            conditions = " AND ".join("(m.content LIKE ? OR c.title LIKE ?)" for _ in terms)
+            like_params = [user_id] + [f"%{term}%" for term in terms for _ in range(2)] + [args.limit]
+            queries[label] = {
+                "query": query,
+                "like": time_query(connection, LIKE_QUERY.format(conditions=conditions), like_params, args.repeat),
+                "fts": time_query(
+                    connection, FTS_QUERY, [match_expression(query, user_id), args.limit], args.repeat
+                ),
+            }
+        connection.close()
+
+        results = {
+            "messages": args.messages,
+            "users": args.users,
+            "db_mb": round(os.path.getsize(path) / 2**20, 1),
+            "populate_s": round(populate_s, 2),
+            "index_s": round(index_s, 2),
+            "queries": queries,
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+
+    print(f"{args.messages} messages, {args.users} users, {results['db_mb']} MB "
+          f"(populate {results['populate_s']} s, index {results['index_s']} s), page of {args.limit}")
+    print(f"  {'query':12}{'terms':>16}{'like ms':>12}{'fts ms':>10}{'speedup':>10}")
+    for label, r in queries.items():
+        speedup = r["like"]["median_ms"] / max(r["fts"]["median_ms"], 1e-6)
+        print(f"  {label:12}{r['query']:>16}{r['like']['median_ms']:>12}{r['fts']['median_ms']:>10}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
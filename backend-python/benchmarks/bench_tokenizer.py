@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tokenizer benchmark: tokens/sec on long Russian texts
+
+Usage:
+    python benchmarks/bench_tokenizer.py --chars 200000 --rounds 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.tokenizer import BPETokenizer, HeuristicTokenizer, DEFAULT_VOCAB_PATH
+
+STEMS = [
+    "разработ", "анализ", "модел", "систем", "пользовател", "запрос", "ответ", "данн",
+    "производительност", "оптимизаци", "архитектур", "сервер", "клиент", "поток", "сообщени",
+    "разговор", "контекст", "токен", "кэш", "баз", "очеред", "нагрузк", "задержк", "соединени",
+    "безопасност", "провер", "решени", "требовани", "тестировани", "развертывани", "мониторинг",
+    "интеллект", "технологи", "компани", "проект", "функци", "интерфейс", "результат", "метрик",
+]
+ENDINGS = ["а", "ы", "е", "у", "ой", "ами", "ах", "ов", "ия", "ии", "ию", "ей", "ом", "ого", "ому", "ые", "ых", "ый", "ую", ""]
+WORDS = ["и", "в", "на", "с", "для", "по", "что", "это", "как", "не", "мы", "HoYo", "AI", "Python", "FastAPI"]
+
+
+def russian_text(chars: int, seed: int = 42) -> str:
+    """Generate pseudo-Russian prose with many distinct word forms"""
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    while size < chars:
+        sentence = []
+        for _ in range(rng.randint(6, 16)):
+            if rng.random() < 0.3:
+                sentence.append(rng.choice(WORDS))
+            else:
+                sentence.append(rng.choice(STEMS) + rng.choice(ENDINGS))
+        if rng.random() < 0.2:
+            sentence.append(str(rng.randint(1, 100000)))
+        text = " ".join(sentence).capitalize() + rng.choice([".", ".", "!", "?", ",", ":"])
+        parts.append(text)
+        size += len(text) + 1
+    return " ".join(parts)[:chars]
+
+
+def bench(label, fn, rounds):
+    timings = []
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return label, min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenizer throughput benchmark")
+    parser.add_argument("--chars", type=int, default=200_000, help="Characters per text")
+    parser.add_argument("--texts", type=int, default=5, help="Number of texts")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--vocab", default=str(DEFAULT_VOCAB_PATH))
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    texts = [russian_text(args.chars, seed=i) for i in range(args.texts)]
+    total_chars = sum(len(text) for text in texts)
+
+    start = time.perf_counter()
+    tokenizer = BPETokenizer.load(args.vocab)
+    load_seconds = time.perf_counter() - start
+    heuristic = HeuristicTokenizer()
+
+    def cold():
+        tokenizer._encode_piece.cache_clear()
+        return sum(tokenizer.count_tokens(texts))
+
+    def warm():
+        return sum(tokenizer.count_tokens(texts))
+
+    def streamed():
+        total = 0
+        for text in texts:
+            counter = tokenizer.counter()
+            for i in range(0, len(text), 7):  # ~word-sized stream chunks
+                counter.feed(text[i:i + 7])
+            total += counter.total
+        return total
+
+    results = {
+        "vocab_size": tokenizer.vocab_size,
+        "vocab_load_seconds": round(load_seconds, 4),
+        "characters": total_chars,
+    }
+    for label, seconds, tokens in [
+        bench("bpe_cold_cache", cold, args.rounds),
+        bench("bpe_warm_cache", warm, args.rounds),
+        bench("bpe_streamed", streamed, args.rounds),
+    ]:
+        results[label] = {
+            "tokens": tokens,
+            "seconds": round(seconds, 4),
+            "tokens_per_second": round(tokens / seconds),
+            "chars_per_token": round(total_chars / tokens, 3),
+        }
+
+    results["heuristic_tokens"] = sum(heuristic.count_tokens(texts))
+    results["stream_count_matches_batch"] = results["bpe_streamed"]["tokens"] == results["bpe_warm_cache"]["tokens"]
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+
+    print(f"Vocab: {results['vocab_size']} tokens (loaded in {results['vocab_load_seconds']}s)")
+    print(f"Corpus: {args.texts} Russian texts, {total_chars:,} characters")
+    for label in ["bpe_cold_cache", "bpe_warm_cache", "bpe_streamed"]:
+        r = results[label]
+        print(f"  {label:16} {r['tokens']:>9,} tokens  {r['seconds']:>8.4f}s  "
+              f"{r['tokens_per_second']:>12,} tokens/s  {r['chars_per_token']} chars/token")
+    print(f"  heuristic (len//4) estimate: {results['heuristic_tokens']:,} tokens")
+    print(f"  streamed count matches batch count: {results['stream_count_matches_batch']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Fake upstream AI provider for local load testing
+
+Serves OpenAI-, Anthropic- and Google-compatible endpoints (plain JSON and
+SSE streaming) with configurable latency, so the provider adapters, their
+pooled HTTP clients and connection reuse can be exercised with no network.
+
+Usage:
+    python fake_upstream.py --port 8001 --ttft 0.2 --itl 0.02
+
+Then point the backend at it:
+    AI_BACKEND=live
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8001/v1
+    GOOGLE_BASE_URL=http://127.0.0.1:8001/v1beta
+
+GET /stats reports request counts and how many distinct client connections
+were used, which shows whether keep-alive connections are being reused.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Dict, Any, List, AsyncGenerator
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Latency profile (overridable via CLI or environment)
+config = {
+    "ttft": float(os.getenv("FAKE_UPSTREAM_TTFT", "0.2")),  # time to first token, seconds
+    "itl": float(os.getenv("FAKE_UPSTREAM_ITL", "0.02")),  # inter-token latency, seconds
+    "words": int(os.getenv("FAKE_UPSTREAM_WORDS", "60")),  # words per response
+}
+
+stats = {
+    "requests_total": 0,
+    "requests_streaming": 0,
+    "requests_by_provider": {"openai": 0, "anthropic": 0, "google": 0},
+    "connections": set(),
+    "started_at": time.time(),
+}
+
+app = FastAPI(title="HoYo AI Fake Upstream")
+
+
+def _track(request: Request, provider: str, streaming: bool):
+    stats["requests_total"] += 1
+    stats["requests_by_provider"][provider] += 1
+    if streaming:
+        stats["requests_streaming"] += 1
+    if request.client:
+        stats["connections"].add((request.client.host, request.client.port))
+
+
+def _words(prompt: str) -> List[str]:
+    base = f"Ответ фейкового провайдера на запрос: {prompt[:60]}".split()
+    filler = "HoYo Technologies тестирует пропускную способность и переиспользование соединений".split()
+    words = list(base)
+    while len(words) < config["words"]:
+        words.extend(filler)
+    words = words[:config["words"]]
+    return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+
+def _last_user_text(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content", "")
+            return content if isinstance(content, str) else json.dumps(content)
+    return ""
+
+
+async def _tokens(prompt: str) -> AsyncGenerator[str, None]:
+    await asyncio.sleep(config["ttft"])
+    for i, word in enumerate(_words(prompt)):
+        if i:
+            await asyncio.sleep(config["itl"])
+        yield word
+
+
+async def _full_text(prompt: str) -> str:
+    return "".join([token async for token in _tokens(prompt)])
+
+
+def _sse(data: Any, event: str = None) -> str:
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {payload}\n\n"
+
+
+def _sse_response(events: AsyncGenerator[str, None]) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream")
+
+
+# ==================== OPENAI ====================
+
+@app.post("/v1/chat/completions")
+async def openai_chat(request: Request):
+    body = await request.json()
+    prompt = _last_user_text(body.get("messages", []))
+    streaming = bool(body.get("stream"))
+    _track(request, "openai", streaming)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+    if not streaming:
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": await _full_text(prompt)},
+                "finish_reason": "stop"
+            }]
+        }
+
+    async def events():
+        async for token in _tokens(prompt):
+            yield _sse({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+            })
+        yield _sse("[DONE]")
+
+    return _sse_response(events())
+
+
+# ==================== ANTHROPIC ====================
+
+@app.post("/v1/messages")
+async def anthropic_messages(request: Request):
+    body = await request.json()
+    prompt = _last_user_text(body.get("messages", []))
+    streaming = bool(body.get("stream"))
+    _track(request, "anthropic", streaming)
+    message_id = f"msg_{uuid.uuid4().hex[:12]}"
+
+    if not streaming:
+        return {
+            "id": message_id,
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model"),
+            "content": [{"type": "text", "text": await _full_text(prompt)}],
+            "stop_reason": "end_turn"
+        }
+
+    async def events():
+        yield _sse({"type": "message_start", "message": {"id": message_id, "model": body.get("model")}}, "message_start")
+        yield _sse({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}, "content_block_start")
+        async for token in _tokens(prompt):
+            yield _sse({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": token}}, "content_block_delta")
+        yield _sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+        yield _sse({"type": "message_stop"}, "message_stop")
+
+    return _sse_response(events())
+
+
+# ==================== GOOGLE ====================
+
+def _google_prompt(body: Dict[str, Any]) -> str:
+    for content in reversed(body.get("contents", [])):
+        if content.get("role", "user") == "user":
+            return "".join(part.get("text", "") for part in content.get("parts", []))
+    return ""
+
+
+def _google_chunk(text: str) -> Dict[str, Any]:
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+@app.post("/v1beta/models/{model_action}")
+async def google_generate(model_action: str, request: Request):
+    body = await request.json()
+    prompt = _google_prompt(body)
+    streaming = model_action.endswith(":streamGenerateContent")
+    _track(request, "google", streaming)
+
+    if not streaming:
+        return _google_chunk(await _full_text(prompt))
+
+    async def events():
+        async for token in _tokens(prompt):
+            yield _sse(_google_chunk(token))
+
+    return _sse_response(events())
+
+
+# ==================== STATS ====================
+
+@app.get("/stats")
+async def get_stats():
+    """Request and connection reuse statistics"""
+    requests_total = stats["requests_total"]
+    connections = len(stats["connections"])
+    return {
+        "requests_total": requests_total,
+        "requests_streaming": stats["requests_streaming"],
+        "requests_by_provider": stats["requests_by_provider"],
+        "distinct_connections": connections,
+        "requests_per_connection": round(requests_total / connections, 2) if connections else 0,
+        "uptime_seconds": round(time.time() - stats["started_at"], 1),
+        "config": config
+    }
+
+
+@app.post("/stats/reset")
+async def reset_stats():
+    stats["requests_total"] = 0
+    stats["requests_streaming"] = 0
+    stats["requests_by_provider"] = {"openai": 0, "anthropic": 0, "google": 0}
+    stats["connections"] = set()
+    stats["started_at"] = time.time()
+    return {"status": "reset"}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake upstream AI provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--ttft", type=float, default=config["ttft"], help="Time to first token (s)")
+    parser.add_argument("--itl", type=float, default=config["itl"], help="Inter-token latency (s)")
+    parser.add_argument("--words", type=int, default=config["words"], help="Words per response")
+    args = parser.parse_args()
+
+    config.update(ttft=args.ttft, itl=args.itl, words=args.words)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
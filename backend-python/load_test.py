@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the REST, SSE and WebSocket chat paths
+
+Logs in, creates conversations and drives POST /api/chat/,
+POST /api/chat/stream and /ws/{client_id} (stream_chat) one scenario
+after another, either against a running server (--url) or against an
+in-process uvicorn server started with the mock backend. Reports
+throughput, p50/p95/p99 latency, time to first chunk and error rates per
+scenario as JSON.
+
+Load is closed-loop (--concurrency workers, each sending its next request
+as soon as the last one finishes) or open-loop (--rate Poisson arrivals
+served by --concurrency workers). In open-loop runs latency counts from
+the scheduled arrival, so queueing behind a slow server is not hidden.
+
+Usage:
+    python load_test.py --scenarios rest,sse,ws --concurrency 20 --duration 30
+    python load_test.py --url http://127.0.0.1:8000 --rate 50 --output run.json
+    python load_test.py --baseline run.json --tolerance 0.1
+
+In-process runs use a throwaway database and AI_BACKEND=mock; any other
+setting can be overridden through the environment, e.g.
+MOCK_PROFILE=realistic MOCK_SEED=1 MODEL_RATE_LIMIT_ENABLED=false.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import websockets
+
+SCENARIOS = ["rest", "sse", "ws"]
+
+# Compared against --baseline: (path, True if higher is worse)
+REGRESSION_METRICS = [
+    (("throughput_rps",), False),
+    (("latency_ms", "p50"), True),
+    (("latency_ms", "p95"), True),
+    (("latency_ms", "p99"), True),
+    (("ttfc_ms", "p95"), True),
+    (("error_rate",), True),
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50) * 1000, 1),
+        "p95": round(percentile(values, 95) * 1000, 1),
+        "p99": round(percentile(values, 99) * 1000, 1),
+        "mean": round(sum(values) / len(values) * 1000, 1),
+        "max": round(max(values) * 1000, 1),
+    }
+
+
+class Result:
+    """Outcome of one request"""
+
+    def __init__(self, latency: float, ttfc: Optional[float] = None, error: Optional[str] = None):
+        self.latency = latency
+        self.ttfc = ttfc
+        self.error = error
+
+
+class Client:
+    """An authenticated user of the API with a few conversations to write to"""
+
+    def __init__(self, base_url: str, model: str, timeout: float, concurrency: int):
+        self.base_url = base_url.rstrip("/")
+        self.ws_url = "ws" + self.base_url[4:]
+        self.model = model
+        self.http = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        )
+        self.token = ""
+        self.conversations: List[str] = []
+        self.sequence = 0
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+    async def login(self, username: str, password: str, conversations: int):
+        response = await self.http.post("/api/auth/login", data={"username": username, "password": password})
+        response.raise_for_status()
+        self.token = response.json()["access_token"]
+        for i in range(conversations):
+            response = await self.http.post(
+                "/api/conversations/", json={"title": f"Load test {i}", "model": self.model}, headers=self.headers
+            )
+            response.raise_for_status()
+            self.conversations.append(response.json()["id"])
+
+    def next_request(self) -> Dict[str, Any]:
+        # A unique message per request keeps the response cache out of the measurement
+        self.sequence += 1
+        return {
+            "conversation_id": self.conversations[self.sequence % len(self.conversations)],
+            "message": f"Нагрузочный тест, запрос {self.sequence}: расскажи о HoYo AI",
+            "model": self.model,
+            "cache": False,
+        }
+
+    async def rest(self, start: float) -> Result:
+        response = await self.http.post("/api/chat/", json=self.next_request(), headers=self.headers)
+        latency = time.perf_counter() - start
+        if response.status_code != 200:
+            return Result(latency, error=f"http_{response.status_code}")
+        return Result(latency, ttfc=latency)
+
+    async def sse(self, start: float) -> Result:
+        ttfc = None
+        async with self.http.stream(
+            "POST", "/api/chat/stream", json=self.next_request(), headers=self.headers
+        ) as response:
+            if response.status_code != 200:
+                return Result(time.perf_counter() - start, error=f"http_{response.status_code}")
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data = line[6:]
+                if data == "[DONE]":
+                    return Result(time.perf_counter() - start, ttfc)
+                frame = json.loads(data)
+                if frame["type"] == "chunk" and ttfc is None:
+                    ttfc = time.perf_counter() - start
+                elif frame["type"] == "error":
+                    return Result(time.perf_counter() - start, ttfc, f"stream_{frame['data'].get('status_code', 'error')}")
+        return Result(time.perf_counter() - start, ttfc, "stream_incomplete")
+
+    async def ws_connect(self):
+        connection = await websockets.connect(
+            f"{self.ws_url}/ws/{uuid.uuid4()}?token={self.token}", max_size=None
+        )
+        await connection.recv()  # connection confirmation
+        return connection
+
+    async def ws(self, connection, start: float) -> Result:
+        await connection.send(json.dumps({"type": "stream_chat", **self.next_request()}))
+        ttfc = None
+        while True:
+            frame = json.loads(await connection.recv())
+            if frame.get("type") != "stream_chunk":
+                continue
+            data = frame["data"]
+            if "error" in data:
+                return Result(time.perf_counter() - start, ttfc, f"stream_{data.get('status_code', 'error')}")
+            if "chunk" in data and ttfc is None:
+                ttfc = time.perf_counter() - start
+            if data.get("done"):
+                return Result(time.perf_counter() - start, ttfc)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+async def run_scenario(client: Client, scenario: str, args) -> Dict[str, Any]:
+    """Drive one scenario for args.duration seconds and summarize it"""
+    results: List[Result] = []
+    queue_delays: List[float] = []
+    deadline = time.perf_counter() + args.duration
+    arrivals: Optional[asyncio.Queue] = asyncio.Queue() if args.rate else None
+    rng = random.Random(args.seed)
+
+    async def generate_arrivals():
+        # Poisson arrivals at args.rate; workers pick up the scheduled times
+        at = time.perf_counter()
+        while True:
+            at += rng.expovariate(args.rate)
+            if at >= deadline:
+                break
+            await asyncio.sleep(max(0.0, at - time.perf_counter()))
+            arrivals.put_nowait(at)
+        for _ in range(args.concurrency):
+            arrivals.put_nowait(None)
+
+    async def worker():
+        connection = await client.ws_connect() if scenario == "ws" else None
+        try:
+            while True:
+                if arrivals is not None:
+                    scheduled = await arrivals.get()
+                    if scheduled is None:
+                        return
+                    queue_delays.append(time.perf_counter() - scheduled)
+                    start = scheduled
+                else:
+                    if time.perf_counter() >= deadline:
+                        return
+                    start = time.perf_counter()
+                try:
+                    if scenario == "rest":
+                        result = await client.rest(start)
+                    elif scenario == "sse":
+                        result = await client.sse(start)
+                    else:
+                        result = await client.ws(connection, start)
+                except Exception as e:
+                    result = Result(time.perf_counter() - start, error=type(e).__name__)
+                    if connection is not None:
+                        # The connection is in an unknown state after a failure
+                        await connection.close()
+                        connection = await client.ws_connect()
+                results.append(result)
+        finally:
+            if connection is not None:
+                await connection.close()
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+    if arrivals is not None:
+        tasks.append(asyncio.create_task(generate_arrivals()))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r.error is None]
+    errors = Counter(r.error for r in results if r.error is not None)
+    report = {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": sum(errors.values()),
+        "error_rate": round(sum(errors.values()) / len(results), 4) if results else 0.0,
+        "errors_by_kind": dict(errors),
+        "duration_s": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": summarize([r.latency for r in ok]),
+        "ttfc_ms": summarize([r.ttfc for r in ok if r.ttfc is not None]) if scenario != "rest" else None,
+    }
+    if arrivals is not None:
+        report["queue_delay_ms"] = summarize(queue_delays)
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Metrics that got worse than the baseline by more than ``tolerance`` (relative)"""
+    regressions = []
+    for scenario, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            continue
+        for path, higher_is_worse in REGRESSION_METRICS:
+            now, before = current, previous
+            for key in path:
+                now = now.get(key) if isinstance(now, dict) else None
+                before = before.get(key) if isinstance(before, dict) else None
+            if now is None or before is None:
+                continue
+            if higher_is_worse:
+                worse = now > before * (1 + tolerance) and now - before > 1e-3
+            else:
+                worse = now < before * (1 - tolerance)
+            if worse:
+                regressions.append(f"{scenario} {'.'.join(path)}: {before} -> {now}")
+    return regressions
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def start_server(port: int) -> Tuple[Any, asyncio.Task]:
+    """Serve main.app in this process (settings come from the environment)"""
+    import uvicorn
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", ws="websockets"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="REST/SSE/WebSocket load test")
+    parser.add_argument("--url", help="Server to test (default: start one in-process)")
+    parser.add_argument("--scenarios", default="rest,sse,ws", help="Comma-separated: rest, sse, ws")
+    parser.add_argument("--concurrency", type=int, default=10, help="Workers (connections) per scenario")
+    parser.add_argument("--rate", type=float, default=0.0, help="Open-loop arrivals per second (0 = closed loop)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per scenario")
+    parser.add_argument("--model", default="HoYo-Fast")
+    parser.add_argument("--username", default="hvano")
+    parser.add_argument("--password", default="hoyo123")
+    parser.add_argument("--conversations", type=int, default=10, help="Conversations the requests rotate over")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for open-loop arrivals")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"Unknown scenario: {scenario}")
+
+    server = server_task = tmp = None
+    base_url = args.url
+    if base_url is None:
+        tmp = tempfile.TemporaryDirectory()
+        os.environ.setdefault("AI_BACKEND", "mock")
+        os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tmp.name}/load_test.db")
+        os.environ.setdefault("VECTOR_INDEX_PATH", os.path.join(tmp.name, "vector_index"))
+        port = free_port()
+        server, server_task = await start_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    client = Client(base_url, args.model, args.timeout, args.concurrency)
+    try:
+        await client.login(args.username, args.password, args.conversations)
+        report = {
+            "target": args.url or "in-process",
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {
+                "model": args.model,
+                "concurrency": args.concurrency,
+                "rate": args.rate or None,
+                "duration_s": args.duration,
+                "backend": os.getenv("AI_BACKEND") if args.url is None else None,
+                "mock_profile": os.getenv("MOCK_PROFILE") if args.url is None else None,
+            },
+            "scenarios": {},
+        }
+        for scenario in scenarios:
+            print(f"▶ {scenario}: {args.concurrency} workers, {args.duration:g}s"
+                  + (f", {args.rate:g} req/s" if args.rate else ""), file=sys.stderr)
+            report["scenarios"][scenario] = await run_scenario(client, scenario, args)
+    finally:
+        await client.aclose()
+        if server is not None:
+            server.should_exit = True
+            await server_task
+            tmp.cleanup()
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"❌ Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,7 +4,7 @@ Advanced AI Assistant with Multiple Models
 """
 from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from contextlib import asynccontextmanager
 from typing import Optional, List, Dict, Any
 import asyncio
@@ -15,10 +15,18 @@ import uuid
 # Local imports
 from app.core.config import settings
 from app.core.database import init_db, get_db
+from app.core.metrics import register_collector
 from app.core.security import get_current_user
-from app.api import auth, conversations, chat, models
+from app.api import auth, conversations, chat, models, batches
 from app.models.database import User
+from app.services.activity import activity_tracker
 from app.services.ai_service import AIService
+from app.services.auth_cache import auth_cache
+from app.services.password_hasher import password_hasher
+from app.services.revocation import token_revocations
+from app.services.batch_service import batch_service
+from app.services.summarizer import summarizer
+from app.services.vector_index import vector_index
 from app.services.websocket_manager import ConnectionManager
 
 # Initialize services
@@ -30,14 +38,35 @@ async def lifespan(app: FastAPI):
     """Lifecycle management for the application"""
     print("🚀 Starting HoYo AI Backend...")
     
+    # Password hashing pool (started first, before any other threads exist)
+    password_hasher.start()
+    register_collector("password_hasher", password_hasher.stats)
+    
     # Initialize database
     await init_db()
     print("✅ Database initialized")
     
+    # Revoked tokens (Bloom filter over the denylist)
+    await token_revocations.start()
+    
+    # Write-behind user activity and auth cache metrics
+    activity_tracker.start()
+    register_collector("activity", activity_tracker.stats)
+    register_collector("auth_cache", auth_cache.stats, label="cache")
+    
     # Initialize AI models
     await ai_service.initialize()
     print("✅ AI models loaded")
     
+    # Resume unfinished batch jobs
+    await batch_service.start(ai_service)
+    
+    # Background conversation summaries
+    summarizer.start(ai_service)
+    
+    # Semantic search index over message history
+    await vector_index.start(ai_service)
+    
     # Startup complete
     print(f"""
 ╔══════════════════════════════════════════════════╗
@@ -58,6 +87,12 @@ async def lifespan(app: FastAPI):
     # Cleanup
     print("👋 Shutting down HoYo AI Backend...")
     await manager.disconnect_all()
+    await batch_service.shutdown()
+    await summarizer.shutdown()
+    await vector_index.shutdown()
+    await token_revocations.shutdown()
+    await activity_tracker.shutdown()
+    password_hasher.shutdown()
     await ai_service.cleanup()
 
 # Create FastAPI app
@@ -108,13 +143,27 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint
+    
+    Status is "starting" until the default model is ready and "degraded"
+    while a breaker is open or a model failed to load.
+    """
+    circuit_breakers = ai_service.circuit_breakers.states()
+    models = ai_service.loader.status()
+    if not ai_service.loader.is_ready(ai_service.default_model):
+        health = "starting"
+    elif "open" in circuit_breakers.values() or any(m["state"] == "failed" for m in models.values()):
+        health = "degraded"
+    else:
+        health = "healthy"
     return {
-        "status": "healthy",
+        "status": health,
         "timestamp": datetime.utcnow().isoformat(),
         "database": "connected",
-        "ai_models": "loaded",
+        "ai_models": ai_service.loader.stats(),
+        "models": models,
         "websocket": "active",
+        "circuit_breakers": circuit_breakers,
         "memory_usage": ai_service.get_memory_usage(),
         "active_connections": manager.get_connection_count()
     }
@@ -133,12 +182,76 @@ app.include_router(conversations.router, prefix="/api/conversations", tags=["Con
 # Chat routes
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 
+# Batch job routes
+app.include_router(batches.router, prefix="/api/chat/batches", tags=["Batches"])
+
 # Inject AI service into chat module
 from app.api.chat import set_ai_service
 set_ai_service(ai_service)
 
 # ==================== WEBSOCKET ====================
 
+async def stream_to_websocket(
+    websocket: WebSocket,
+    data: Dict[str, Any],
+    user: Optional[User],
+    previous: Optional[asyncio.Task] = None,
+    current: Optional[Dict[str, Any]] = None
+):
+    """Forward one stream_chat request, recording its generation_id in ``current``
+    
+    Cancelling the task detaches from the generation, which stays resumable
+    (with generation_id + offset) for the resume grace period.
+    """
+    if previous is not None:
+        # Keep streams on one connection in request order
+        try:
+            await asyncio.wait({previous})
+        except asyncio.CancelledError:
+            previous.cancel()
+            raise
+    
+    stream = ai_service.stream_chat(
+        message=data["message"],
+        model=data.get("model", "HoYo-GPT-4"),
+        conversation_id=data.get("conversation_id"),
+        user=user,
+        temperature=data.get("temperature"),
+        top_p=data.get("top_p"),
+        max_tokens=data.get("max_tokens"),
+        use_cache=data.get("cache"),
+        coalesce_ms=data.get("coalesce_ms"),
+        coalesce_bytes=data.get("coalesce_bytes"),
+        generation_id=data.get("generation_id"),
+        offset=data.get("offset", 0)
+    )
+    try:
+        async for chunk in stream:
+            if current is not None and "generation_id" in chunk:
+                current["generation_id"] = chunk["generation_id"]
+            await websocket.send_json({
+                "type": "stream_chunk",
+                "data": chunk
+            })
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"WebSocket stream error: {e}")
+        # End the request for the client instead of leaving it waiting
+        try:
+            await websocket.send_json({
+                "type": "stream_chunk",
+                "data": {
+                    "error": str(e),
+                    "status_code": 500,
+                    "generation_id": current.get("generation_id") if current is not None else None
+                }
+            })
+        except Exception:
+            pass
+    finally:
+        await stream.aclose()
+
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(
     websocket: WebSocket, 
@@ -146,6 +259,10 @@ async def websocket_endpoint(
     token: Optional[str] = None
 ):
     """WebSocket endpoint for real-time communication"""
+    # Streams run in a task so the receive loop notices disconnects (and
+    # cancel_stream messages) and can stop the upstream generation
+    stream_task: Optional[asyncio.Task] = None
+    current_stream: Dict[str, Any] = {}
     try:
         # Authenticate if token provided
         user = None
@@ -180,7 +297,11 @@ async def websocket_endpoint(
                     message=data["message"],
                     model=data.get("model", "HoYo-GPT-4"),
                     conversation_id=data.get("conversation_id"),
-                    user=user
+                    user=user,
+                    temperature=data.get("temperature"),
+                    top_p=data.get("top_p"),
+                    max_tokens=data.get("max_tokens"),
+                    use_cache=data.get("cache")
                 )
                 await websocket.send_json({
                     "type": "chat_response",
@@ -212,16 +333,18 @@ async def websocket_endpoint(
                 
             elif data["type"] == "stream_chat":
                 # Stream AI response
-                async for chunk in ai_service.stream_chat(
-                    message=data["message"],
-                    model=data.get("model", "HoYo-GPT-4"),
-                    conversation_id=data.get("conversation_id"),
-                    user=user
-                ):
-                    await websocket.send_json({
-                        "type": "stream_chunk",
-                        "data": chunk
-                    })
+                previous = stream_task if stream_task and not stream_task.done() else None
+                stream_task = asyncio.create_task(stream_to_websocket(websocket, data, user, previous, current_stream))
+                
+            elif data["type"] == "cancel_stream":
+                # An explicit cancel stops the generation; a disconnect leaves it resumable
+                generation_id = data.get("generation_id") or current_stream.get("generation_id")
+                cancelled = generation_id is not None and ai_service.cancel_generation(generation_id, user)
+                if stream_task and not stream_task.done():
+                    stream_task.cancel()
+                    cancelled = True
+                if cancelled:
+                    await websocket.send_json({"type": "stream_cancelled"})
                     
     except WebSocketDisconnect:
         manager.disconnect(client_id)
@@ -234,6 +357,9 @@ async def websocket_endpoint(
         print(f"WebSocket error: {e}")
         await websocket.close()
         manager.disconnect(client_id)
+    finally:
+        if stream_task and not stream_task.done():
+            stream_task.cancel()
 
 # ==================== METRICS ====================
 
@@ -252,21 +378,28 @@ async def metrics():
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Custom HTTP exception handler"""
-    return {
-        "error": exc.detail,
-        "status_code": exc.status_code,
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={
+            "error": exc.detail,
+            "status_code": exc.status_code,
+            "timestamp": datetime.utcnow().isoformat()
+        },
+        headers=getattr(exc, "headers", None)
+    )
 
 @app.exception_handler(500)
 async def internal_error_handler(request, exc):
     """Internal server error handler"""
-    return {
-        "error": "Internal server error",
-        "message": "An unexpected error occurred. Please try again later.",
-        "status_code": 500,
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    return JSONResponse(
+        status_code=500,
+        content={
+            "error": "Internal server error",
+            "message": "An unexpected error occurred. Please try again later.",
+            "status_code": 500,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    )
 
 # ==================== STARTUP ====================
 
@@ -0,0 +1,36 @@
+"""
+Shared fixtures: a throwaway SQLite database and storage directories
+
+The environment is set before anything imports app.core.config, so the
+settings and the engine point at a temporary directory.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+TEST_DIR = Path(tempfile.mkdtemp(prefix="hoyo-tests-"))
+DATABASE_FILE = TEST_DIR / "test.db"
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DATABASE_FILE}"
+os.environ["VECTOR_INDEX_PATH"] = str(TEST_DIR / "vector_index")
+os.environ["BATCH_STORAGE_PATH"] = str(TEST_DIR / "batches")
+os.environ["AI_BACKEND"] = "mock"
+os.environ["PASSWORD_HASH_EXECUTOR"] = "thread"
+
+
+@pytest.fixture
+async def database():
+    """An empty database with every table and the search index"""
+    from app.core.database import Base, engine
+    from app.models import database as models  # noqa: F401 (registers the tables)
+    from app.services.text_search import create_search_index
+
+    await engine.dispose()
+    DATABASE_FILE.unlink(missing_ok=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_search_index)
+    yield engine
+    await engine.dispose()
@@ -0,0 +1,85 @@
+"""
+Write-behind activity flushes racing shutdown and cancellation
+"""
+import asyncio
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.database import User
+from app.services import activity
+from app.services.activity import ActivityTracker
+
+
+class SlowSession:
+    """Session whose first statement blocks until released"""
+
+    def __init__(self, started: asyncio.Event, release: asyncio.Event):
+        self._session = AsyncSessionLocal()
+        self._started = started
+        self._release = release
+
+    async def __aenter__(self):
+        await self._session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._session.__aexit__(*exc)
+
+    async def execute(self, *args, **kwargs):
+        self._started.set()
+        await self._release.wait()
+        return await self._session.execute(*args, **kwargs)
+
+    async def commit(self):
+        await self._session.commit()
+
+
+async def add_user(user_id: str):
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=user_id, username=user_id, email=f"{user_id}@example.com", hashed_password="-"))
+        await db.commit()
+
+
+async def test_shutdown_waits_for_flush_in_progress(database, monkeypatch):
+    await add_user("u1")
+    started, release = asyncio.Event(), asyncio.Event()
+    monkeypatch.setattr(activity, "AsyncSessionLocal", lambda: SlowSession(started, release))
+    monkeypatch.setattr(settings, "ACTIVITY_FLUSH_SECONDS", 0.01)
+
+    tracker = ActivityTracker()
+    at = datetime(2026, 1, 1, 12)
+    tracker.record_login("u1", at)
+    tracker.start()
+    await asyncio.wait_for(started.wait(), 1)
+
+    shutdown = asyncio.create_task(tracker.shutdown())
+    await asyncio.sleep(0.05)
+    assert not shutdown.done()
+    release.set()
+    await asyncio.wait_for(shutdown, 1)
+
+    assert tracker.flushes_total == 1
+    assert tracker.stats()["pending_logins"] == 0
+    async with AsyncSessionLocal() as db:
+        assert (await db.get(User, "u1")).last_login == at
+
+
+async def test_cancelled_flush_keeps_touches(database, monkeypatch):
+    await add_user("u1")
+    started, release = asyncio.Event(), asyncio.Event()
+    monkeypatch.setattr(activity, "AsyncSessionLocal", lambda: SlowSession(started, release))
+
+    tracker = ActivityTracker()
+    at = datetime(2026, 1, 1, 12)
+    tracker.record_login("u1", at)
+    tracker.record_api_key_use("k1", at)
+    flush = asyncio.create_task(tracker.flush())
+    await asyncio.wait_for(started.wait(), 1)
+    flush.cancel()
+    await asyncio.gather(flush, return_exceptions=True)
+
+    stats = tracker.stats()
+    assert stats["pending_logins"] == 1
+    assert stats["pending_api_keys"] == 1
+    assert stats["failed_flushes_total"] == 1
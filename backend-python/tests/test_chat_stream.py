@@ -0,0 +1,53 @@
+"""
+SSE framing of streamed chat responses
+"""
+import json
+
+from app.api import chat
+from app.core.database import AsyncSessionLocal
+from app.models.database import Conversation, User
+from app.schemas.chat import ChatRequest
+
+
+class FakeAIService:
+    def __init__(self, *frames):
+        self.frames = frames
+
+    async def stream_chat(self, **kwargs):
+        for frame in self.frames:
+            yield frame
+
+
+async def sse_events(monkeypatch, *frames):
+    monkeypatch.setattr(chat, "ai_service", FakeAIService(*frames))
+    async with AsyncSessionLocal() as db:
+        user = User(id="u1", username="u1", email="u1@example.com", hashed_password="-")
+        db.add(user)
+        db.add(Conversation(id="c1", user_id="u1", title="t"))
+        await db.commit()
+
+        request = ChatRequest(conversation_id="c1", message="hi", generation_id="g1")
+        response = await chat.stream_message(request, current_user=user, db=db)
+        body = "".join([part async for part in response.body_iterator])
+    return [event[len("data: "):] for event in body.split("\n\n") if event]
+
+
+async def test_error_frame_is_followed_by_done(database, monkeypatch):
+    events = await sse_events(
+        monkeypatch,
+        {"chunk": "partial", "generation_id": "g1", "offset": 7},
+        {"error": "Generation cancelled", "cancelled": True, "truncated": True, "offset": 7}
+    )
+    assert [json.loads(event)["type"] for event in events[:-1]] == ["chunk", "error"]
+    assert json.loads(events[1])["data"]["cancelled"] is True
+    assert events[-1] == "[DONE]"
+
+
+async def test_completed_stream_ends_with_complete_and_done(database, monkeypatch):
+    events = await sse_events(
+        monkeypatch,
+        {"chunk": "answer", "generation_id": "g1", "offset": 6},
+        {"done": True, "message": {"id": "m1"}}
+    )
+    assert [json.loads(event)["type"] for event in events[:-1]] == ["chunk", "complete"]
+    assert events[-1] == "[DONE]"
@@ -0,0 +1,141 @@
+"""
+Resumable generations: terminal frames, grace cancellation and retention
+"""
+import asyncio
+
+from app.services.ai_service import AIService
+from app.services.generations import GenerationRegistry
+
+OWNER = "anonymous"  # AIService's owner key for requests without a user
+
+
+class UpstreamError(Exception):
+    status_code = 503
+
+
+async def chunks(*steps):
+    for step in steps:
+        if isinstance(step, asyncio.Event):
+            await step.wait()
+        elif isinstance(step, Exception):
+            raise step
+        else:
+            yield step
+
+
+def start(service: AIService, source, on_finish=None):
+    return service.generations.start(
+        OWNER, "HoYo-Fast",
+        lambda gen: service._run_generation(gen, source, 0, "c1", None, False, on_finish)
+    )
+
+
+async def follow(service: AIService, generation_id: str, offset: int = 0, coalesce_ms: float = 30):
+    frames = []
+    async for frame in service.stream_chat("", generation_id=generation_id, offset=offset, coalesce_ms=coalesce_ms):
+        frames.append(frame)
+    return frames
+
+
+async def test_failed_generation_ends_with_error_frame():
+    service = AIService()
+    generation = start(service, chunks("partial ", UpstreamError("upstream failed")))
+
+    frames = await asyncio.wait_for(follow(service, generation.id), 1)
+    assert "".join(frame["chunk"] for frame in frames[:-1]) == "partial "
+    final = frames[-1]
+    assert final["error"] == "upstream failed"
+    assert final["status_code"] == 503
+    assert final["truncated"] is True and final["cancelled"] is False
+    assert final["offset"] == len("partial ")
+
+
+async def test_cancelled_generation_ends_followers_and_resumes():
+    service = AIService()
+    saved = []
+
+    async def on_finish(response, result):
+        saved.append((response, result))
+        return {"id": "m1"}
+
+    generation = start(service, chunks("first ", asyncio.Event()), on_finish)
+    stream = service.stream_chat("", generation_id=generation.id, coalesce_ms=30)
+    first = await asyncio.wait_for(stream.__anext__(), 1)
+    assert first["chunk"] == "first "
+
+    assert service.generations.cancel(generation)
+    final = await asyncio.wait_for(stream.__anext__(), 1)
+    assert final["cancelled"] is True and final["truncated"] is True
+    assert final["message"] == {"id": "m1"}
+    assert saved[0][0] == "first "
+
+    # Resuming the finished generation replays the text and the same final frame
+    frames = await asyncio.wait_for(follow(service, generation.id), 1)
+    assert frames[0]["chunk"] == "first "
+    assert frames[-1]["cancelled"] is True
+    assert (await asyncio.wait_for(follow(service, generation.id, offset=len("first ")), 1))[-1]["cancelled"]
+
+
+async def test_unfollowed_generation_is_cancelled_after_grace():
+    registry = GenerationRegistry(buffer_chars=1024, ttl=60, grace=0.05, max_retained=10)
+    cancelled = asyncio.Event()
+
+    async def run(generation):
+        generation.append("a")
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            generation.finish({"error": "cancelled"})
+            raise
+
+    generation = registry.start(OWNER, "m", run)
+    reader = registry.follow(generation, 0)
+    assert await reader.__anext__() == "a"
+    await reader.aclose()
+
+    # A follower that comes back within the grace period keeps it running
+    await asyncio.sleep(0.02)
+    again = asyncio.ensure_future(registry.follow(generation, 1, resumed=True).__anext__())
+    await asyncio.sleep(0.1)
+    assert not cancelled.is_set()
+    again.cancel()
+
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert registry.abandoned_total == 1
+
+
+async def test_finished_generation_expires_after_ttl():
+    registry = GenerationRegistry(buffer_chars=1024, ttl=0.05, grace=10, max_retained=10)
+
+    async def run(generation):
+        generation.append("done")
+        generation.finish({"done": True})
+
+    generation = registry.start(OWNER, "m", run)
+    await generation.task
+    assert registry.get(generation.id, OWNER) is generation
+    assert registry.get(generation.id, "someone else") is None
+    await asyncio.sleep(0.1)
+    assert registry.get(generation.id, OWNER) is None
+
+
+async def test_slow_follower_text_is_retained_past_the_buffer():
+    registry = GenerationRegistry(buffer_chars=4, ttl=60, grace=10, max_retained=10)
+    release = asyncio.Event()
+
+    async def run(generation):
+        await release.wait()
+        for text in ["aaaa", "bbbb", "cccc"]:
+            generation.append(text)
+        generation.finish({"done": True})
+
+    generation = registry.start(OWNER, "m", run)
+    reader = registry.follow(generation, 0)
+    pending = asyncio.ensure_future(reader.__anext__())
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.wait_for(pending, 1) == "aaaabbbbcccc"
+    await reader.aclose()
+    # Without a follower only the last buffer_chars characters are kept
+    assert generation.base_offset == 8
@@ -0,0 +1,64 @@
+"""
+Mock model profiles: seeded replay, bounded bookkeeping and simulated failures
+"""
+import asyncio
+
+from app.core.config import settings
+from app.services import mock_profiles
+from app.services.ai_service import AIService, MockModel
+from app.services.mock_profiles import MockProfiles
+
+PROFILES = {
+    "default": {"ttft": 0.0, "itl": 0.0},
+    "varied": {"ttft": {"type": "lognormal", "median": 0.5, "sigma": 1.0}, "itl": 0.0, "failure_rate": 0.5},
+    "flaky": {"ttft": 0.0, "itl": 0.0, "length": 20, "failure_rate": 1.0, "failure_status": 503}
+}
+
+
+def draws(profiles: MockProfiles, model: str, prompt: str):
+    request = profiles.request(model, prompt)
+    return request.ttft, request.failure
+
+
+def test_seeded_draws_do_not_depend_on_interleaving():
+    first = MockProfiles(PROFILES, {}, "varied", seed=7)
+    second = MockProfiles(PROFILES, {}, "varied", seed=7)
+
+    a = [draws(first, "m", "a"), draws(first, "m", "a"), draws(first, "m", "b")]
+    b = draws(second, "m", "b")
+    a2 = [draws(second, "m", "a"), draws(second, "m", "a")]
+    assert a == [*a2, b]
+    # A repeated prompt is a new draw, not the same one again
+    assert a[0] != a[1]
+
+
+def test_occurrence_counts_are_bounded(monkeypatch):
+    monkeypatch.setattr(mock_profiles, "SEEN_MAX_PROMPTS", 3)
+    profiles = MockProfiles(PROFILES, {}, "varied", seed=7)
+    for prompt in ["a", "b", "c", "a", "d", "e"]:
+        profiles.request("m", prompt)
+    assert len(profiles._seen) == 3
+
+    # "a" was used again after "b" and "c", so its count outlived theirs
+    replay = MockProfiles(PROFILES, {}, "varied", seed=7)
+    replay.request("m", "a")
+    replay.request("m", "a")
+    assert draws(profiles, "m", "a") == draws(replay, "m", "a")
+    # "b" was evicted and starts over
+    assert draws(profiles, "m", "b") == draws(MockProfiles(PROFILES, {}, "varied", seed=7), "m", "b")
+
+
+async def test_simulated_failure_ends_stream_with_error_frame():
+    service = AIService()
+    model = MockModel(settings.HOYO_MODELS["HoYo-Fast"])
+    model.profiles = MockProfiles(PROFILES, {"HoYo-Fast": "flaky"}, "default", seed=1)
+    service.models["HoYo-Fast"] = model
+
+    async def read():
+        return [frame async for frame in service.stream_chat("hello", model="HoYo-Fast", use_cache=False)]
+
+    frames = await asyncio.wait_for(read(), 5)
+    final = frames[-1]
+    assert final["status_code"] == 503
+    assert final["truncated"] is True
+    assert final["offset"] == sum(len(frame["chunk"]) for frame in frames[:-1])
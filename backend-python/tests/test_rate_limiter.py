@@ -0,0 +1,62 @@
+"""
+Per-model token buckets and queueing under cancellation and timeouts
+"""
+import asyncio
+
+import pytest
+
+from app.services.rate_limiter import ModelLimiter, RateLimitExceeded
+
+
+def limiter(rate_limit=60, max_concurrency=1, max_wait=30.0, max_queue=10) -> ModelLimiter:
+    return ModelLimiter("m", rate_limit, max_concurrency, max_wait, max_queue)
+
+
+async def test_cancelled_rate_wait_refunds_token():
+    model = limiter()
+    model.bucket.tokens = 0.0
+    waiter = asyncio.create_task(model.acquire())
+    await asyncio.sleep(0.01)
+    assert model.bucket.tokens < 0  # reserved in debt while sleeping
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+
+    assert model.bucket.tokens >= 0
+    assert model.waiting == 0 and model.in_flight == 0
+
+
+async def test_cancelled_slot_wait_refunds_token_and_frees_queue():
+    model = limiter()
+    await model.acquire()
+    tokens = model.bucket.tokens
+    waiter = asyncio.create_task(model.acquire())
+    await asyncio.sleep(0.01)
+    assert model.scheduler.waiting() == 1
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+
+    assert model.scheduler.waiting() == 0
+    assert model.bucket.tokens == pytest.approx(tokens, abs=0.01)
+    model.release()
+    assert model.scheduler.in_use == 0
+
+
+async def test_concurrency_timeout_refunds_token():
+    model = limiter()
+    await model.acquire()
+    tokens = model.bucket.tokens
+    with pytest.raises(RateLimitExceeded) as error:
+        await model.acquire(max_wait=0.02)
+    assert error.value.reason == "concurrency"
+    assert model.bucket.tokens == pytest.approx(tokens, abs=0.01)
+    assert model.waiting == 0
+
+
+async def test_wait_over_budget_is_rejected_up_front():
+    model = limiter(rate_limit=6)  # one token every 10 seconds
+    model.bucket.tokens = 0.0
+    with pytest.raises(RateLimitExceeded) as error:
+        await model.acquire(max_wait=1.0)
+    assert error.value.reason == "rate limit"
+    assert error.value.retry_after > 1.0
+    assert model.bucket.tokens == pytest.approx(0.0, abs=0.01)
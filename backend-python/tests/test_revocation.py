@@ -0,0 +1,76 @@
+"""
+Revocation filter sync and rebuild against concurrent revocations
+"""
+from datetime import datetime, timedelta
+
+from app.core.database import AsyncSessionLocal
+from app.models.database import RevokedToken, User
+from app.services import revocation
+from app.services.revocation import TokenRevocations
+
+EXPIRES = datetime.utcnow() + timedelta(days=1)
+
+
+async def add_revocation(jti: str, revoked_at: datetime):
+    async with AsyncSessionLocal() as db:
+        db.add(RevokedToken(jti=jti, user_id="u1", expires_at=EXPIRES, revoked_at=revoked_at))
+        await db.commit()
+
+
+async def add_user():
+    async with AsyncSessionLocal() as db:
+        db.add(User(id="u1", username="u1", email="u1@example.com", hashed_password="-"))
+        await db.commit()
+
+
+async def test_sync_picks_up_row_committed_out_of_order(database):
+    await add_user()
+    revocations = TokenRevocations()
+    await revocations._rebuild()
+
+    now = datetime.utcnow()
+    # Stamped later but committed first (another worker won the write lock)
+    await add_revocation("late-stamp", now)
+    await revocations._sync()
+    assert "late-stamp" in revocations.bloom
+
+    await add_revocation("early-stamp", now - timedelta(seconds=1))
+    await revocations._sync()
+    assert "early-stamp" in revocations.bloom
+    assert revocations.bloom.count == 2
+
+
+async def test_revoke_during_rebuild_reaches_the_new_filter(database, monkeypatch):
+    await add_user()
+    await add_revocation("before", datetime.utcnow())
+    revocations = TokenRevocations()
+
+    class RevokeAfterSelect:
+        """Session for the rebuild; a logout lands right after its select"""
+
+        def __init__(self):
+            self._session = AsyncSessionLocal()
+
+        async def __aenter__(self):
+            await self._session.__aenter__()
+            return self
+
+        async def __aexit__(self, *exc):
+            return await self._session.__aexit__(*exc)
+
+        async def commit(self):
+            await self._session.commit()
+
+        async def execute(self, statement, *args, **kwargs):
+            result = await self._session.execute(statement, *args, **kwargs)
+            if statement.is_select:
+                async with AsyncSessionLocal() as db:
+                    await revocations.revoke("during", "u1", EXPIRES, db)
+            return result
+
+    monkeypatch.setattr(revocation, "AsyncSessionLocal", RevokeAfterSelect)
+    await revocations._rebuild()
+
+    assert "before" in revocations.bloom
+    assert "during" in revocations.bloom
+    assert revocations._revoked_during_rebuild is None
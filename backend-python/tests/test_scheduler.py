@@ -0,0 +1,83 @@
+"""
+Weighted fair scheduling of model concurrency slots
+"""
+import asyncio
+
+import pytest
+
+from app.services.scheduler import FairScheduler
+
+
+async def queue_waiters(scheduler, waiters, granted, timeout=5.0):
+    async def wait(plan, user_key):
+        await scheduler.acquire(plan, user_key, timeout=timeout)
+        granted.append((plan, user_key))
+
+    tasks = [asyncio.create_task(wait(plan, user_key)) for plan, user_key in waiters]
+    await asyncio.sleep(0.01)
+    return tasks
+
+
+async def drain(scheduler, tasks, granted, grants):
+    for _ in range(grants):
+        count = len(granted)
+        scheduler.release()
+        while len(granted) == count:
+            await asyncio.sleep(0)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def test_plans_are_served_in_proportion_to_weight():
+    scheduler = FairScheduler(1, {"pro": 3, "free": 1})
+    await scheduler.acquire("free", "holder", timeout=1)
+    granted = []
+    tasks = await queue_waiters(scheduler, [("free", f"f{i}") for i in range(8)] + [("pro", f"p{i}") for i in range(8)], granted)
+
+    await drain(scheduler, tasks, granted, 8)
+    plans = [plan for plan, _ in granted]
+    assert plans.count("pro") == 6 and plans.count("free") == 2
+    # Stride order interleaves the plans instead of serving one in a burst
+    assert "free" in plans[:4]
+
+
+async def test_users_within_a_plan_are_served_round_robin():
+    scheduler = FairScheduler(1, {"free": 1})
+    await scheduler.acquire("free", "holder", timeout=1)
+    granted = []
+    tasks = await queue_waiters(scheduler, [("free", "u1")] * 3 + [("free", "u2")], granted)
+
+    await drain(scheduler, tasks, granted, 4)
+    assert [user_key for _, user_key in granted] == ["u1", "u2", "u1", "u1"]
+
+
+async def test_timed_out_waiter_leaves_the_queue():
+    scheduler = FairScheduler(1, {"free": 1})
+    await scheduler.acquire("free", "holder", timeout=1)
+    with pytest.raises(asyncio.TimeoutError):
+        await scheduler.acquire("free", "u1", timeout=0.01)
+    assert scheduler.waiting() == 0
+    assert scheduler.timed_out == {"free": 1}
+    scheduler.release()
+    assert scheduler.in_use == 0
+
+
+async def test_slot_granted_to_a_cancelled_waiter_is_not_lost():
+    scheduler = FairScheduler(1, {"free": 1})
+    await scheduler.acquire("free", "holder", timeout=1)
+    first = asyncio.create_task(scheduler.acquire("free", "u1", timeout=5))
+    second = asyncio.create_task(scheduler.acquire("free", "u2", timeout=5))
+    await asyncio.sleep(0.01)
+
+    # u1 is granted the slot but cancelled before it resumes
+    scheduler.release()
+    first.cancel()
+    result, = await asyncio.gather(first, return_exceptions=True)
+    if result is None:
+        # The grant won over the cancellation (wait_for may swallow it): u1 holds the slot
+        scheduler.release()
+
+    await asyncio.wait_for(second, 1)
+    assert scheduler.in_use == 1
+    assert scheduler.waiting() == 0
@@ -0,0 +1,109 @@
+"""
+Single-flight sharing of model calls and streams between identical requests
+"""
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+
+async def test_cancelled_caller_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await release.wait()
+        return "answer"
+
+    first = asyncio.create_task(flight.do("k", call))
+    second = asyncio.create_task(flight.do("k", call))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+
+    release.set()
+    assert await asyncio.wait_for(second, 1) == "answer"
+    assert calls == [1]
+    assert flight.stats()["coalesced_total"] == 1
+    assert flight.stats()["in_flight_calls"] == 0
+
+
+async def test_call_error_reaches_every_caller():
+    flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream")
+
+    results = await asyncio.gather(flight.do("k", call), flight.do("k", call), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def upstream(events, release: asyncio.Event):
+    async def source():
+        try:
+            yield "a"
+            await release.wait()
+            yield "b"
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        finally:
+            events.append("closed")
+    return source
+
+
+async def test_upstream_survives_until_the_last_subscriber_leaves():
+    flight = SingleFlight()
+    events, release = [], asyncio.Event()
+    first = flight.stream("k", upstream(events, release))
+    second = flight.stream("k", upstream(events, release))
+    assert await first.__anext__() == "a"
+    assert await second.__anext__() == "a"
+
+    await first.aclose()
+    await asyncio.sleep(0.01)
+    assert events == []
+
+    await second.aclose()
+    await asyncio.sleep(0.01)
+    assert events == ["cancelled", "closed"]
+    assert flight.stats()["in_flight_streams"] == 0
+
+
+async def test_late_subscriber_replays_then_follows():
+    flight = SingleFlight()
+    events, release = [], asyncio.Event()
+    first = flight.stream("k", upstream(events, release))
+    assert await first.__anext__() == "a"
+
+    late = flight.stream("k", upstream(events, release))
+    assert await late.__anext__() == "a"
+    release.set()
+    assert [chunk async for chunk in late] == ["b"]
+    assert [chunk async for chunk in first] == ["b"]
+    assert flight.stats()["leaders_total"] == 1
+
+
+async def test_stream_error_reaches_every_subscriber():
+    flight = SingleFlight()
+
+    async def source():
+        yield "a"
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream")
+
+    async def read(stream):
+        return [chunk async for chunk in stream]
+
+    results = await asyncio.gather(
+        read(flight.stream("k", source)), read(flight.stream("k", source)), return_exceptions=True
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+    # A new request after the failure starts a fresh upstream stream
+    with pytest.raises(ValueError):
+        await read(flight.stream("k", source))
+    assert flight.stats()["leaders_total"] == 2
@@ -0,0 +1,61 @@
+"""
+Coalescing model chunks into frames
+"""
+import asyncio
+
+import pytest
+
+from app.services.streaming import coalesce
+
+
+async def source(*steps, closed=None):
+    """Yield strings; a float sleeps that long, an exception is raised"""
+    try:
+        for step in steps:
+            if isinstance(step, float):
+                await asyncio.sleep(step)
+            elif isinstance(step, Exception):
+                raise step
+            else:
+                yield step
+    finally:
+        if closed is not None:
+            closed.set()
+
+
+async def frames(chunks, max_latency=0.05, max_bytes=1024):
+    return [frame async for frame in coalesce(chunks, max_latency, max_bytes)]
+
+
+async def test_source_that_ended_before_first_frame_is_taken():
+    # Following a finished generation: every chunk is buffered and the pump
+    # has ended before the consumer first runs
+    assert await asyncio.wait_for(frames(source("a", "b", "c")), 1) == ["abc"]
+
+
+async def test_first_chunk_passes_through_then_frames_batch():
+    result = await asyncio.wait_for(frames(source("a", 0.01, "b", "c", "d", 0.2, "e")), 2)
+    assert result == ["a", "bcd", "e"]
+
+
+async def test_full_frame_is_flushed_before_the_window():
+    result = await asyncio.wait_for(
+        frames(source("a", 0.01, "bb", "cc", 0.2, "d"), max_latency=10.0, max_bytes=4), 1
+    )
+    assert result == ["a", "bbcc", "d"]
+
+
+async def test_error_is_raised_after_buffered_text():
+    received = []
+    with pytest.raises(ValueError):
+        async for frame in coalesce(source("a", 0.01, "b", ValueError("upstream")), 0.05, 1024):
+            received.append(frame)
+    assert "".join(received) == "ab"
+
+
+async def test_closing_the_consumer_stops_the_source():
+    closed = asyncio.Event()
+    chunks = coalesce(source("a", 10.0, "b", closed=closed), 0.05, 1024)
+    assert await chunks.__anext__() == "a"
+    await chunks.aclose()
+    await asyncio.wait_for(closed.wait(), 1)
@@ -0,0 +1,82 @@
+"""
+Incremental summaries around checkpointed (partial) assistant messages
+"""
+import uuid
+from datetime import datetime, timedelta
+
+from app.core.database import AsyncSessionLocal
+from app.models.database import Conversation, Message, MessageRole, User
+from app.services.summarizer import ConversationSummarizer
+
+
+class FakeAIService:
+    def __init__(self):
+        self.prompts = []
+
+    def has_capacity(self, model_name, max_load):
+        return True
+
+    async def background_completion(self, prompt, model_name, max_tokens):
+        self.prompts.append(prompt)
+        return f"summary {len(self.prompts)}"
+
+
+def message(conversation_id, role, content, tokens, at, metadata=None):
+    return Message(
+        id=str(uuid.uuid4()),
+        conversation_id=conversation_id,
+        role=role,
+        content=content,
+        token_count=tokens,
+        message_metadata=metadata or {},
+        created_at=at
+    )
+
+
+async def test_checkpointed_message_is_not_folded_until_complete(database):
+    start = datetime(2026, 1, 1)
+    async with AsyncSessionLocal() as db:
+        db.add(User(id="u1", username="u1", email="u1@example.com", hashed_password="-"))
+        db.add(Conversation(id="c1", user_id="u1", title="t"))
+        question = message("c1", MessageRole.USER, "question", 1500, start)
+        answer = message("c1", MessageRole.ASSISTANT, "partial answer", 1000, start + timedelta(seconds=1),
+                         {"partial": True, "generation_id": "g1"})
+        db.add_all([question, answer])
+        await db.commit()
+
+    summarizer = ConversationSummarizer()
+    summarizer.ai_service = FakeAIService()
+    assert await summarizer.summarize("c1") is False
+
+    async with AsyncSessionLocal() as db:
+        conversation = await db.get(Conversation, "c1")
+        assert conversation.summary_watermark == start
+    assert "question" in summarizer.ai_service.prompts[0]
+    assert "partial answer" not in summarizer.ai_service.prompts[0]
+
+    # The stream finishes: the row is completed in place, created_at unchanged
+    async with AsyncSessionLocal() as db:
+        completed = await db.get(Message, answer.id)
+        completed.content = "final answer"
+        completed.token_count = 2500
+        completed.message_metadata = {}
+        await db.commit()
+
+    await summarizer.summarize("c1")
+    assert "final answer" in summarizer.ai_service.prompts[1]
+    async with AsyncSessionLocal() as db:
+        conversation = await db.get(Conversation, "c1")
+        assert conversation.summary_watermark == answer.created_at
+
+
+async def test_only_partial_message_pending_is_skipped(database):
+    async with AsyncSessionLocal() as db:
+        db.add(User(id="u1", username="u1", email="u1@example.com", hashed_password="-"))
+        db.add(Conversation(id="c1", user_id="u1", title="t"))
+        db.add(message("c1", MessageRole.ASSISTANT, "partial", 3000, datetime(2026, 1, 1), {"partial": True}))
+        await db.commit()
+
+    summarizer = ConversationSummarizer()
+    summarizer.ai_service = FakeAIService()
+    assert await summarizer.summarize("c1") is False
+    assert summarizer.ai_service.prompts == []
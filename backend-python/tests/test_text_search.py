@@ -0,0 +1,69 @@
+"""
+Full-text search index kept in step with messages across VACUUM and migration
+"""
+from datetime import datetime
+
+from sqlalchemy import delete, update
+
+from app.core.database import AsyncSessionLocal
+from app.models.database import Conversation, Message, MessageRole, User
+from app.services.text_search import create_search_index, search_text
+
+
+async def add_conversation(*contents: str):
+    async with AsyncSessionLocal() as db:
+        db.add(User(id="u1", username="u1", email="u1@example.com", hashed_password="-"))
+        db.add(Conversation(id="c1", user_id="u1", title="заметки"))
+        for i, content in enumerate(contents):
+            db.add(Message(id=f"m{i}", conversation_id="c1", role=MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT,
+                           content=content, created_at=datetime(2026, 1, 1, 0, 0, i)))
+        await db.commit()
+
+
+async def search(query: str):
+    async with AsyncSessionLocal() as db:
+        return [(result["id"], result["role"]) for result in (await search_text(db, "u1", query))["results"]]
+
+
+async def vacuum(engine):
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.exec_driver_sql("VACUUM")
+        # Messages have string keys, so VACUUM is free to renumber their
+        # rowids; do it explicitly rather than depend on when it does
+        await conn.exec_driver_sql("UPDATE messages SET rowid = rowid + 100")
+
+
+async def test_index_follows_messages_after_vacuum(database):
+    await add_conversation("apple", "banana", "cherry", "durian")
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Message).where(Message.id.in_(["m0", "m1"])))
+        await db.commit()
+    await vacuum(database)
+
+    assert await search("cherry") == [("m2", "user")]
+    assert await search("durian") == [("m3", "assistant")]
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Message).where(Message.id == "m2").values(content="elderberry"))
+        await db.execute(delete(Message).where(Message.id == "m3"))
+        await db.commit()
+    assert await search("cherry") == []
+    assert await search("elderberry") == [("m2", "user")]
+    assert await search("durian") == []
+    assert await search("apple") == []
+
+
+async def test_index_without_refs_is_rebuilt(database):
+    await add_conversation("apple", "banana")
+    async with database.begin() as conn:
+        await conn.exec_driver_sql("DROP TABLE search_refs")
+        await conn.exec_driver_sql("DELETE FROM search_fts")
+        await conn.run_sync(create_search_index)
+
+    assert await search("banana") == [("m1", "assistant")]
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Message).where(Message.id == "m1").values(content="cherry"))
+        await db.commit()
+    assert await search("banana") == []
+    assert await search("cherry") == [("m1", "assistant")]
@@ -0,0 +1,51 @@
+"""
+Vector index backfill against checkpointed messages, and deletions
+"""
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.database import Conversation, Message, MessageRole, User
+from app.services.vector_index import VectorIndex, create_embedder
+
+
+def make_index(tmp_path, monkeypatch) -> VectorIndex:
+    monkeypatch.setattr(settings, "VECTOR_INDEX_PATH", tmp_path)
+    index = VectorIndex()
+    index.embedder = create_embedder("hashing")
+    return index
+
+
+async def test_backfill_skips_partial_message(database, tmp_path, monkeypatch):
+    async with AsyncSessionLocal() as db:
+        db.add(User(id="u1", username="u1", email="u1@example.com", hashed_password="-"))
+        db.add(Conversation(id="c1", user_id="u1", title="t"))
+        db.add(Message(id="m1", conversation_id="c1", role=MessageRole.USER,
+                       content="how do streams work", created_at=datetime(2026, 1, 1)))
+        db.add(Message(id="m2", conversation_id="c1", role=MessageRole.ASSISTANT,
+                       content="streams are", message_metadata={"partial": True},
+                       created_at=datetime(2026, 1, 1, 0, 0, 1)))
+        await db.commit()
+
+    index = make_index(tmp_path, monkeypatch)
+    await index._backfill()
+    partition = index._partition("u1")
+    assert "m1" in partition.indexed
+    assert "m2" not in partition.indexed
+
+    # save_response completes the row and queues the final text
+    assert await index._index([("u1", "m2", "c1", "streams are sequences of chunks")]) == 1
+    assert "m2" in partition.indexed
+
+
+async def test_delete_conversation_without_rows_is_recorded(tmp_path, monkeypatch):
+    index = make_index(tmp_path, monkeypatch)
+    partition = index._partition("u1")
+    assert partition.delete_conversation("c1") is False
+
+    # A message of the deleted conversation still queued is not indexed
+    await index._index([("u1", "m1", "c1", "late message")])
+    assert index._partition("u1").snapshot("c1") is None
+
+    # and the deletion survives a restart
+    assert "c1" in make_index(tmp_path, monkeypatch)._partition("u1").deleted
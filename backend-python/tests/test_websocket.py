@@ -0,0 +1,70 @@
+"""
+WebSocket stream forwarding: failures and client cancellation
+"""
+import asyncio
+
+import main
+
+
+class FakeWebSocket:
+    def __init__(self, fail_sends: bool = False):
+        self.sent = []
+        self.fail_sends = fail_sends
+
+    async def send_json(self, data):
+        if self.fail_sends:
+            raise RuntimeError("socket closed")
+        self.sent.append(data)
+
+
+class FakeAIService:
+    def __init__(self, *steps):
+        self.steps = steps
+        self.closed = asyncio.Event()
+
+    async def stream_chat(self, **kwargs):
+        try:
+            for step in self.steps:
+                if isinstance(step, Exception):
+                    raise step
+                if isinstance(step, asyncio.Event):
+                    await step.wait()
+                else:
+                    yield step
+        finally:
+            self.closed.set()
+
+
+async def test_stream_failure_sends_error_frame(monkeypatch):
+    service = FakeAIService({"chunk": "a", "generation_id": "g1"}, ValueError("model crashed"))
+    monkeypatch.setattr(main, "ai_service", service)
+    websocket, current = FakeWebSocket(), {}
+
+    await asyncio.wait_for(main.stream_to_websocket(websocket, {"message": "hi"}, None, current=current), 1)
+
+    assert websocket.sent[0] == {"type": "stream_chunk", "data": {"chunk": "a", "generation_id": "g1"}}
+    assert websocket.sent[-1] == {
+        "type": "stream_chunk",
+        "data": {"error": "model crashed", "status_code": 500, "generation_id": "g1"}
+    }
+    assert service.closed.is_set()
+
+
+async def test_error_frame_to_closed_socket_does_not_raise(monkeypatch):
+    monkeypatch.setattr(main, "ai_service", FakeAIService(ValueError("model crashed")))
+    await asyncio.wait_for(main.stream_to_websocket(FakeWebSocket(fail_sends=True), {"message": "hi"}, None), 1)
+
+
+async def test_cancel_closes_the_stream(monkeypatch):
+    service = FakeAIService({"chunk": "a", "generation_id": "g1"}, asyncio.Event())
+    monkeypatch.setattr(main, "ai_service", service)
+    websocket, current = FakeWebSocket(), {}
+
+    task = asyncio.create_task(main.stream_to_websocket(websocket, {"message": "hi"}, None, current=current))
+    await asyncio.sleep(0.01)
+    assert current["generation_id"] == "g1"
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert task.cancelled()
+    assert service.closed.is_set()
+    assert len(websocket.sent) == 1